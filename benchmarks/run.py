@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+""" Benchmarks for module_utils/common.py
+
+Runs without Ansible or Oracle, SQL*Plus, ps, pgrep and orabase are the stubs
+in benchmarks/stubs. Each result is appended as a JSON line to --output and
+compared with --baseline when given, the exit code is 1 on a regression.
+
+    python benchmarks/run.py --sizes 10,10000 --baseline benchmarks/results.jsonl
+"""
+
+from __future__ import (absolute_import, print_function, division)
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_DIR = os.path.join(BENCH_DIR, 'stubs')
+COMMON = os.path.join(BENCH_DIR, '..', 'plugins', 'module_utils', 'common.py')
+
+def load_source(name, path):
+    """ Import a file by path, the stub has no .py extension """
+    
+    try:
+        from importlib.machinery import SourceFileLoader
+    except ImportError:
+        import imp
+        return imp.load_source(name, path)
+    
+    return SourceFileLoader(name, path).load_module()
+
+noh = load_source('noh_common', COMMON)
+
+class BenchModule(object):
+    """ Just enough of AnsibleModule for common.py """
+    
+    def __init__(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.params = {}
+    
+    def run_command(self, args, cwd=None, data=None, environ_update=None, use_unsafe_shell=False):
+        env = dict(os.environ)
+        env.update(environ_update or {})
+        
+        process = subprocess.Popen(
+            args,
+            shell=use_unsafe_shell,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        stdout, stderr = process.communicate(data)
+        
+        return (process.returncode, stdout, stderr)
+
+class Bench(object):
+    """ Timings for one size, written out as JSON lines """
+    
+    def __init__(self, workdir, repeat):
+        self.workdir = workdir
+        self.repeat = repeat
+        self.module = BenchModule(workdir)
+        self.results = []
+        
+        # an ORACLE_HOME whose bin is the stubs so oraenv's PATH finds them
+        self.oracle_home = os.path.join(workdir, 'dbhome_1')
+        os.makedirs(self.oracle_home)
+        os.symlink(STUB_DIR, os.path.join(self.oracle_home, 'bin'))
+        
+        # the stubs run with this interpreter
+        self.oratab_file = os.path.join(workdir, 'oratab')
+        self.environment = {
+            'PATH': '{0}:{1}:/usr/bin:/bin'.format(STUB_DIR, os.path.dirname(sys.executable)),
+            'ORACLE_HOME': self.oracle_home,
+            'ORACLE_SID': 'BENCH',
+        }
+    
+    def time(self, name, size, func, expect=None):
+        """ Best of repeat runs of func(), checked against expect(returned) """
+        
+        timings = []
+        for _ in range(self.repeat):
+            start = time.time()
+            returned = func()
+            timings.append(time.time() - start)
+            
+            if expect is not None and not expect(returned):
+                raise AssertionError('{0} {1}: unexpected result {2!r}'.format(name, size, returned)[:500])
+        
+        seconds = min(timings)
+        result = {
+            'name': name,
+            'size': size,
+            'seconds': round(seconds, 6),
+            'per_second': round(size / seconds, 1) if seconds else None,
+            'python': platform.python_version(),
+            'timestamp': int(time.time()),
+        }
+        
+        self.results.append(result)
+        print('{0:<28} {1:>9} {2:>12.6f}s {3:>14} /s'.format(
+            name, size, seconds, result['per_second']
+        ))
+        
+        return result
+    
+    def stub_environment(self, rows, columns=5, noise=0):
+        os.environ.update({
+            'NOH_BENCH_ROWS': str(rows),
+            'NOH_BENCH_COLUMNS': str(columns),
+            'NOH_BENCH_NOISE': str(noise),
+        })
+    
+    def sqlplus_output(self, size):
+        """ Error scanning of a large SQL*Plus output """
+        
+        lines = []
+        for row in range(size):
+            if row % 100 == 0:
+                lines.append('ORA-00942: table or view does not exist')
+            lines.append('{0:>10} some text for row {0}'.format(row))
+        
+        stdout = '\n'.join(lines)
+        
+        self.time('sqlplus_output', size, lambda: noh.sqlplus_output(stdout))
+    
+    def decode_rows(self, size):
+        """ Parsing what table_as_csv writes """
+        
+        stub = load_source('noh_stub', os.path.join(STUB_DIR, 'sqlplus'))
+        stdout = '\n'.join([
+            ''.join(['{0}:{1}'.format(len(value), value) for value in stub.Stub().values(row, 5)]) + noh.ROW_END
+                for row in range(size)
+        ]) + '\n'
+        
+        self.time('decode_rows', size, lambda: list(noh.decode_rows(stdout, 5)), lambda rows: len(rows) == size)
+    
+    def str_to_intfl(self, size):
+        values = [str(row) if row % 3 == 0 else '{0}.5'.format(row) if row % 3 == 1 else 'text {0}'.format(row)
+            for row in range(size)]
+        
+        self.time('str_to_intfl', size, lambda: [noh.str_to_intfl(value) for value in values])
+    
+    def column_converters(self, size):
+        schema = noh.describe('\n\n A NUMBER(10)\n B NUMBER\n C VARCHAR2(10)\n')
+        converters = [noh.column_converter(column) for column in schema]
+        rows = [[str(row), '{0}.5'.format(row), '{0:05d}'.format(row)] for row in range(size)]
+        
+        self.time('column_converters', size, lambda: [
+            [convert(value) for convert, value in zip(converters, row)] for row in rows
+        ])
+    
+    def oratab(self, size):
+        with open(self.oratab_file, 'w') as fd:
+            fd.write('# oratab\n')
+            for sid in range(size):
+                fd.write('DB{0}:{1}:N # comment\n'.format(sid, self.oracle_home))
+        
+        self.time('oratab', size, lambda: noh.oratab(self.oratab_file), lambda sids: len(sids) == size)
+    
+    def inventory(self, size):
+        inventory_file = os.path.join(self.workdir, 'inventory.xml')
+        
+        with open(inventory_file, 'w') as fd:
+            fd.write('<?xml version="1.0" standalone="yes" ?>\n<INVENTORY>\n<HOME_LIST>\n')
+            for home in range(size):
+                fd.write('<HOME NAME="OraDB19Home{0}" LOC="/u01/app/oracle/product/19.0.0/dbhome_{0}" TYPE="O" IDX="{0}"/>\n'.format(home))
+            fd.write('</HOME_LIST>\n</INVENTORY>\n')
+        
+        self.time('central_inventory', size, lambda: noh.central_inventory(inventory_file),
+            lambda homes: len(homes) == size)
+        
+        # components of one home, each one-off with a long bug list
+        contents_dir = os.path.join(self.workdir, 'home', 'inventory', 'ContentsXML')
+        if not os.path.isdir(contents_dir):
+            os.makedirs(contents_dir)
+        
+        with open(os.path.join(contents_dir, 'comps.xml'), 'w') as fd:
+            fd.write('<?xml version="1.0" standalone="yes" ?>\n<PRD_LIST>\n<COMP_LIST>\n')
+            for comp in range(size):
+                fd.write('<COMP NAME="oracle.comp{0}" VER="19.0.0.0.0"><DESC>Component {0}</DESC></COMP>\n'.format(comp))
+            fd.write('</COMP_LIST>\n<ONEOFF_LIST>\n')
+            for patch in range(10):
+                fd.write('<ONEOFF REF_ID="{0}"><DESC>Database Release Update : 19.{0}.0.0.0 ({0})</DESC><BUG_LIST>'.format(patch))
+                fd.write('<BUG>1</BUG>' * size)
+                fd.write('</BUG_LIST></ONEOFF>\n')
+            fd.write('</ONEOFF_LIST>\n</PRD_LIST>\n')
+        
+        self.time('home_inventory', size, lambda: noh.home_inventory(os.path.join(self.workdir, 'home')),
+            lambda home: len(home['components']) == size and home['release_update'] == '19.9.0.0.0')
+    
+    def alert_incidents(self, size):
+        """ Errors in the last 10 messages of an alert log against the whole of it """
+        
+        alert_file = os.path.join(self.workdir, 'alert_BENCH.log')
+        
+        with open(alert_file, 'w') as fd:
+            for message in range(size):
+                fd.write('2021-03-01T10:{0:02d}:{1:02d}.000000+00:00\n'.format(message // 60 % 60, message % 60))
+                fd.write('Thread 1 advanced to log sequence {0}\n'.format(message))
+                if message % 100 == 0:
+                    fd.write('ORA-00060: Deadlock detected. See Note 60.1 at My Oracle Support\n')
+            
+            offset = fd.tell()
+            for message in range(10):
+                fd.write('2021-03-02T10:00:{0:02d}.000000+00:00\nORA-01555: snapshot too old\n'.format(message))
+        
+        self.time('alert_incidents_all', size, lambda: noh.alert_incidents(alert_file),
+            lambda result: len(result[0]) == (size - 1) // 100 + 11)
+        self.time('alert_incidents_new', size, lambda: noh.alert_incidents(alert_file, offset),
+            lambda result: len(result[0]) == 10)
+    
+    def pgrep(self, size):
+        os.environ['NOH_BENCH_PROCESSES'] = str(size)
+        path = os.environ['PATH']
+        os.environ['PATH'] = '{0}:{1}'.format(STUB_DIR, path)
+        
+        try:
+            self.time('pgrep_ps', size, lambda: noh.pgrep(self.module, pattern='ora_pmon_', proc='/nonexistent'),
+                lambda result: len(result[1]) == size)
+        finally:
+            os.environ['PATH'] = path
+    
+    def process_table(self, size):
+        if os.path.isdir('/proc/self'):
+            self.time('process_table', len(noh.ProcessTable().processes), lambda: noh.ProcessTable())
+    
+    def oraenv(self, size):
+        with open(self.oratab_file, 'w') as fd:
+            fd.write('BENCH:{0}:N\n'.format(self.oracle_home))
+        
+        cache = os.path.join(self.workdir, 'oraenv.json')
+        
+        def has_base(result):
+            return result[1].get('ORACLE_BASE') == '/u01/app/oracle'
+        
+        self.time('oraenv', 1, lambda: noh.oraenv(self.module, 'BENCH', self.oratab_file, cache=None), has_base)
+        self.time('oraenv_cached', 1, lambda: noh.oraenv(self.module, 'BENCH', self.oratab_file, cache=cache), has_base)
+    
+    def table_as_csv(self, size):
+        """ End to end through the SQL*Plus stub """
+        
+        self.stub_environment(size)
+        
+        def run():
+            rc, stdout, stderr = noh.table_as_csv(
+                self.module, self.environment, 'bench', ['ID', 'CREATED', 'C2', 'C3', 'C4']
+            )
+            return list(noh.decode_rows(stdout, 5))
+        
+        self.time('table_as_csv', size, run, lambda rows: len(rows) == size)
+    
+    def table_rows(self, size):
+        """ DESC, typed conversion and the cursor in one session """
+        
+        self.stub_environment(size)
+        
+        def run():
+            with noh.SQLPlusSession(self.module, self.environment) as session:
+                return noh.table_rows(self.module, self.environment, 'bench', session)
+        
+        self.time('table_rows', size, run, lambda result: not result[2] and len(result[1][1]) == size)
+    
+    def table_spool(self, size):
+        self.stub_environment(size)
+        
+        def run():
+            rc, spool_file, errors = noh.table_spool(
+                self.module, self.environment, 'bench', ['ID', 'CREATED', 'C2', 'C3', 'C4']
+            )
+            return sum([len(chunk) for chunk in noh.spool_rows(spool_file)])
+        
+        self.time('table_spool', size, run, lambda rows: rows == size)
+    
+    def table_delta(self, size):
+        """ Row hashes compared with a snapshot, nothing changed since the last run """
+        
+        self.stub_environment(size)
+        snapshot_file = os.path.join(self.workdir, 'snapshot_{0}.json'.format(size))
+        
+        def run():
+            return noh.table_delta(
+                self.module, self.environment, 'bench', ['ID', 'CREATED', 'C2', 'C3', 'C4'], 'ID', snapshot_file
+            )
+        
+        run()
+        self.time('table_delta', size, run, lambda result: not result[2] and result[1] == ([], [], []))
+    
+    def sqlplus_errors(self, size):
+        """ sqlplus() with error noise in the output """
+        
+        self.stub_environment(size, noise=100)
+        sql = 'SELECT a, b, c FROM bench;\nEXIT\n'
+        
+        self.time('sqlplus', size, lambda: noh.sqlplus(self.module, sql, self.environment),
+            lambda result: result[2].count('ORA-01555') == (size - 1) // 100)
+    
+    def session(self, size):
+        """ Statements through one session against a process each """
+        
+        statements = ['SELECT 1 FROM dual;'] * min(size, 100)
+        
+        def one_session():
+            with noh.SQLPlusSession(self.module, self.environment) as session:
+                return session.execute_many(statements)
+        
+        def process_each():
+            return [noh.sqlplus(self.module, sql, self.environment) for sql in statements]
+        
+        def all_one(results):
+            return [result[1] for result in results] == [1] * len(statements)
+        
+        self.time('session_statements', len(statements), one_session, all_one)
+        self.time('sqlplus_statements', len(statements), process_each, all_one)
+
+FUNCTIONS = [
+    'sqlplus_output',
+    'decode_rows',
+    'str_to_intfl',
+    'column_converters',
+    'oratab',
+    'inventory',
+    'alert_incidents',
+    'pgrep',
+    'process_table',
+    'oraenv',
+]
+
+END_TO_END = [
+    'table_as_csv',
+    'table_rows',
+    'table_spool',
+    'table_delta',
+    'sqlplus_errors',
+    'session',
+]
+
+def compare(results, baseline_file, threshold):
+    """ Results slower than the latest baseline by more than threshold """
+    
+    baseline = {}
+    with open(baseline_file, 'r') as fd:
+        for line in fd:
+            if line.strip():
+                result = json.loads(line)
+                baseline[(result['name'], result['size'])] = result
+    
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['name'], result['size']))
+        
+        if previous and previous['seconds'] and result['seconds'] > previous['seconds'] * (1 + threshold):
+            regressions.append((result, previous))
+    
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='10,10000,1000000',
+        help='comma separated row counts (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='best of this many runs (default: %(default)s)')
+    parser.add_argument('--only', default='',
+        help='comma separated benchmarks to run, all by default')
+    parser.add_argument('--skip-end-to-end', action='store_true',
+        help='leave out the benchmarks which run the stub SQL*Plus')
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results.jsonl'),
+        help='JSON lines file results are appended to (default: %(default)s)')
+    parser.add_argument('--baseline',
+        help='JSON lines file of earlier results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+        help='fraction slower than the baseline counted as a regression (default: %(default)s)')
+    args = parser.parse_args()
+    
+    benchmarks = FUNCTIONS + ([] if args.skip_end_to_end else END_TO_END)
+    if args.only:
+        benchmarks = [name for name in benchmarks if name in args.only.split(',')]
+    
+    results = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        workdir = tempfile.mkdtemp(prefix='noh_bench_')
+        
+        try:
+            bench = Bench(workdir, args.repeat)
+            for name in benchmarks:
+                getattr(bench, name)(size)
+            results.extend(bench.results)
+        finally:
+            shutil.rmtree(workdir)
+    
+    regressions = compare(results, args.baseline, args.threshold) if args.baseline else []
+    
+    with open(args.output, 'a') as fd:
+        for result in results:
+            fd.write(json.dumps(result) + '\n')
+    
+    for result, previous in regressions:
+        print('REGRESSION {0} {1}: {2:.6f}s was {3:.6f}s'.format(
+            result['name'], result['size'], result['seconds'], previous['seconds']
+        ))
+    
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+from ansible.errors import AnsibleActionFail
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+from ansible.utils.vars import isidentifier
+from ansible.vars.reserved import is_reserved_name
+
+COLLECTION = 'antony_with_no_h.oracle'
+
+# facts a request name could replace, besides ansible_* and reserved names
+OTHER_FACTS = ('facts', 'oracle')
+
+# options each module takes in a batch, and aliases to the name the batch
+# module uses
+BATCH_OPTIONS = {
+    'sqlplus': {
+        'options': ('sql', 'raw', 'per_statement', 'ignore_errors'),
+        'required': ('sql',),
+        'aliases': {},
+    },
+    'table_list': {
+        'options': ('table', 'columns', 'where', 'order_by', 'flatten', 'max_rows', 'page_size', 'after_key'),
+        'required': ('table', 'columns'),
+        'aliases': {'table_name': 'table', 'table_columns': 'columns', 'next_token': 'after_key'},
+        'key': 'order_by',
+    },
+    'table_dictionary': {
+        'options': ('table_name', 'column_as_key', 'max_rows', 'page_size', 'after_key'),
+        'required': ('table_name',),
+        'aliases': {'table': 'table_name', 'next_token': 'after_key'},
+        'key': 'column_as_key',
+    },
+}
+
+class ActionModule(ActionBase):
+    """ Check a batch of requests, run them in one execution of oracle_batch
+    and hand the results back by request name
+    """
+    
+    TRANSFERS_FILES = False
+    _VALID_ARGS = frozenset((
+        'database_name', 'name', 'sid', 'requests', 'set_facts', 'timeout', 'profile', 'profile_log'
+    ))
+    
+    def batch_request(self, request):
+        """ One request as its name, module and options """
+        
+        if not isinstance(request, dict) or not request.get('name'):
+            raise AnsibleActionFail('Every request needs a name: {0}'.format(request))
+        
+        modules = [
+            key for key in request if key != 'name' and key.replace('{0}.'.format(COLLECTION), '') in BATCH_OPTIONS
+        ]
+        
+        if len(modules) != 1 or len(request) != 2:
+            raise AnsibleActionFail(
+                'Request {0} needs one of {1} and nothing else'.format(request['name'], ', '.join(sorted(BATCH_OPTIONS)))
+            )
+        
+        module_name = modules[0].replace('{0}.'.format(COLLECTION), '')
+        spec = BATCH_OPTIONS[module_name]
+        
+        args = {}
+        for option, value in (request[modules[0]] or {}).items():
+            option = spec['aliases'].get(option, option)
+            
+            if option not in spec['options']:
+                raise AnsibleActionFail('Request {0}: {1} does not take {2} in a batch'.format(
+                    request['name'], module_name, option
+                ))
+            
+            args[option] = value
+        
+        missing = [option for option in spec['required'] if option not in args]
+        if missing:
+            raise AnsibleActionFail('Request {0}: missing {1}'.format(request['name'], ', '.join(missing)))
+        
+        # the same checks the modules make before paging
+        if 'key' in spec and args.get(spec['key']) is None and (args.get('page_size') or args.get('after_key')):
+            raise AnsibleActionFail('Request {0}: page_size and after_key need {1} to page by'.format(
+                request['name'], spec['key']
+            ))
+        
+        return {'name': request['name'], 'module': module_name, 'args': args}
+    
+    def fact_name(self, name):
+        """ Refuse a request name that is not a fact of its own """
+        
+        if not isidentifier(name) or is_reserved_name(name):
+            raise AnsibleActionFail('Request {0} is not a valid fact name for set_facts'.format(name))
+        
+        if name.startswith('ansible_') or name in OTHER_FACTS or name.startswith('oracle_'):
+            raise AnsibleActionFail('Request {0} would replace other facts with set_facts'.format(name))
+    
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+        
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+        
+        module_args = dict(self._task.args)
+        set_facts = boolean(module_args.pop('set_facts', False), strict=False)
+        
+        try:
+            requests = [self.batch_request(request) for request in module_args.get('requests') or []]
+            
+            if not requests:
+                raise AnsibleActionFail('requests is empty')
+            
+            names = [request['name'] for request in requests]
+            duplicates = sorted(set(name for name in names if names.count(name) > 1))
+            if duplicates:
+                raise AnsibleActionFail('Request names must be unique: {0}'.format(', '.join(duplicates)))
+            
+            if set_facts:
+                for name in names:
+                    self.fact_name(name)
+        except AnsibleActionFail as fault:
+            result.update({
+                'failed': True,
+                'msg': str(fault),
+            })
+            return result
+        
+        module_args['requests'] = requests
+        
+        # one round trip whatever the number of requests
+        result.update(self._execute_module(
+            module_name='{0}.oracle_batch'.format(COLLECTION),
+            module_args=module_args,
+            task_vars=task_vars,
+        ))
+        
+        if set_facts and result.get('results'):
+            result['ansible_facts'] = dict(result['results'])
+        
+        return result
\ No newline at end of file
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+class ModuleDocFragment(object):
+    
+    # options of every module timing its phases with module_utils.common.profiler
+    DOCUMENTATION = r"""
+options:
+  profile:
+    description:
+      - Time each phase of the run, returned as C(timings)
+    type: bool
+    default: no
+  profile_log:
+    description:
+      - File on the target to append C(timings) to as a line of JSON, for
+        aggregating over many runs
+      - Only used with C(profile)
+    type: str
+notes:
+  - With C(profile) the result has C(timings), a list of the wall and CPU
+    time, subprocesses started, bytes read from SQL*Plus and peak RSS of
+    each phase, the last is the total for the run
+"""
\ No newline at end of file
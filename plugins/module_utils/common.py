@@ -6,19 +6,466 @@
 from __future__ import (absolute_import, print_function, division)
 __metaclass__ = type
 
+import binascii
+import contextlib
 import csv
+import errno
+import fcntl
+import fnmatch
+import gzip
+import hashlib
+import heapq
+import json
+import mmap
 import re
 import os
+import pwd
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+
+from decimal import Decimal
+from itertools import islice
+from xml.etree import ElementTree
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+# ORA-/SP2 etc errors are not written to stderr, they are matched a line at a
+# time by OutputParser
+re_error_code = re.compile(r'([A-Z]{2}\d-\d{4}|[A-Z]{3}-\d{5,}):')
+re_error_hint = re.compile(r'-\d{4}')
+re_error_at = re.compile(r'ERROR(?: at line (\d+))?:$')
+re_elapsed = re.compile(r'Elapsed: (\d+):(\d+):(\d+(?:\.\d+)?)$')
+re_feedback = re.compile(
+    r'(?:no rows selected|(\d+) rows? \w+\.'
+    r'|Connected\.|Disconnected from .*'
+    r'|Warning: .* with compilation errors\.'
+    r'|[A-Z][\w$#/ ]* (?:created|altered|dropped|truncated|renamed|granted|revoked'
+    r'|analyzed|purged|succeeded|complete|completed|processed|mounted|opened'
+    r'|started|closed|dismounted|shut down|flashed back)\.)$'
+)
+
+# the first line of a PL/SQL block, which runs to a / on its own
+re_plsql = re.compile(
+    r'(?:DECLARE|BEGIN|CREATE(?:\s+OR\s+REPLACE)?(?:\s+(?:NON)?EDITIONABLE)?'
+    r'\s+(?:FUNCTION|PROCEDURE|PACKAGE|TRIGGER|TYPE|LIBRARY|JAVA))\b',
+    re.IGNORECASE
+)
+
+# SQL*Plus commands (and common abbreviations) end at the end of the line
+SQLPLUS_COMMANDS = (
+    'ACCEPT', 'ARCHIVE', 'BREAK', 'BTITLE', 'CLEAR', 'COL', 'COLUMN', 'COMPUTE',
+    'CONN', 'CONNECT', 'DEF', 'DEFINE', 'DESC', 'DESCRIBE', 'DISC', 'DISCONNECT',
+    'EXEC', 'EXECUTE', 'EXIT', 'HOST', 'PASSWORD', 'PAUSE', 'PRINT', 'PRO', 'PROMPT',
+    'QUIT', 'RECOVER', 'REM', 'REMARK', 'SET', 'SHO', 'SHOW', 'SHUTDOWN', 'SPO',
+    'SPOOL', 'START', 'STARTUP', 'TIMING', 'TTITLE', 'UNDEF', 'UNDEFINE', 'VAR',
+    'VARIABLE', 'WHENEVER',
+)
+
+# SQL*Plus running commands on the host, refused by the modules
+re_host_command = re.compile(r'(^(\!|host).*)', re.MULTILINE|re.IGNORECASE)
+
+# the patch level in the description of a one-off, e.g. Database Release
+# Update : 19.21.0.0.231017 (35643107), OJVM has updates of its own
+re_release_update = re.compile(
+    r'(?<!OJVM )(?:Release Update|Patch Set Update|Bundle Patch)(?: Revision)?\s*:?\s*(\d+(?:\.\d+){3,4})',
+    re.IGNORECASE
+)
+
+# in a spool file only at the start of a line, data is quoted
+re_spool_errors = re.compile(r'^(?:[A-Z]{2}\d-\d{4}|[A-Z]{3}-\d{5,}):.*', re.MULTILINE)
+
+# marks the end of a row from table_as_csv, TRIMOUT ON cannot trim the last
+# value once it is followed by something that is not a blank
+ROW_END = '|'
+re_row_end = re.compile(r'\|\r?(?:\n|\Z)')
+
+# the first line of each mapping in /proc/<pid>/smaps, the rest are Name: value
+re_smaps_mapping = re.compile(r'^[0-9a-f]+-[0-9a-f]+ ')
+
+# state kept on the target between module runs
+STATE_DIR = '~/.ansible/tmp/antony_with_no_h.oracle'
+ORAENV_CACHE = '{0}/oraenv.json'.format(STATE_DIR)
+
+# buckets of DBMS_UTILITY.GET_HASH_VALUE for row hashes, a changed row keeps
+# its hash about once in this many. More hashes than ROW_HASH_FILTER are
+# filtered here rather than in the PL/SQL
+ROW_HASH_SIZE = 1073741824
+ROW_HASH_FILTER = 1000
 
 class DatabaseNotFound(Exception):
     pass
 
-def pgrep(module, pattern=None, user=None):
+class UnterminatedStatement(ValueError):
+    pass
+
+class SpoolError(ValueError):
+    pass
+
+class StateFile(object):
+    """ A JSON document on the target shared between module runs
+    
+    Reads take a shared lock and updates an exclusive one on a separate lock
+    file, the document itself is replaced with a rename so a reader never
+    sees half of it
+    """
+    
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.lock_path = '{0}.lock'.format(self.path)
+        
+    def lock(self, operation):
+        """ Open and lock the lock file, close it to release """
+        
+        state_dir = os.path.dirname(self.path)
+        
+        if not os.path.isdir(state_dir):
+            try:
+                os.makedirs(state_dir, 0o700)
+            except OSError:
+                # created in the meantime by another fork
+                pass
+            
+        fd = open(self.lock_path, 'a')
+        fcntl.flock(fd.fileno(), operation)
+        
+        return fd
+    
+    def load(self):
+        """ The document without locking, {} when missing or unreadable """
+        
+        try:
+            with open(self.path, 'r') as fd:
+                return json.load(fd)
+        except (IOError, OSError, ValueError):
+            return {}
+    
+    def read(self):
+        """ The whole document """
+        
+        try:
+            lock = self.lock(fcntl.LOCK_SH)
+        except (IOError, OSError):
+            return self.load()
+        
+        try:
+            return self.load()
+        finally:
+            lock.close()
+            
+    def update(self, values):
+        """ Merge values into the document, returns False if it cannot be written """
+        
+        try:
+            lock = self.lock(fcntl.LOCK_EX)
+        except (IOError, OSError):
+            return False
+        
+        try:
+            document = self.load()
+            document.update(values)
+            
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w') as tmp:
+                json.dump(document, tmp)
+                
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            return False
+        finally:
+            lock.close()
+        
+        return True
+
+def file_stamps(paths):
+    """ Modification time and inode of each path, None for a missing file """
+    
+    stamps = {}
+    
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps[path] = [stat.st_mtime, stat.st_ino]
+        except OSError:
+            stamps[path] = None
+            
+    return stamps
+
+class Profiler(object):
+    """ Wall and CPU time, subprocesses, stdout bytes and peak RSS per phase
+    
+    Subprocesses and stdout are counted by the helpers in this file through
+    count(), per thread so a phase on the fan_out pool only sees its own. CPU
+    time and RSS are for the whole process (and its finished children).
+    Disabled, phase() and count() do nothing.
+    """
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timings = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.started = self.snapshot()
+        
+    def counters(self):
+        """ [subprocesses, stdout bytes] for the calling thread """
+        
+        if not hasattr(self.local, 'counters'):
+            self.local.counters = [0, 0]
+            
+        return self.local.counters
+    
+    def count(self, stdout=None, subprocesses=0, size=0):
+        """ Record subprocesses started and output (or its size) read on this thread """
+        
+        if not self.enabled:
+            return None
+        
+        counters = self.counters()
+        counters[0] += subprocesses
+        
+        # decoded output, so characters rather than bytes outside ASCII
+        counters[1] += size or len(stdout or '')
+        
+    def snapshot(self):
+        return (time.time(), os.times(), list(self.counters()))
+    
+    def timing(self, name, start, labels):
+        """ The difference between start and now as a timing """
+        
+        now, times, counters = self.snapshot()
+        start_time, start_times, start_counters = start
+        
+        timing = {
+            'phase': name,
+            'start': round(start_time - self.started[0], 6),
+            'wall': round(now - start_time, 6),
+            'cpu': round(sum(times[:2]) - sum(start_times[:2]), 6),
+            'child_cpu': round(sum(times[2:4]) - sum(start_times[2:4]), 6),
+            'subprocesses': counters[0] - start_counters[0],
+            'stdout_bytes': counters[1] - start_counters[1],
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'child_peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        }
+        timing.update(labels)
+        
+        return timing
+    
+    @contextlib.contextmanager
+    def phase(self, name, **labels):
+        """ Time the body of a with block as one phase """
+        
+        if not self.enabled:
+            yield
+            return
+        
+        start = self.snapshot()
+        
+        try:
+            yield
+        finally:
+            timing = self.timing(name, start, labels)
+            
+            with self.lock:
+                self.timings.append(timing)
+                
+    def report(self, module):
+        """ {'timings': [...]} to add to the module result, {} when disabled
+        
+        The phases are followed by a total from the start of the run, with
+        profile_log set they are also appended to that file as a line of JSON
+        """
+        
+        if not self.enabled:
+            return {}
+        
+        timings = sorted(self.timings, key=lambda timing: timing['start'])
+        
+        # the total only counts subprocesses and output on this thread, the
+        # fan_out pool has its own in each database phase
+        timings.append(self.timing('total', self.started, {}))
+        
+        log_file = module.params.get('profile_log')
+        
+        if log_file:
+            line = json.dumps({
+                'module': getattr(module, '_name', None),
+                'time': self.started[0],
+                'pid': os.getpid(),
+                'timings': timings,
+            })
+            
+            try:
+                with open(os.path.expanduser(log_file), 'a') as fd:
+                    # one write under a lock so concurrent runs do not interleave
+                    fcntl.flock(fd.fileno(), fcntl.LOCK_EX)
+                    fd.write(line + '\n')
+            except (IOError, OSError) as fault:
+                module.warn('Cannot write profile_log {0}: {1}'.format(log_file, fault))
+                
+        return {'timings': timings}
+
+def profiler(module):
+    """ The Profiler for this module run, enabled by the profile option """
+    
+    if getattr(module, 'noh_profiler', None) is None:
+        params = getattr(module, 'params', None) or {}
+        module.noh_profiler = Profiler(bool(params.get('profile')))
+        
+    return module.noh_profiler
+
+class ListedEntry(object):
+    """ A directory entry from os.listdir with the parts of os.DirEntry used
+    here, for Pythons before 3.5. Not following links, stat is an lstat done
+    once when first needed
+    """
+    
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._stat = None
+    
+    def stat(self, follow_symlinks=False):
+        if self._stat is None:
+            self._stat = os.lstat(self.path)
+        
+        return self._stat
+    
+    def is_file(self, follow_symlinks=False):
+        return (self.stat().st_mode & 0o170000) == 0o100000
+    
+    def inode(self):
+        return self.stat().st_ino
+
+def directory_entries(path):
+    """ Entries of a directory as they are read, with scandir (Python 3.5+)
+    where there is one so names can be matched before anything is stat'd
+    
+    Only is_file() and stat() without following links, inode() and name and
+    path are the same either way
+    """
+    
+    if scandir is None:
+        for name in os.listdir(path):
+            yield ListedEntry(path, name)
+        return
+    
+    entries = scandir(path)
+    
+    try:
+        for entry in entries:
+            yield entry
+    finally:
+        # the directory is held open until then, close() is from 3.6
+        if hasattr(entries, 'close'):
+            entries.close()
+
+class ProcessTable(object):
+    """ A snapshot of the process table read from /proc
+    
+    Taken once and filtered as many times as needed, each process is a
+    dictionary of pid, uid, user, name (argv[0]) and cmd
+    """
+    
+    def __init__(self, proc='/proc'):
+        self.proc = proc
+        self.users = {}
+        self.processes = list(self.scan())
+    
+    def scan(self):
+        """ Read every /proc/<pid> """
+        
+        for entry in directory_entries(self.proc):
+            if not entry.name.isdigit():
+                continue
+            
+            proc_dir = entry.path
+            
+            # a process can exit at any point between listing and reading
+            try:
+                uid = os.stat(proc_dir).st_uid
+                
+                with open('{0}/cmdline'.format(proc_dir), 'rb') as fd:
+                    argv = [arg for arg in fd.read().decode('utf-8', 'replace').split('\0') if arg]
+                
+                # kernel threads have no command line
+                if not argv:
+                    with open('{0}/status'.format(proc_dir), 'r') as fd:
+                        argv = ['[{0}]'.format(fd.readline().split(':', 1)[1].strip())]
+            except (IOError, OSError, IndexError):
+                continue
+            
+            yield {
+                'pid': int(entry.name),
+                'uid': uid,
+                'user': self.username(uid),
+                'name': argv[0],
+                'cmd': ' '.join(argv).strip(),
+            }
+    
+    def username(self, uid):
+        """ uid to name, looked up once per uid """
+        
+        if uid not in self.users:
+            try:
+                self.users[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                self.users[uid] = str(uid)
+                
+        return self.users[uid]
+    
+    def filter(self, pattern=None, user=None, name=None):
+        """ Processes matching all of the filters given
+        
+        pattern is a regex searched for in the command line (pgrep -f), user a
+        name or uid and name an exact match on argv[0]
+        """
+        
+        re_pattern = re.compile(pattern) if pattern else None
+        
+        return [
+            proc for proc in self.processes
+                if (re_pattern is None or re_pattern.search(proc['cmd']))
+                and (user is None or str(user) in (proc['user'], str(proc['uid'])))
+                and (name is None or proc['name'] == name)
+        ]
+
+def pgrep(module, pattern=None, user=None, processes=None, proc='/proc'):
     """ A poor mans psutil """
         
     if not (pattern or user):
         raise TypeError('missing required positional argument')
     
+    # /proc is read directly where there is one, an existing ProcessTable can
+    # be passed in to save reading it again
+    if processes is None and os.path.isdir('{0}/self'.format(proc)):
+        processes = ProcessTable(proc)
+    
+    if processes is not None:
+        # like pgrep leave out this process
+        ps_list = [
+            [str(proc['pid']), proc['user'], proc['cmd']]
+                for proc in processes.filter(pattern=pattern, user=user)
+                    if proc['pid'] != os.getpid()
+        ]
+        
+        return (0 if ps_list else 1, ps_list, '')
+    
     # `ps` no header and print pid,user and the command string: comma separated
     command = ['ps', 'h', '-o %p,', '-o %u,', '-o cmd', '-p']
     
@@ -31,6 +478,7 @@ def pgrep(module, pattern=None, user=None):
     run_c = ' '.join(command)
     
     rc, stdout, stderr = module.run_command(args=run_c, use_unsafe_shell=True)
+    profiler(module).count(stdout, 1)
     
     if rc != 0:
         return (rc, [], stderr)
@@ -65,8 +513,157 @@ def oratab(oratab_loc='/etc/oratab'):
     
     return oratab_dict
 
-def oraenv(module, database_name, oratab_loc='/etc/oratab', oracle_base=None):
-    """ Create an environment dictionary from the database name """
+def oratab_sids(oratab_loc='/etc/oratab'):
+    """ SID in upper case: SID as in oratab, empty when it cannot be read """
+    
+    try:
+        # `*` entries are homes without a database
+        return dict((sid.upper(), sid) for sid in oratab(oratab_loc) if sid != '*')
+    except (IOError, OSError):
+        return {}
+
+def database_name(name, oratab_loc='/etc/oratab'):
+    """ A SID spelt as it is in oratab, matched whatever the case it is given in
+    
+    A name not in oratab is returned as given and fails later when it is not
+    found
+    """
+    
+    return oratab_sids(oratab_loc).get(name.upper(), name)
+
+def database_names(names, oratab_loc='/etc/oratab'):
+    """ Expand `all` to every SID in oratab, spell the rest as oratab does
+    
+    So orcl is ORCL in every module, see database_name()
+    """
+    
+    if [name for name in names if name.lower() == 'all']:
+        return sorted([sid for sid in oratab(oratab_loc) if sid != '*'])
+    
+    sids = oratab_sids(oratab_loc)
+    spelt = []
+    
+    for name in names:
+        name = sids.get(name.upper(), name)
+        
+        if name not in spelt:
+            spelt.append(name)
+    
+    return spelt
+
+def fan_out(func, targets, max_workers=4):
+    """ Run func(target) for each target on a bounded pool of threads
+    
+    Returns a dictionary of target: (rc, result, errors), an exception raised
+    for one target is recorded against it and does not stop the others
+    """
+    
+    work = queue.Queue()
+    for target in targets:
+        work.put(target)
+    
+    results = {}
+    
+    def worker():
+        while True:
+            try:
+                target = work.get_nowait()
+            except queue.Empty:
+                return
+            
+            try:
+                results[target] = func(target)
+            except Exception as fault:
+                results[target] = (1, None, str(fault))
+                
+    threads = [
+        threading.Thread(target=worker) for _ in range(max(1, min(max_workers, len(targets))))
+    ]
+    
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+        
+    for thread in threads:
+        thread.join()
+        
+    return results
+
+def fan_out_databases(module, names, func, max_workers=4, partial=False):
+    """ Resolve each database environment then run func on a pool of threads
+    
+    func is called as func(database_name, environment) and returns the usual
+    (rc, result, errors), the return is a pair of dictionaries keyed by
+    database name: (results, errors). With partial the result of a database
+    with errors is kept as well, for what was done before the error
+    """
+    
+    outcomes = {}
+    environments = {}
+    
+    # oraenv may run orabase through run_command so stays on this thread
+    phase = profiler(module).phase
+    
+    for name in names:
+        try:
+            with phase('oraenv', database=name):
+                _, environments[name], _ = oraenv(module, name)
+        except DatabaseNotFound as fault:
+            outcomes[name] = (1, None, str(fault))
+    
+    def run(name):
+        with phase('database', database=name):
+            return func(name, environments[name])
+            
+    outcomes.update(fan_out(run, sorted(environments), max_workers))
+    
+    results = dict(
+        (name, outcome[1]) for name, outcome in outcomes.items()
+            if not outcome[2] or (partial and outcome[1] is not None)
+    )
+    errors = dict(
+        (name, outcome[2]) for name, outcome in outcomes.items() if outcome[2]
+    )
+    
+    return (results, errors)
+
+def oraenv(module, database_name, oratab_loc='/etc/oratab', oracle_base=None, cache=ORAENV_CACHE):
+    """ Create an environment dictionary from the database name
+    
+    The environment is cached on the target until oratab, the database env
+    file or the home's orabasetab change, cache=None to always resolve it
+    """
+    
+    # an environment for a given ORACLE_BASE is not worth keeping
+    if oracle_base or not cache:
+        return resolve_oraenv(module, database_name, oratab_loc, oracle_base)
+    
+    state = StateFile(cache)
+    cache_key = '{0}:{1}'.format(oratab_loc, database_name)
+    
+    cached = state.read().get(cache_key)
+    if cached and file_stamps(cached['stamps']) == cached['stamps']:
+        return (0, cached['environment'], None)
+    
+    rc, environment, errors = resolve_oraenv(module, database_name, oratab_loc)
+    
+    # orabase failing is not something to remember
+    if 'ORACLE_BASE' not in environment:
+        return (rc, environment, errors)
+    
+    oracle_home = environment['ORACLE_HOME']
+    stamps = file_stamps([
+        oratab_loc,
+        '{0}/{1}.env'.format(oracle_home, database_name),
+        '{0}/install/orabasetab'.format(oracle_home),
+    ])
+    
+    state.update({cache_key: {'stamps': stamps, 'environment': environment}})
+    
+    return (rc, environment, errors)
+
+def resolve_oraenv(module, database_name, oratab_loc='/etc/oratab', oracle_base=None):
+    """ Build the environment from oratab, orabase and the database env file """
     
     oratab_dict = oratab(oratab_loc)
     if database_name not in oratab_dict:
@@ -90,6 +687,7 @@ def oraenv(module, database_name, oratab_loc='/etc/oratab', oracle_base=None):
     
     if not oracle_base:
         rc, stdout, _ = module.run_command(['orabase'], environ_update=environment)
+        profiler(module).count(stdout, 1)
         
         if rc == 0:
            environment['ORACLE_BASE'] = stdout.strip() 
@@ -126,12 +724,41 @@ def oraenv(module, database_name, oratab_loc='/etc/oratab', oracle_base=None):
            
     return (0, environment, None)
 
+def client_environment(oracle_home=None, tns_admin=None):
+    """ The environment of an Oracle client connecting over TNS, rather than
+    on the database host
+    
+    oracle_home is a full client or an Instant Client directory, without one
+    sqlplus is found on the PATH
+    """
+    
+    environment = {}
+    
+    if oracle_home:
+        environment.update({
+            'ORACLE_HOME': oracle_home,
+            'PATH': ':'.join([
+                '{0}/bin'.format(oracle_home),
+                oracle_home,
+                os.environ.get('PATH', '/usr/bin:/bin'),
+            ]),
+            'LD_LIBRARY_PATH': '{0}/lib:{0}'.format(oracle_home),
+        })
+    
+    if tns_admin:
+        environment['TNS_ADMIN'] = tns_admin
+    
+    return environment
+
+def connect_string(user, password, connect):
+    """ CONN to a TNS alias, EZConnect string or connect descriptor """
+    
+    # a descriptor has to be one word to SQL*Plus
+    return '{0}/"{1}"@{2}'.format(user, password, ''.join(connect.split()))
+
 def sqlplus(module, sql, environment, raw_return=False, cd=None):
     """ Pass commands to SQL*Plus """
     
-    re_errors = re.compile(r'[A-Z]{2}\d-\d{4}:.*|[A-Z]{3}-\d{5,}:.*', re.MULTILINE)
-    re_sub_errors = re.compile(r'\*\nERROR at line \d{1,}:|[A-Z]{2}\d-\d{4}:.*|[A-Z]{3}-\d{5,}:.*', re.MULTILINE)
-    
     sqlplus_quiet_nolog = ['sqlplus', '-s', '/nolog']
     
     rc, stdout, stderr = module.run_command(
@@ -140,73 +767,1736 @@ def sqlplus(module, sql, environment, raw_return=False, cd=None):
         data=sql,
         environ_update=environment,
     )
+    profiler(module).count(stdout, 1)
     
     # most likely an error starting sqlplus and not the sql itself
     if stderr:
         return (rc, stdout, stderr)
     
-    # ORA-/SP2 etc errors are not written to stderr
-    query_errors = '\n'.join(re_errors.findall(stdout))
+    query_result, query_errors = sqlplus_output(stdout, raw_return)
     
-    # multi-block may be easier to debug without substitution
-    if raw_return:
-        query_result = stdout
-    else:
+    return (rc, query_result, query_errors)
+
+def sqlplus_output(stdout, raw_return=False):
+    """ Split SQL*Plus output into a result and any errors """
+    
+    parser = OutputParser(raw_return)
+    parser.feed(stdout.splitlines(True))
+    
+    return (parser.result(), parser.error_text())
+
+class OutputParser(object):
+    """ SQL*Plus output read once, a line at a time
+    
+    Each line is an error (ORA-, SP2-, PLS- ...), feedback (3 rows selected.,
+    Table created.), a timing (Elapsed: with SET TIMING ON) or a row. Output
+    can be fed as it is read, only the result text (or the raw output) and
+    the records are kept, not both.
+    """
+    
+    def __init__(self, raw_return=False, statement=None, rows=False):
+        self.raw_return = raw_return
+        self.statement = statement
+        self.line = 0
+        self.size = 0
+        self.error_at = None
+        self.pointer = None
+        self.output = []
+        self.rows = [] if rows else None
+        self.errors = []
+        self.feedback = []
+        self.timings = []
+        
+    def feed(self, lines):
+        """ Parse lines from any iterable, a list or a pipe
+        
+        Called for every line of output so the common case, a row, is kept
+        to a few substring tests without a regex or a method call
+        """
+        
+        raw_return = self.raw_return
+        output = self.output
+        rows = self.rows
+        
+        for self.line, line in enumerate(lines, self.line + 1):
+            self.size += len(line)
+            
+            if raw_return:
+                output.append(line)
+            
+            text = line.rstrip('\r\n')
+            last = text[-1:]
+            
+            # `*` under the column in error goes with the ERROR at line that
+            # follows, held back a line in case it is just a row
+            if self.pointer is not None:
+                pointer, self.pointer = self.pointer, None
+                
+                if not (last == ':' and re_error_at.match(text)):
+                    self.row(pointer)
+            
+            # a regex starting with a literal is quick to rule a line out,
+            # dates and timestamps have a - and : too
+            if '-' in text and re_error_hint.search(text):
+                match = re_error_code.search(text)
+                
+                if match:
+                    self.errors.append({
+                        'line': self.line,
+                        'statement': self.statement,
+                        'error_at': self.error_at,
+                        'code': match.group(1),
+                        'message': text[match.end():].strip(),
+                        'text': text[match.start():],
+                    })
+                    self.error_at = None
+                    continue
+            
+            if last == ':':
+                match = re_error_at.match(text)
+                
+                if match:
+                    self.error_at = int(match.group(1)) if match.group(1) else None
+                    continue
+            
+            elif last == '*' and text.strip() == '*':
+                self.pointer = text
+                continue
+            
+            elif last == '.' or text[:9] in ('Elapsed: ', 'no rows s'):
+                if self.other(text):
+                    continue
+            
+            if not raw_return:
+                output.append(text)
+            
+            if rows is not None and text.strip():
+                rows.append(text)
+    
+    def feed_line(self, line):
+        """ Parse one line, with or without its newline """
+        
+        self.feed((line,))
+    
+    def other(self, text):
+        """ Feedback or a timing line, False for a row """
+        
+        match = re_elapsed.match(text)
+        
+        if match:
+            hours, minutes, seconds = match.groups()
+            self.timings.append({
+                'line': self.line,
+                'text': text,
+                'elapsed': int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+            })
+        else:
+            match = re_feedback.match(text)
+            
+            if not match:
+                return False
+            
+            self.feedback.append({
+                'line': self.line,
+                'text': text,
+                'rows': int(match.group(1)) if match.group(1) else None,
+            })
+        
+        # still part of the result text as it has always been
+        if not self.raw_return:
+            self.output.append(text)
+        
+        return True
+    
+    def row(self, text):
+        """ A line which is not an error, feedback or timing """
+        
+        if not self.raw_return:
+            self.output.append(text)
+        
+        if self.rows is not None and text.strip():
+            self.rows.append(text)
+    
+    def close(self):
+        """ End of the output, a held back `*` was a row after all """
+        
+        if self.pointer is not None:
+            self.row(self.pointer)
+            self.pointer = None
+    
+    def result(self):
+        """ The raw output, or the output without errors cast to int/float """
+        
+        self.close()
+        
+        # multi-block may be easier to debug without substitution
+        if self.raw_return:
+            return ''.join(self.output)
+        
         # at a playbook/role level I found it easier to cast ints and floats here
         # before sending back to 'Ansible' which will then handle them properly
         # rather than having to use filters constantly
-        query_result = str_to_intfl(re_sub_errors.sub("", stdout))
+        query_result = '\n'.join(self.output).strip()
+        
+        # more than one line is never a number, no need to try the whole lot
+        if '\n' in query_result:
+            return query_result
+        
+        return str_to_intfl(query_result)
     
-    return (rc, query_result, query_errors)
+    def error_text(self):
+        """ Errors one per line, as they have always been returned """
+        
+        return '\n'.join(error['text'] for error in self.errors)
     
-def table_as_csv(module, environment, table, columns, predicates=None):
-    """ Fetch and send back the contents of a table in CSV format """
+    def summary(self):
+        """ The records as a dictionary, for a result per statement """
+        
+        self.close()
+        counts = [feedback['rows'] for feedback in self.feedback if feedback['rows'] is not None]
+        
+        return {
+            'rows': self.rows,
+            'row_count': counts[-1] if counts else None,
+            'errors': self.errors,
+            'feedback': [feedback['text'] for feedback in self.feedback],
+            'elapsed': sum(timing['elapsed'] for timing in self.timings) if self.timings else None,
+        }
+
+def comment_open(text, comment=False):
+    """ Whether a line leaves a /* comment open, given whether it started in one """
     
-    # a 12.1 and earlier way of creating CSVs
-    # sqlplus 12.2+ has newer syntax to make this a lot easier
+    position = 0
+    quoted = False
     
-    # made with performance, catalog or data dict. views/tables in mind.
-    # Not your application table with loads of data in it
+    while position < len(text):
+        if comment:
+            close = text.find('*/', position)
+            
+            if close < 0:
+                return True
+            
+            comment, position = False, close + 2
+            continue
+        
+        if text[position] == "'":
+            quoted = not quoted
+        elif not quoted and text.startswith('--', position):
+            return False
+        elif not quoted and text.startswith('/*', position):
+            comment, position = True, position + 2
+            continue
+        
+        position += 1
     
-    # start building a cursor
-    sql_columns = ','.join(columns)
+    return comment
+
+def split_statements(sql):
+    """ A script as a list of statements
     
-    sql_cursor = '''
-        CURSOR query_data IS
-        SELECT {0}
-          FROM {1}
-    '''.format(sql_columns, table)
-       
-    if predicates is not None:
-        sql_cursor += ' WHERE {0}'.format(predicates)
+    SQL*Plus commands end with the line (or carry on with a trailing -), SQL
+    with a ; or a / and PL/SQL blocks with a / on its own
     
-    # should handle function calls with column aliases but not robustly tested
-    l_output_columns = "||','||".join([
-        "row." + col for col in (line.split()[-1] for line in columns)
-    ])
+    A script ending part way through a block, a /* comment or a continued
+    command raises UnterminatedStatement, SQL*Plus would take whatever was
+    sent after it as more of the same and never finish
+    """
     
-    dynamic_sql = '''
-        CONN / AS SYSDBA
-        SET LINES 1000 PAGES 0 FEEDBACK OFF SERVEROUT ON
-        DECLARE
-            {0};
-            l_output VARCHAR2(32767);
-        BEGIN
-            FOR row IN query_data LOOP
-                l_output := {1};
-                DBMS_OUTPUT.put_line(l_output);
-            END LOOP;
-        END;
-        /
-    '''.format(sql_cursor, l_output_columns)
+    statements = []
+    buffer = []
+    kind = None
+    comment = False
+    start = 0
+    
+    for number, line in enumerate(sql.splitlines(), 1):
+        text = line.strip()
+        
+        if kind is None:
+            # comments and blank lines between statements are not sent
+            if comment or text.startswith('/*'):
+                start = start if comment else number
+                comment = comment_open(text, comment)
+                continue
+            
+            if not text or text.startswith('--'):
+                continue
+            
+            word = text.split()[0].upper()
+            start = number
+            
+            if text == '/':
+                kind = 'sql'
+            elif re_plsql.match(text):
+                kind = 'block'
+            elif word.startswith('@') or word in SQLPLUS_COMMANDS:
+                kind = 'command'
+            else:
+                kind = 'sql'
+        
+        buffer.append(line)
+        
+        if kind == 'command':
+            done = not text.endswith('-')
+        elif kind == 'block':
+            done = text == '/'
+        else:
+            # a blank line ends (without running) an unterminated SQL buffer,
+            # unless it is in a comment
+            comment = comment_open(text, comment)
+            done = not comment and (text == '/' or text.endswith(';') or not text)
+        
+        if done:
+            statements.append('\n'.join(buffer).strip())
+            buffer = []
+            kind = None
     
-    rc, stdout, stderr = sqlplus(module, dynamic_sql, environment, True)
+    if comment:
+        raise UnterminatedStatement('The /* comment at line {0} is not closed'.format(start))
     
-    if not stderr:
-        return (0, stdout, stderr)
-    else:
-        return (1, stdout, stderr)
+    if kind == 'block':
+        raise UnterminatedStatement('The PL/SQL block at line {0} needs a / on a line of its own'.format(start))
     
+    if kind == 'command':
+        raise UnterminatedStatement('The command at line {0} is continued with - past the end'.format(start))
+            
+    if buffer:
+        statements.append('\n'.join(buffer).strip())
+    
+    return statements
+
+class SQLPlusSession(object):
+    """ One SQL*Plus process for many statements
+    
+    Each statement is followed by a PROMPT of a marker unique to the session,
+    output is read up to the marker so results come back per statement for
+    the cost of a single process spawn and logon.
+    
+    With a timeout the process is killed that many seconds after it starts,
+    whatever it is doing, and the statement running fails.
+    """
+    
+    def __init__(self, module, environment, connect='/ AS SYSDBA', cd=None, timeout=None):
+        self.module = module
+        self.environment = environment
+        self.connect = connect
+        self.cd = cd
+        self.timeout = timeout
+        self.timer = None
+        self.timed_out = False
+        self.process = None
+        self.errors = None
+        self.marker = 'NOH-{0}'.format(binascii.hexlify(os.urandom(8)).decode())
+        
+    def __enter__(self):
+        self.open()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+        
+    def open(self):
+        """ Start SQL*Plus and logon """
+        
+        with profiler(self.module).phase('logon', database=self.environment.get('ORACLE_SID')):
+            self.timed_out = False
+            env = dict(os.environ)
+            env.update(self.environment)
+            
+            # the binary is found on the PATH from oraenv, same as run_command
+            # which is not used here as older releases update os.environ in place
+            # and a session can be opened from any thread
+            try:
+                self.process = subprocess.Popen(
+                    ['sqlplus', '-s', '/nolog'],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    cwd=self.cd,
+                    env=env,
+                    universal_newlines=True,
+                )
+            except OSError as fault:
+                self.errors = str(fault)
+                return (1, None, self.errors)
+            
+            profiler(self.module).count(subprocesses=1)
+            
+            if self.timeout:
+                self.timer = threading.Timer(self.timeout, self.kill, [self.process])
+                self.timer.daemon = True
+                self.timer.start()
+            
+            if self.connect:
+                rc, _, errors = self.execute('CONN {0}'.format(self.connect), True)
+                
+                if errors:
+                    self.close()
+                    self.errors = errors
+                    return (1, None, errors)
+                
+            return (0, None, None)
+        
+    def execute(self, sql, raw_return=False):
+        """ Run one statement (or block) and return its output """
+        
+        parser = OutputParser(raw_return)
+        rc, errors = self.parse(sql, parser)
+        
+        if errors:
+            return (rc, '', errors)
+        
+        query_result, query_errors = parser.result(), parser.error_text()
+        
+        if rc != 0 and not query_errors:
+            query_errors = 'SQL*Plus exited with {0}'.format(rc)
+            
+        return (rc, query_result, query_errors)
+    
+    def parse(self, sql, parser):
+        """ Run one statement (or block) feeding its output to parser
+        
+        Returns (rc, errors), errors only when the statement could not be sent
+        and the rc of SQL*Plus if it ended (an EXIT in the sql or it died)
+        """
+        
+        if self.process is None or self.process.poll() is not None:
+            return (1, self.errors or 'SQL*Plus session is not open')
+        
+        # a blank line ends an unterminated SQL buffer (SQLBLANKLINES OFF)
+        # so the marker is always run as a SQL*Plus command
+        try:
+            self.process.stdin.write('{0}\n\nPROMPT {1}\n'.format(sql.rstrip(), self.marker))
+            self.process.stdin.flush()
+        except (IOError, OSError) as fault:
+            return (1, str(fault))
+        
+        size = parser.size
+        rc = None
+        
+        for line in iter(self.process.stdout.readline, ''):
+            if line.rstrip('\n') == self.marker:
+                rc = 0
+                break
+            parser.feed_line(line)
+        
+        profiler(self.module).count(size=parser.size - size)
+        
+        if rc is None:
+            # EOF before the marker
+            rc = self.process.wait()
+            
+            if self.timed_out:
+                return (rc, 'Timed out after {0} seconds'.format(self.timeout))
+        
+        return (rc, None)
+    
+    def execute_script(self, sql, raw_return=False):
+        """ Send sql as the rest of the input and read to EOF
+        
+        For scripts which may EXIT or leave a block open, the session ends here
+        """
+        
+        if self.process is None or self.process.poll() is not None:
+            return (1, '', self.errors or 'SQL*Plus session is not open')
+        
+        stdout, _ = self.process.communicate(sql)
+        profiler(self.module).count(stdout)
+        rc = self.process.returncode
+        self.process = None
+        
+        query_result, query_errors = sqlplus_output(stdout, raw_return)
+        
+        if self.timed_out:
+            query_errors = 'Timed out after {0} seconds'.format(self.timeout)
+        elif rc != 0 and not query_errors:
+            query_errors = 'SQL*Plus exited with {0}'.format(rc)
+        
+        return (rc, query_result, query_errors)
+    
+    def execute_many(self, statements, raw_return=False):
+        """ Run each statement in turn, a list of (rc, result, errors) """
+        
+        return [self.execute(sql, raw_return) for sql in statements]
+    
+    def execute_statements(self, sql, stop_on_error=False):
+        """ Split sql and run one statement at a time, returns (rc, statements, errors)
+        
+        Each statement is its sql, rc and rows, errors, feedback and elapsed
+        time. An EXIT ends the session and the statements after it, as does
+        the first statement with an error with stop_on_error. Nothing is run
+        when the sql ends in an unterminated block, comment or command
+        """
+        
+        statements = []
+        ended = []
+        
+        try:
+            split_sql = split_statements(sql)
+        except UnterminatedStatement as fault:
+            return (1, statements, str(fault))
+        
+        for number, statement_sql in enumerate(split_sql, 1):
+            parser = OutputParser(statement=number, rows=True)
+            rc, errors = self.parse(statement_sql, parser)
+            
+            # SQL*Plus did not start, or an EXIT has ended the session
+            if errors:
+                if not statements:
+                    return (1, statements, errors)
+                
+                # an EXIT ends the session quietly, a timeout is an error
+                if self.timed_out:
+                    ended.append(errors)
+                break
+            
+            statement = {
+                'statement': number,
+                'sql': statement_sql,
+                'rc': rc,
+            }
+            statement.update(parser.summary())
+            statements.append(statement)
+            
+            if stop_on_error and statement['errors']:
+                break
+        
+        errors = '\n'.join(
+            [error['text'] for statement in statements for error in statement['errors']] + ended
+        )
+        
+        rc = max([statement['rc'] for statement in statements] or [0])
+        
+        return (rc or int(bool(errors)), statements, errors)
+    
+    def kill(self, process):
+        """ Give up on the session, run by the timer """
+        
+        self.timed_out = True
+        
+        try:
+            process.kill()
+        except OSError:
+            # already finished
+            pass
+    
+    def close(self):
+        """ Logoff and wait for SQL*Plus to finish """
+        
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        
+        if self.process is None:
+            return None
+        
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.write('EXIT\n')
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        
+        # drain anything left so sqlplus is not blocked on a full pipe
+        self.process.stdout.read()
+        self.process.stdout.close()
+        rc = self.process.wait()
+        self.process = None
+        
+        return rc
+    
+def keyset_query(sql_query, order_by=None, after_key=None, max_rows=None):
+    """ Order a query and limit it to max_rows after after_key
+    
+    With either set the order_by column is the key of keyset pagination,
+    the next page starts after the last key rather than at an offset so no
+    page reads the rows before it. Rows with a NULL key are left out as
+    they cannot be paged past. ROWNUM rather than FETCH FIRST for 11g
+    """
+    
+    if order_by is not None and (after_key is not None or max_rows is not None):
+        sql_query = 'SELECT * FROM ({0}) WHERE {1} IS NOT NULL'.format(sql_query, order_by)
+        
+        # quoted whatever the type, Oracle converts it for a NUMBER or DATE
+        if after_key is not None:
+            sql_query += " AND {0} > '{1}'".format(order_by, str(after_key).replace("'", "''"))
+    
+    # a column alias can be used in either form of the query
+    if order_by is not None:
+        sql_query += ' ORDER BY {0}'.format(order_by)
+    
+    if max_rows is not None:
+        sql_query = 'SELECT * FROM ({0}) WHERE ROWNUM <= {1}'.format(sql_query, int(max_rows))
+    
+    return sql_query
+
+def keyset_pages(fetch, key_index, after_key=None, max_rows=None, page_size=None):
+    """ Rows a page at a time, returns (rc, rows, errors)
+    
+    fetch(after_key, limit) runs one query for at most limit rows after the
+    key, each page starts after the last key of the one before. One row more
+    than max_rows is fetched so keyset_truncate() can tell there are more
+    
+    The key has to be unique to page by, a page ending part way through rows
+    with the same key would skip the rest of them. Each page fetches a row
+    more to look past its end and paging fails on a key seen twice
+    """
+    
+    limit = None if max_rows is None else max_rows + 1
+    paging = key_index is not None and (page_size is not None or limit is not None)
+    rows = []
+    
+    while True:
+        size = page_size
+        
+        if limit is not None:
+            size = min(size or limit, limit - len(rows))
+        
+        rc, page, errors = fetch(after_key, size + 1 if page_size else size)
+        if errors:
+            return (rc, rows, errors)
+        
+        more = bool(page_size) and len(page) > size
+        
+        if paging:
+            keys = [row[key_index] for row in rows[-1:] + page]
+            repeated = [key for key, following in zip(keys, keys[1:]) if key == following]
+            
+            if repeated:
+                return (1, rows, 'The key {0} is on more than one row, paging needs a unique key'.format(repeated[0]))
+        
+        rows.extend(page[:size] if more else page)
+        
+        if not more or len(rows) == limit:
+            return (0, rows, '')
+        
+        after_key = rows[-1][key_index]
+
+def keyset_truncate(rows, max_rows, key_index=None):
+    """ Rows cut to max_rows, returns (rows, truncated, next_token)
+    
+    The token is the key of the last row returned, pass it back as after_key
+    for the next page. There is none without a key
+    """
+    
+    if max_rows is None or len(rows) <= max_rows:
+        return (rows, False, None)
+    
+    rows = rows[:max_rows]
+    
+    if key_index is None or not rows:
+        return (rows, True, None)
+    
+    return (rows, True, rows[-1][key_index])
+
+def table_as_csv(module, environment, table, columns, predicates=None, session=None, order_by=None,
+                 after_key=None, max_rows=None, row_hash=False, hash_key=None, hashes=None):
+    """ Fetch and send back the contents of a table, one row per line
+    
+    Each column is written as its length, a colon and the value (or - and a
+    colon for NULL) so any text survives, read it back with decode_rows()
+    
+    With row_hash a hash of each row is added as a last column, with
+    hash_key (a column or alias) only that column and the hash are sent.
+    hashes limits the rows to those with one of the hashes
+    """
+    
+    # a 12.1 and earlier way of creating CSVs
+    # sqlplus 12.2+ has newer syntax to make this a lot easier
+    
+    # made with performance, catalog or data dict. views/tables in mind.
+    # Not your application table with loads of data in it
+    
+    # start building a cursor
+    sql_query = 'SELECT {0} FROM {1}'.format(','.join(columns), table)
+       
+    if predicates is not None:
+        sql_query += ' WHERE {0}'.format(predicates)
+    
+    sql_cursor = '''
+        CURSOR query_data IS
+        {0}
+    '''.format(keyset_query(sql_query, order_by, after_key, max_rows))
+    
+    # should handle function calls with column aliases but not robustly tested
+    l_output_columns = "||".join([
+        "NVL(TO_CHAR(LENGTH(row.{0})), '-')||':'||row.{0}".format(col)
+            for col in (line.split()[-1] for line in columns)
+    ])
+    
+    # the hash is of the encoded row, which is unambiguous about NULLs and
+    # not limited to 4000 bytes the way ORA_HASH over || would be
+    if row_hash or hash_key is not None:
+        if hash_key is not None:
+            l_row = "NVL(TO_CHAR(LENGTH(row.{0})), '-')||':'||row.{0}".format(hash_key)
+        else:
+            l_row = 'l_output'
+        
+        l_put_line = "DBMS_OUTPUT.put_line({0}||LENGTH(l_hash)||':'||l_hash||'{1}');".format(l_row, ROW_END)
+        
+        if hashes:
+            l_put_line = 'IF l_hash IN ({0}) THEN {1} END IF;'.format(
+                ','.join("'{0}'".format(value) for value in hashes), l_put_line
+            )
+        
+        l_put_line = 'l_hash := TO_CHAR(DBMS_UTILITY.GET_HASH_VALUE(l_output, 0, {0}));\n                {1}'.format(
+            ROW_HASH_SIZE, l_put_line
+        )
+    else:
+        l_put_line = "DBMS_OUTPUT.put_line(l_output||'{0}');".format(ROW_END)
+    
+    # nothing can be wrapped for the lengths to hold, each row ends in
+    # ROW_END so trimming the padding leaves the values whole
+    dynamic_sql = '''
+        SET LINES 32767 PAGES 0 FEEDBACK OFF TRIMOUT ON
+        SET SERVEROUT ON SIZE UNLIMITED FORMAT WRAPPED
+        DECLARE
+            {0};
+            l_output VARCHAR2(32767);
+            l_hash VARCHAR2(10);
+        BEGIN
+            FOR row IN query_data LOOP
+                l_output := {1};
+                {2}
+            END LOOP;
+        END;
+        /
+    '''.format(sql_cursor, l_output_columns, l_put_line)
+    
+    # an open session is already connected
+    if session is not None:
+        rc, stdout, stderr = session.execute(dynamic_sql, True)
+    else:
+        dynamic_sql = 'CONN / AS SYSDBA\n' + dynamic_sql
+        rc, stdout, stderr = sqlplus(module, dynamic_sql, environment, True)
+    
+    if not stderr:
+        return (0, stdout, stderr)
+    else:
+        return (1, stdout, stderr)
+    
+def decode_rows(stdout, width, skipped=None):
+    """ Read back the rows written by table_as_csv, width columns each
+    
+    A single pass over the output, lines which are not rows (errors or other
+    noise) are skipped and added to the skipped list when one is given, see
+    warn_skipped(). Each row ends in ROW_END. NULL is returned as None
+    """
+    
+    # lengths are in characters
+    if not isinstance(stdout, type(u'')):
+        stdout = stdout.decode('utf-8', 'replace')
+    
+    position = 0
+    end = len(stdout)
+    
+    while position < end:
+        line_start = position
+        row = []
+        
+        try:
+            for _ in range(width):
+                colon = stdout.index(':', position)
+                length = stdout[position:colon]
+                
+                if length == '-':
+                    row.append(None)
+                    position = colon + 1
+                elif length.isdigit():
+                    position = colon + 1 + int(length)
+                    row.append(stdout[colon + 1:position])
+                else:
+                    raise ValueError('not a row')
+                    
+            row_end = re_row_end.match(stdout, position) if position <= end else None
+            
+            if row_end is None:
+                raise ValueError('not a row')
+        except ValueError:
+            newline = stdout.find('\n', line_start)
+            position = end if newline == -1 else newline + 1
+            
+            if skipped is not None and stdout[line_start:position].strip():
+                skipped.append(stdout[line_start:position].rstrip())
+            continue
+        
+        position = row_end.end()
+        yield row
+
+def warn_skipped(module, skipped):
+    """ Warn of output lines decode_rows() could not read as rows """
+    
+    if skipped:
+        module.warn('{0} lines of output were not rows and were skipped, the first: {1}'.format(
+            len(skipped), skipped[0][:200]
+        ))
+
+def sqlplus_release(module, environment, session=None):
+    """ SQL*Plus client release as an int e.g. 1902000000 """
+    
+    sql = 'DEFINE _SQLPLUS_RELEASE'
+    
+    if session is not None:
+        rc, stdout, stderr = session.execute(sql, True)
+    else:
+        rc, stdout, stderr = sqlplus(module, sql, environment, True)
+        
+    release = re.search(r'_SQLPLUS_RELEASE\s*=\s*"(\d+)"', stdout or '')
+    
+    if stderr or not release:
+        return (1, 0, stderr or stdout)
+    
+    return (0, int(release.group(1)), stderr)
+
+def table_spool(module, environment, table, columns, predicates=None, session=None, order_by=None,
+                after_key=None, max_rows=None):
+    """ Spool the contents of a table to a CSV file, returns the file path
+    
+    Nothing is held in the database session or read from stdout, the caller
+    reads the file back with spool_rows() which raises SpoolError for errors
+    in the file
+    """
+    
+    tmpdir = getattr(module, 'tmpdir', None)
+    
+    # SPOOL adds .lst to a file without an extension
+    fd, spool_file = tempfile.mkstemp(suffix='.csv', dir=tmpdir)
+    os.close(fd)
+    
+    sql_query = 'SELECT {0} FROM {1}'.format(','.join(columns), table)
+    
+    if predicates is not None:
+        sql_query += ' WHERE {0}'.format(predicates)
+    
+    sql_query = keyset_query(sql_query, order_by, after_key, max_rows)
+    
+    # SET MARKUP CSV came with the 12.2 client, before that each column is
+    # quoted and concatenated in the query itself
+    _, release, _ = sqlplus_release(module, environment, session)
+    
+    if release >= 1202000000:
+        sql_markup = 'SET MARKUP CSV ON DELIMITER , QUOTE ON'
+    else:
+        sql_markup = ''
+        sql_query = 'SELECT {0} FROM ({1})'.format(
+            "||','||".join([
+                "'\"'||REPLACE({0}, '\"', '\"\"')||'\"'".format(col)
+                    for col in (line.split()[-1] for line in columns)
+            ]),
+            sql_query,
+        )
+        
+        # the quoted columns have to keep the order
+        if order_by is not None:
+            sql_query += ' ORDER BY {0}'.format(order_by)
+    
+    # TERMOUT OFF is only honoured when running a script so the query is
+    # written to one rather than piped in
+    fd, script_file = tempfile.mkstemp(suffix='.sql', dir=tmpdir)
+    
+    with os.fdopen(fd, 'w') as script:
+        script.write('''
+SET TERMOUT OFF FEEDBACK OFF HEADING OFF PAGES 0 ECHO OFF VERIFY OFF
+SET LINES 32767 TRIMSPOOL ON LONG 32767 ARRAYSIZE 500
+{0}
+SPOOL {1}
+{2};
+SPOOL OFF
+SET TERMOUT ON
+'''.format(sql_markup, spool_file, sql_query))
+    
+    try:
+        if session is not None:
+            rc, stdout, stderr = session.execute('@{0}'.format(script_file), True)
+        else:
+            rc, stdout, stderr = sqlplus(
+                module, 'CONN / AS SYSDBA\n@{0}\n'.format(script_file), environment, True
+            )
+    finally:
+        os.remove(script_file)
+    
+    # with TERMOUT OFF errors only go to the spool file, where they can be
+    # anywhere (ORA-01555 part way through), they are found as it is read
+    if stderr:
+        os.remove(spool_file)
+        return (1, None, stderr)
+    
+    return (0, spool_file, stderr)
+
+def spool_lines(fd):
+    """ Lines of a spool file, raises SpoolError at the first error
+    
+    Text is quoted so a record cannot start with an error code, only lines
+    starting a record are checked, not those inside a quoted value
+    """
+    
+    quoted = False
+    
+    for line in fd:
+        if not quoted and re_spool_errors.match(line):
+            # the error and any after it, e.g. ORA-01555 then its cause
+            raise SpoolError('\n'.join([line.rstrip('\r\n')] + re_spool_errors.findall(fd.read())))
+        
+        # a doubled quote inside a value toggles twice
+        if line.count('"') % 2:
+            quoted = not quoted
+        
+        yield line
+
+def spool_rows(spool_file, chunk_size=1000, remove=True):
+    """ Read a spooled CSV file back a chunk of rows at a time
+    
+    Raises SpoolError when the query failed, wherever that is in the file.
+    Oracle has no empty string so an empty field is NULL, returned as None as
+    decode_rows() does
+    """
+    
+    try:
+        with open(spool_file, 'r') as fd:
+            chunk = []
+            
+            for row in csv.reader(spool_lines(fd)):
+                if not row:
+                    continue
+                
+                chunk.append([value if value != '' else None for value in row])
+                
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+                    
+            if chunk:
+                yield chunk
+    finally:
+        if remove and os.path.exists(spool_file):
+            os.remove(spool_file)
+
+def merge_sorted(slices, key_index, numeric=False):
+    """ Merge lists of rows each already sorted on the column at key_index
+    
+    With numeric (the key is a NUMBER, see key_type()) keys are compared as
+    decimals, otherwise as text by code point. That is the order of ORDER BY
+    with NLS_SORT = BINARY for a NUMBER or a VARCHAR2 in an AL32UTF8
+    database, any other type or character set may merge in another order
+    than the one query would return. NULLs sort last
+    """
+    
+    def decorate(number, rows):
+        for position, row in enumerate(rows):
+            if row[key_index] is None or row[key_index] == '':
+                key = (1, 0)
+            elif numeric:
+                key = (0, Decimal(row[key_index]))
+            else:
+                key = (0, row[key_index])
+                
+            yield (key, number, position, row)
+    
+    # heapq.merge only takes a key from 3.5
+    for merged in heapq.merge(*[decorate(number, rows) for number, rows in enumerate(slices)]):
+        yield merged[3]
+
+# dates and numbers in a form the column converters can rely on
+NLS_ISO = '''
+ALTER SESSION SET NLS_DATE_FORMAT = 'YYYY-MM-DD"T"HH24:MI:SS';
+ALTER SESSION SET NLS_TIMESTAMP_FORMAT = 'YYYY-MM-DD"T"HH24:MI:SS.FF6';
+ALTER SESSION SET NLS_TIMESTAMP_TZ_FORMAT = 'YYYY-MM-DD"T"HH24:MI:SS.FF6TZH:TZM';
+ALTER SESSION SET NLS_NUMERIC_CHARACTERS = '.,';
+'''
+
+# DESC types compared as numbers
+NUMBER_TYPES = ('NUMBER', 'FLOAT', 'BINARY_FLOAT', 'BINARY_DOUBLE', 'INTEGER')
+
+def describe(desc_output):
+    """ Parse the output of DESC into a list of columns
+    
+    Each column is a dictionary of name, nullable, type (e.g. NUMBER),
+    precision and scale
+    """
+    
+    re_type = re.compile(r'([A-Z][A-Z0-9_ ]*[A-Z0-9_])(?:\((\d+|\*)(?:,\s*(-?\d+))?(?:\s+\w+)?\))?')
+    
+    schema = []
+    
+    # skip the header and the line of dashes
+    for line in desc_output.split('\n')[2:]:
+        words = line.split()
+        
+        if not words:
+            continue
+        
+        if words[1:3] == ['NOT', 'NULL']:
+            nullable = False
+            data_type = ' '.join(words[3:])
+        else:
+            nullable = True
+            data_type = ' '.join(words[1:])
+        
+        type_match = re_type.match(data_type)
+        
+        schema.append({
+            'name': words[0],
+            'nullable': nullable,
+            'type': type_match.group(1) if type_match else data_type,
+            'precision': int(type_match.group(2)) if type_match and type_match.group(2) not in (None, '*') else None,
+            'scale': int(type_match.group(3)) if type_match and type_match.group(3) else None,
+        })
+        
+    return schema
+
+def column_converter(column):
+    """ A function turning the text of a column into the value to return """
+    
+    def to_int(value):
+        if not value:
+            return None
+        
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        
+        # beyond the range TO_CHAR will print as an integer
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    
+    def to_number(value):
+        if not value:
+            return None
+        
+        try:
+            if '.' in value or 'E' in value:
+                return float(value)
+        
+            return int(value)
+        except ValueError:
+            # nothing else should get here, returned as Oracle printed it
+            return value
+    
+    def to_float(value):
+        if not value:
+            return None
+        
+        # Inf, -Inf and Nan as well as numbers, all of which float() takes
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    
+    def unchanged(value):
+        return value
+    
+    if column['type'] == 'NUMBER' and column['precision'] is not None and not column['scale']:
+        return to_int
+    
+    if column['type'] in ('BINARY_FLOAT', 'BINARY_DOUBLE'):
+        return to_float
+    
+    if column['type'] in NUMBER_TYPES:
+        return to_number
+    
+    # dates and timestamps are already ISO 8601 with NLS_ISO, everything else
+    # is text
+    return unchanged
+
+def table_schema(module, environment, table, session):
+    """ Column names and converters of a table, returns (rc, (columns, converters), errors)
+    
+    Dates and timestamps in the session are set to ISO 8601 to match
+    """
+    
+    with profiler(module).phase('describe', database=environment.get('ORACLE_SID'), table=table):
+        _, table_desc, table_desc_err = session.execute('DESC {0}'.format(table))
+    if table_desc_err:
+        return (1, None, table_desc_err)
+    
+    # column names and types, each column gets a converter up front rather
+    # than guessing at every value
+    schema = describe(table_desc)
+    
+    columns = [column['name'] for column in schema]
+    converters = [column_converter(column) for column in schema]
+    
+    session.execute(NLS_ISO)
+    
+    return (0, (columns, converters), '')
+
+def key_type(module, environment, table, columns, key, session):
+    """ The DESC type of the column a key (a column or alias) selects, returns (rc, type, errors)
+    
+    The type is None when the key is an expression rather than a column
+    """
+    
+    expressions = {}
+    
+    for line in columns:
+        words = line.upper().split()
+        
+        # the expression before the alias, or a column on its own
+        expressions[words[-1]] = ' '.join(words[:-2] if words[-2:-1] == ['AS'] else words[:-1] or words)
+    
+    column = expressions.get(key.upper(), key.upper())
+    
+    with profiler(module).phase('describe', database=environment.get('ORACLE_SID'), table=table):
+        _, table_desc, table_desc_err = session.execute('DESC {0}'.format(table))
+    if table_desc_err:
+        return (1, None, table_desc_err)
+    
+    types = dict((entry['name'], entry['type']) for entry in describe(table_desc))
+    
+    return (0, types.get(column), '')
+
+def table_rows(module, environment, table, session, predicates=None, order_by=None,
+               after_key=None, max_rows=None, page_size=None):
+    """ Columns and typed rows of a table, returns (rc, (columns, rows), errors)
+    
+    DESC, the session formats and the cursor all go through the one session.
+    With order_by (a column name) the rows can be fetched page_size at a
+    time and are keyset paged, see keyset_pages() and keyset_truncate()
+    """
+    
+    phase = profiler(module).phase
+    database = environment.get('ORACLE_SID')
+    
+    rc, schema, errors = table_schema(module, environment, table, session)
+    if errors:
+        return (rc, None, errors)
+    
+    columns, converters = schema
+    
+    if order_by is not None:
+        order_by = order_by.upper()
+        
+        if order_by not in columns:
+            return (1, None, 'No column {0} in {1}'.format(order_by, table))
+        
+        # the order has to agree with > on the key
+        session.execute('ALTER SESSION SET NLS_SORT = BINARY;')
+    
+    def fetch(after_key, limit):
+        with phase('table_as_csv', database=database, table=table):
+            _, table_data, table_data_err = table_as_csv(
+                module, environment, table, columns, predicates, session, order_by, after_key, limit
+            )
+        if table_data_err:
+            return (1, table_data, table_data_err)
+        
+        skipped = []
+        
+        with phase('parse', database=database, table=table):
+            rows = [
+                [convert(value) for convert, value in zip(converters, row)]
+                    for row in decode_rows(table_data, len(columns), skipped)
+            ]
+        
+        warn_skipped(module, skipped)
+        
+        return (0, rows, '')
+    
+    key_index = columns.index(order_by) if order_by is not None else None
+    
+    rc, rows, errors = keyset_pages(fetch, key_index, after_key, max_rows, page_size)
+    if errors:
+        return (rc, None, errors)
+    
+    return (0, (columns, rows), '')
+
+def snapshot_path(name, database_name, table):
+    """ The file on the target the row hashes of a table are kept in """
+    
+    return '{0}/snapshot_{1}_{2}_{3}.json'.format(STATE_DIR, database_name, table.lower(), name)
+
+def table_delta(module, environment, table, columns, key, snapshot_file, predicates=None, session=None):
+    """ Rows added or changed and keys removed since the last run, returns
+    (rc, (added, changed, removed), errors)
+    
+    The snapshot is a hash of each row by its key, kept in snapshot_file.
+    Only keys and hashes come back to compare with it, then only the rows
+    whose hash differs. On the first run (or once the columns, predicates or
+    key change) every row is added. Rows with a NULL key are left out
+    """
+    
+    phase = profiler(module).phase
+    labels = {'database': environment.get('ORACLE_SID'), 'table': table}
+    
+    key = key.upper()
+    key_index = [line.split()[-1].upper() for line in columns].index(key)
+    
+    snapshot = StateFile(snapshot_file)
+    query = [table, list(columns), predicates, key]
+    
+    document = snapshot.read()
+    previous = document.get('hashes', {}) if document.get('query') == query else {}
+    
+    with phase('row_hashes', **labels):
+        _, hash_data, hash_err = table_as_csv(
+            module, environment, table, columns, predicates, session, hash_key=key
+        )
+    if hash_err:
+        return (1, hash_data, hash_err)
+    
+    skipped = []
+    
+    # a NULL key cannot be told apart from another
+    hashes = dict((row[0], row[1]) for row in decode_rows(hash_data or '', 2, skipped) if row[0] is not None)
+    
+    wanted = dict((row_key, row_hash) for row_key, row_hash in hashes.items() if previous.get(row_key) != row_hash)
+    removed = sorted(row_key for row_key in previous if row_key not in hashes)
+    
+    added = []
+    changed = []
+    
+    if wanted:
+        with phase('table_as_csv', **labels):
+            _, table_data, table_data_err = table_as_csv(
+                module, environment, table, columns, predicates, session, key, row_hash=True,
+                hashes=sorted(set(wanted.values())) if len(wanted) <= ROW_HASH_FILTER else None,
+            )
+        if table_data_err:
+            return (1, table_data, table_data_err)
+        
+        with phase('parse', **labels):
+            for row in decode_rows(table_data, len(columns) + 1, skipped):
+                row_hash = row.pop()
+                
+                # changed again since the hashes were read, the next run
+                # will see it
+                if wanted.get(row[key_index]) != row_hash:
+                    continue
+                
+                if row[key_index] in previous:
+                    changed.append(row)
+                else:
+                    added.append(row)
+    
+    warn_skipped(module, skipped)
+    
+    if not snapshot.update({'query': query, 'hashes': hashes}):
+        module.warn('Cannot write snapshot {0}'.format(snapshot.path))
+    
+    return (0, (added, changed, removed), '')
+
+def columnar(columns, rows):
+    """ Rows as a dictionary of column: list of values, each name once """
+    
+    return dict(
+        (column, [row[index] for row in rows]) for index, column in enumerate(columns)
+    )
+
+def file_sha256(path):
+    """ Checksum of a file, None when there is no file """
+    
+    checksum = hashlib.sha256()
+    
+    try:
+        with open(path, 'rb') as fd:
+            for block in iter(lambda: fd.read(65536), b''):
+                checksum.update(block)
+    except (IOError, OSError):
+        return None
+    
+    return checksum.hexdigest()
+
+def write_rows(path, columns, rows, file_format='jsonl', chunk_size=1000):
+    """ Write rows to a gzip JSON Lines or CSV file, returns (rc, result, errors)
+    
+    The result is the path, row count and sha256 of the file (as fetch would
+    see it) and whether it changed. Written beside the destination and
+    renamed over it so a reader never sees half a file, with no timestamp
+    in the gzip header so the same rows give the same checksum
+    """
+    
+    path = os.path.expanduser(path)
+    dest_dir = os.path.dirname(path) or '.'
+    
+    try:
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir, 0o700)
+        
+        fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix='.{0}.'.format(os.path.basename(path)))
+    except (IOError, OSError) as fault:
+        return (1, None, str(fault))
+    
+    count = 0
+    rows = iter(rows)
+    
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            archive = gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0)
+            
+            if file_format == 'csv':
+                archive.write(','.join(columns).encode('utf-8') + b'\n')
+            
+            # formatted a chunk of rows at a time, not held as one document,
+            # rows can be a generator reading a spool file
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                
+                if not chunk:
+                    break
+                
+                if file_format == 'csv':
+                    buffer = StringIO()
+                    writer = csv.writer(buffer, lineterminator='\n')
+                    writer.writerows(['' if value is None else value for value in row] for row in chunk)
+                    data = buffer.getvalue()
+                else:
+                    data = ''.join(
+                        json.dumps(dict(zip(columns, row)), sort_keys=True) + '\n' for row in chunk
+                    )
+                
+                archive.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+                count += len(chunk)
+            
+            archive.close()
+        
+        checksum = file_sha256(tmp_path)
+        changed = checksum != file_sha256(path)
+        
+        os.chmod(tmp_path, 0o600)
+        os.rename(tmp_path, path)
+    except (IOError, OSError, TypeError, ValueError) as fault:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return (1, None, str(fault))
+    
+    return (0, {
+        'path': path,
+        'format': file_format,
+        'rows': count,
+        'sha256': checksum,
+        'changed': changed,
+    }, '')
+
+def alert_timestamp(value):
+    """ An alert log timestamp as ISO 8601, either 11g text or 12.2+ ISO """
+    
+    value = value.strip()
+    
+    if value[:1].isdigit():
+        return value
+    
+    try:
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.strptime(value, '%a %b %d %H:%M:%S %Y'))
+    except ValueError:
+        return value
+
+def alert_text(line, xml=False):
+    """ A line of the alert log as text, log.xml is unescaped """
+    
+    text = line.decode('utf-8', 'replace').strip()
+    
+    if xml:
+        text = text.replace('<txt>', '').replace('</txt>', '').strip()
+        text = text.replace('&apos;', "'").replace('&quot;', '"').replace('&lt;', '<').replace('&gt;', '>')
+        text = text.replace('&amp;', '&')
+    
+    return text
+
+def alert_incidents(path, offset=0, xml=False, codes=('ORA', 'TNS'), ignore=(), max_incidents=None):
+    """ Errors in an alert log after offset, returns (incidents, end, truncated)
+    
+    The new part of the file is memory mapped and searched for the error
+    codes, only the few bytes before each error are looked at again for its
+    timestamp so the time taken is down to the new data rather than the size
+    of the file. Errors under the same timestamp are one incident. end is
+    the offset to carry on from next time, the end of the last complete line
+    or, with max_incidents, the line of the last incident returned
+    """
+    
+    re_code = re.compile(r'\b(?:{0})-\d{{5}}\b'.format('|'.join(codes)).encode())
+    
+    if xml:
+        re_time = re.compile(br"<msg time='([^']+)'")
+    else:
+        re_time = re.compile(
+            br'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\S*|(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun) \w{3} [ \d]\d [\d:]{8} \d{4})\s*$',
+            re.MULTILINE
+        )
+    
+    re_trace = re.compile(br'Errors in file ([^\s:(]+)')
+    ignore = set(ignore)
+    
+    with open(path, 'rb') as fd:
+        size = os.fstat(fd.fileno()).st_size
+        
+        if size <= offset:
+            return ([], size, False)
+        
+        mapped = mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+    
+    try:
+        # a line still being written is left for the next run
+        end = mapped.rfind(b'\n', offset, size) + 1
+        if end <= offset:
+            return ([], offset, False)
+        
+        incidents = []
+        last_stamp = None
+        line_end = offset
+        
+        for match in re_code.finditer(mapped, offset, end):
+            if match.start() < line_end:
+                continue
+            
+            line_start = mapped.rfind(b'\n', 0, match.start()) + 1
+            line_end = mapped.find(b'\n', match.start(), end) + 1
+            
+            # each code on the line is ignored on its own, an ignored one
+            # does not hide the rest
+            line_codes = [
+                code.decode() for code in re_code.findall(mapped, match.start(), line_end)
+                    if code.decode() not in ignore
+            ]
+            
+            if not line_codes:
+                continue
+            
+            code = line_codes[0]
+            
+            # the timestamp is the last before the error, up to a few KB back
+            window = max(0, line_start - 8192)
+            stamp = None
+            for stamp in re_time.finditer(mapped, window, line_start):
+                pass
+            
+            # the same message as the incident before
+            if incidents and stamp is not None and last_stamp == stamp.start():
+                incidents[-1]['codes'].extend(line_codes)
+                incidents[-1]['lines'].append(alert_text(mapped[line_start:line_end], xml))
+                continue
+            
+            if max_incidents is not None and len(incidents) >= max_incidents:
+                return (incidents, line_start, True)
+            
+            trace = re_trace.findall(mapped, stamp.end() if stamp else window, line_start)
+            
+            incidents.append({
+                'timestamp': alert_timestamp(stamp.group(1).decode()) if stamp else None,
+                'code': code,
+                'codes': line_codes,
+                'lines': [alert_text(mapped[line_start:line_end], xml)],
+                'trace_file': trace[-1].decode() if trace else None,
+                'offset': line_start,
+            })
+            last_stamp = stamp.start() if stamp else None
+        
+        return (incidents, end, False)
+    finally:
+        mapped.close()
+
+def old_files(path, patterns, before, min_size=0):
+    """ Files in path matching patterns and modified before a time, as (path, size)
+    
+    Entries are read from the directory as they are needed rather than
+    listed up front, and names are matched before anything is stat'd, see
+    directory_entries(). Subdirectories are not looked in
+    """
+    
+    match = re.compile('|'.join([fnmatch.translate(pattern) for pattern in patterns])).match
+    
+    for entry in directory_entries(path):
+        if not match(entry.name):
+            continue
+            
+        try:
+            is_file = entry.is_file(follow_symlinks=False)
+            stat = entry.stat(follow_symlinks=False) if is_file else None
+        except OSError:
+            # removed in the meantime
+            continue
+            
+        if is_file and stat.st_mtime < before and stat.st_size >= min_size:
+            yield (entry.path, stat.st_size)
+
+def purge_files(files, max_workers=4, batch_size=1000, rate=None, check_mode=False):
+    """ Remove (path, size) pairs in batches on a pool of threads
+    
+    files is read on the calling thread while the pool removes the batches
+    before, at most rate files a second across the pool. Returns (rc,
+    (files, bytes), errors) for what was removed, or would have been in
+    check_mode
+    """
+    
+    totals = [0, 0]
+    errors = []
+    lock = threading.Lock()
+    
+    if check_mode:
+        for path, size in files:
+            totals[0] += 1
+            totals[1] += size
+        
+        return (0, tuple(totals), '')
+    
+    # bounded so the listing does not run far ahead of the removals
+    work = queue.Queue(max_workers * 2)
+    schedule = [time.time()]
+    
+    def wait(count):
+        """ Hold a batch back until the rate allows it """
+        
+        with lock:
+            start = max(time.time(), schedule[0])
+            schedule[0] = start + count / rate
+        
+        delay = start - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def worker():
+        while True:
+            batch = work.get()
+            
+            if batch is None:
+                return
+            
+            if rate:
+                wait(len(batch))
+            
+            removed = [0, 0]
+            for path, size in batch:
+                try:
+                    os.unlink(path)
+                    removed[0] += 1
+                    removed[1] += size
+                except OSError as fault:
+                    # removed by someone else is as good as removed
+                    if fault.errno != errno.ENOENT:
+                        with lock:
+                            errors.append(str(fault))
+            
+            with lock:
+                totals[0] += removed[0]
+                totals[1] += removed[1]
+    
+    threads = [threading.Thread(target=worker) for _ in range(max(1, max_workers))]
+    
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    
+    try:
+        batch = []
+        for item in files:
+            batch.append(item)
+            
+            if len(batch) >= batch_size:
+                work.put(batch)
+                batch = []
+        
+        if batch:
+            work.put(batch)
+    finally:
+        for thread in threads:
+            work.put(None)
+        
+        for thread in threads:
+            thread.join()
+    
+    # a few are enough to tell what went wrong
+    if errors:
+        return (1, tuple(totals), '\n'.join(errors[:10] + (
+            ['and {0} more'.format(len(errors) - 10)] if len(errors) > 10 else []
+        )))
+    
+    return (0, tuple(totals), '')
+
+def xml_elements(source, tags):
+    """ Elements of the given tags from an XML file as it is parsed
+    
+    Each element is cleared once the caller has moved on so memory stays
+    flat however large the file. An element of tags inside another is only
+    seen as part of the outer one
+    """
+    
+    depth = 0
+    
+    for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+        if element.tag not in tags:
+            continue
+        
+        if event == 'start':
+            depth += 1
+            continue
+        
+        depth -= 1
+        
+        if depth == 0:
+            yield element
+            element.clear()
+
+def central_inventory(inventory_file):
+    """ Oracle homes from the central inventory keyed by location """
+    
+    # when ansible drops 2.6 support will update this to a dict comp
+    return dict(
+        (home.attrib['LOC'], {
+            'name': home.attrib['NAME'],
+            'crs': True if 'CRS' in home.attrib else False,
+            'removed': home.attrib.get('REMOVED') == 'T',
+        }) for home in xml_elements(inventory_file, ('HOME',))
+    )
+
+def version_key(version):
+    """ A dotted version as a tuple that sorts numerically """
+    
+    return tuple(int(part) if part.isdigit() else 0 for part in version.split('.'))
+
+def home_inventory_files(oracle_home):
+    """ The files of the local inventory of a home, comps.xml and the oneoffs directory """
+    
+    inventory_dir = os.path.join(oracle_home, 'inventory')
+    
+    return [
+        os.path.join(inventory_dir, 'ContentsXML', 'comps.xml'),
+        os.path.join(inventory_dir, 'oneoffs'),
+    ]
+
+def home_inventory(oracle_home):
+    """ Components and patches of a home from its own inventory
+    
+    What opatch lsinventory reports without starting a JVM, comps.xml holds
+    every component, patch set and (12c on) one-off patch. A one-off only in
+    inventory/oneoffs is read from its own inventory.xml
+    """
+    
+    comps_file, oneoffs_dir = home_inventory_files(oracle_home)
+    
+    version = None
+    components = {}
+    patches = {}
+    
+    for element in xml_elements(comps_file, ('COMP', 'PATCH', 'ONEOFF')):
+        if element.tag == 'COMP':
+            # the first is the top level component, e.g. oracle.server
+            if version is None:
+                version = element.attrib.get('VER')
+            
+            components.setdefault(element.attrib['NAME'], element.attrib.get('VER'))
+        elif element.tag == 'PATCH':
+            # a patch set raises the version of a component
+            components[element.attrib['NAME']] = element.attrib.get('VER')
+        else:
+            description = element.find('DESC')
+            patches[element.attrib['REF_ID']] = {
+                'description': (description.text or '').strip() if description is not None else None,
+                'installed': element.attrib.get('INSTALL_TIME'),
+            }
+    
+    try:
+        oneoffs = os.listdir(oneoffs_dir)
+    except OSError:
+        oneoffs = []
+    
+    for patch_id in oneoffs:
+        inventory_file = os.path.join(oneoffs_dir, patch_id, 'etc', 'config', 'inventory.xml')
+        
+        if patch_id in patches or not os.path.isfile(inventory_file):
+            continue
+        
+        patch = {'description': None, 'installed': None}
+        
+        for element in xml_elements(inventory_file, ('patch_description', 'date_of_patch')):
+            if element.tag == 'patch_description':
+                patch['description'] = (element.text or '').strip()
+            else:
+                patch['installed'] = '{0}.{1}.{2}'.format(
+                    element.attrib.get('year'), element.attrib.get('month'), element.attrib.get('day')
+                )
+        
+        patches[patch_id] = patch
+    
+    # the newest release update (or PSU/bundle) applied, e.g. 19.21.0.0.231017
+    levels = [
+        match.group(1) for match in [
+            re_release_update.search(patch['description'] or '') for patch in patches.values()
+        ] if match
+    ]
+    
+    return {
+        'version': version,
+        'release_update': max(levels, key=version_key) if levels else None,
+        'components': components,
+        'patches': patches,
+    }
+
+def meminfo(proc='/proc'):
+    """ /proc/meminfo as a dictionary, kB values as bytes and counts as they are """
+    
+    result = {}
+    
+    with open('{0}/meminfo'.format(proc), 'r') as fd:
+        for line in fd:
+            name, _, value = line.partition(':')
+            fields = value.split()
+            
+            if not fields:
+                continue
+            
+            result[name.strip()] = int(fields[0]) * 1024 if fields[1:] == ['kB'] else int(fields[0])
+    
+    return result
+
+def shm_segments(proc='/proc'):
+    """ System V shared memory segments keyed by shmid, from /proc/sysvipc/shm """
+    
+    segments = {}
+    
+    with open('{0}/sysvipc/shm'.format(proc), 'r') as fd:
+        # columns vary by kernel, rss and swap are recent
+        header = fd.readline().split()
+        
+        for line in fd:
+            fields = dict(zip(header, line.split()))
+            
+            segments[int(fields['shmid'])] = {
+                'key': fields['key'],
+                'size': int(fields['size']),
+                'cpid': int(fields['cpid']),
+                'nattch': int(fields['nattch']),
+                'uid': int(fields['uid']),
+            }
+    
+    return segments
+
+def shared_mappings(pid, proc='/proc'):
+    """ Shared memory mapped by a process, as an SGA is
+    
+    Read from /proc/<pid>/smaps, a list of System V segments (/SYSV..., where
+    the inode is the shmid) and /dev/shm files (memory_target) each with its
+    path, inode, mapped size and the largest kernel page size backing it
+    """
+    
+    mappings = {}
+    mapping = None
+    
+    with open('{0}/{1}/smaps'.format(proc, pid), 'r') as fd:
+        for line in fd:
+            if re_smaps_mapping.match(line):
+                fields = line.split(None, 5)
+                path = fields[5].strip() if len(fields) > 5 else ''
+                mapping = None
+                
+                if path.startswith('/SYSV') or path.startswith('/dev/shm/'):
+                    path = path.replace(' (deleted)', '')
+                    mapping = mappings.setdefault((path, int(fields[4])), {
+                        'path': path,
+                        'inode': int(fields[4]),
+                        'shm': path.startswith('/SYSV'),
+                        'size': 0,
+                        'page_size': 0,
+                    })
+            elif mapping is not None:
+                # a segment can be mapped in more than one piece
+                if line.startswith('Size:'):
+                    mapping['size'] += int(line.split()[1]) * 1024
+                elif line.startswith('KernelPageSize:'):
+                    mapping['page_size'] = max(mapping['page_size'], int(line.split()[1]) * 1024)
+    
+    return [mappings[key] for key in sorted(mappings)]
+
 def strip_comments(data):
     """ Remove block and inline comments """
     
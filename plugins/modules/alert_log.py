@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: alert_log
+author:
+  - antony.with.no.h
+short_description: New errors in the alert log since the last run
+description:
+  - Reads the alert log of a database from where the last run stopped and
+    returns the C(ORA-) and C(TNS-) errors written since as incidents
+  - The offset and inode reached are kept per database on the target, only
+    the new part of the file is read so a run takes as long as the data
+    written since the last one rather than the size of the log
+  - Finds the alert log under the C(diag) directory of the C(ORACLE_BASE)
+    of the database, as text (C(trace/alert_<SID>.log)) or XML
+    (C(alert/log.xml))
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name
+      - A list of names or C(all) for every database in oratab reads each
+        one concurrently, results and errors are then keyed by database name
+    required: true
+    type: list
+    aliases: ['name', 'sid']
+  format:
+    description:
+      - Read the text alert log or the XML one, timestamps are returned as
+        ISO 8601 either way
+    type: str
+    default: text
+    choices: ['text', 'xml']
+  path:
+    description:
+      - The alert log to read rather than looking for it, with one database
+    type: str
+  diagnostic_dest:
+    description:
+      - Directory holding C(diag) when it is not the C(ORACLE_BASE)
+    type: str
+  initial_position:
+    description:
+      - Where to start on a log not read before (or rotated), C(end) only
+        returns errors written after the first run
+    type: str
+    default: end
+    choices: ['end', 'start']
+  codes:
+    description:
+      - Error prefixes to look for
+    type: list
+    default: ['ORA', 'TNS']
+  ignore_codes:
+    description:
+      - Errors left out, e.g. C(ORA-00060) or C(ORA-01013)
+    type: list
+  max_incidents:
+    description:
+      - Most incidents returned by a run, the rest are left for the next
+        one and C(truncated) is set
+    type: int
+    default: 500
+  max_workers:
+    description:
+      - Number of databases read at the same time when more than one is named
+    type: int
+    default: 4
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - Offsets are kept in C(~/.ansible/tmp/antony_with_no_h.oracle/alert_log.json),
+    nothing is saved in check mode so the same errors are returned next time
+  - A log with a new inode or shorter than the offset is taken as rotated
+    and read from the start
+  - After a rotation the rest of the old file is read first when it is still
+    beside the log under a name starting the same, e.g. C(alert_ORCL.log.1),
+    found by its inode. The C(offset) of its incidents is in that file
+  - Anything written after the last run to a log cut short in place, e.g.
+    by C(copytruncate), is not read
+  - A line still being written is left for the next run
+"""
+
+EXAMPLES = r"""
+- name: New errors since the last run
+  antony_with_no_h.oracle.alert_log:
+    database_name: ORCL
+    ignore_codes:
+      - ORA-00060
+  register: alert
+
+- ansible.builtin.fail:
+    msg: "{{ alert.incidents | map(attribute='lines') | flatten | join('\n') }}"
+  when: alert.incidents | length > 0
+
+- name: Every database on the host, from log.xml
+  antony_with_no_h.oracle.alert_log:
+    database_name: all
+    format: xml
+    initial_position: start
+"""
+
+RETURN = r"""
+incidents:
+  description:
+    - Errors in the order they were written, errors under the same
+      timestamp are one incident
+    - Each is the C(timestamp), the first error C(code), every error in
+      C(codes), the C(lines) they were on, the C(trace_file) named by the
+      message if any and the C(offset) of its first line
+    - Keyed by database name when more than one is read
+  returned: success
+  type: list
+  sample: [{
+    "timestamp": "2021-03-01T10:15:32.118000+00:00",
+    "code": "ORA-00600",
+    "codes": ["ORA-00600"],
+    "lines": ["ORA-00600: internal error code, arguments: [4194], [], [], [], [], [], [], [], [], [], [], []"],
+    "trace_file": "/u01/app/oracle/diag/rdbms/orcl/ORCL/trace/ORCL_ora_1234.trc",
+    "offset": 1048576
+  }]
+path:
+  description: The alert log read, keyed by database name when more than one is read
+  returned: success
+  type: str
+  sample: /u01/app/oracle/diag/rdbms/orcl/ORCL/trace/alert_ORCL.log
+offset:
+  description: Where the next run carries on from, keyed by database name when more than one is read
+  returned: success
+  type: int
+rotated:
+  description: The log was rotated since the last run, keyed by database name when more than one is read
+  returned: success
+  type: bool
+truncated:
+  description: More incidents were found than max_incidents, keyed by database name when more than one is read
+  returned: success
+  type: bool
+errors:
+  description: Errors keyed by database name, when more than one is read
+  returned: when more than one database is named
+  type: dict
+"""
+
+import glob
+import os
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+ALERT_LOG_STATE = '{0}/alert_log.json'.format(noh.STATE_DIR)
+
+def find_alert_log(module, database_name, environment):
+    """ The newest alert log of the database under diag, None if there is none """
+    
+    if module.params['path']:
+        return module.params['path']
+    
+    dest = module.params['diagnostic_dest'] or environment.get('ORACLE_BASE')
+    
+    if not dest:
+        return None
+    
+    if module.params['format'] == 'xml':
+        pattern = '{0}/diag/rdbms/*/{1}/alert/log.xml'
+    else:
+        pattern = '{0}/diag/rdbms/*/{1}/trace/alert_{1}.log'
+    
+    # the directory is named after db_unique_name so a standby has its own
+    candidates = glob.glob(pattern.format(dest.rstrip('/'), database_name))
+    
+    if not candidates:
+        return None
+    
+    return max(candidates, key=os.path.getmtime)
+
+def rotated_log(path, inode):
+    """ The file a log was rotated to and its size, found by its inode beside the log
+    
+    Only names starting as the log's do are looked at, e.g. alert_ORCL.log.1
+    or log_1.xml, not every trace file in the directory
+    """
+    
+    directory, name = os.path.split(path)
+    stem = name.split('.')[0]
+    
+    try:
+        for entry in noh.directory_entries(directory or '.'):
+            if not entry.name.startswith(stem) or entry.name == name:
+                continue
+            
+            # from the directory itself with scandir, no stat of each file
+            if entry.inode() == inode:
+                return (entry.path, entry.stat(follow_symlinks=False).st_size)
+    except OSError:
+        pass
+    
+    return (None, 0)
+
+def alert_log(module, database_name, environment):
+    """ Incidents since the last run, returns (rc, result, errors) """
+    
+    phase = noh.profiler(module).phase
+    xml = module.params['format'] == 'xml'
+    key = '{0}.xml'.format(database_name) if xml else database_name
+    state = noh.StateFile(ALERT_LOG_STATE)
+    
+    path = find_alert_log(module, database_name, environment)
+    
+    if path is None:
+        return (1, None, 'Cannot find the alert log of {0}'.format(database_name))
+    
+    try:
+        stat = os.stat(path)
+    except OSError as fault:
+        return (1, None, str(fault))
+    
+    saved = state.read().get(key) or {}
+    rotated = False
+    scans = []
+    
+    if saved.get('path') == path and saved.get('inode') == stat.st_ino and saved.get('offset', 0) <= stat.st_size:
+        offset = saved['offset']
+    else:
+        # the same log with a new inode or cut short is rotated, one not read
+        # before starts where asked
+        rotated = saved.get('path') == path
+        offset = stat.st_size if module.params['initial_position'] == 'end' and not rotated else 0
+        
+        # what was written to the old file after the last run comes first
+        if rotated and saved.get('inode') != stat.st_ino:
+            old, old_size = rotated_log(path, saved.get('inode'))
+            
+            if old is not None:
+                scans.append((old, saved['inode'], saved.get('offset', 0), old_size))
+    
+    scans.append((path, stat.st_ino, offset, stat.st_size))
+    
+    incidents = []
+    truncated = False
+    max_incidents = module.params['max_incidents']
+    
+    for scan_path, inode, scan_offset, size in scans:
+        with phase('scan', database=database_name, bytes=max(size - scan_offset, 0)):
+            try:
+                found, end, truncated = noh.alert_incidents(
+                    scan_path,
+                    scan_offset,
+                    xml,
+                    module.params['codes'],
+                    module.params['ignore_codes'] or (),
+                    None if max_incidents is None else max_incidents - len(incidents),
+                )
+            except (IOError, OSError, ValueError) as fault:
+                return (1, None, str(fault))
+        
+        incidents.extend(found)
+        
+        # the rest of a rotated log is found again by its inode next run
+        if truncated:
+            break
+    
+    # the log is only ever read, what changes is the offset on the target
+    if not module.check_mode:
+        if not state.update({key: {'path': path, 'inode': inode, 'offset': end}}):
+            module.warn('Cannot save the alert log offset to {0}'.format(state.path))
+    
+    return (0, {
+        'incidents': incidents,
+        'path': path,
+        'offset': end,
+        'rotated': rotated,
+        'truncated': truncated,
+    }, '')
+
+def main(module):
+    """ Errors written to the alert log since last time """
+    
+    profiler = noh.profiler(module)
+    database_names = noh.database_names(module.params["database_name"])
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'incidents': [],
+    }
+    
+    if module.params['path'] and len(database_names) != 1:
+        module_fail['stderr'] = 'path can only be given with one database'
+        module.fail_json(**module_fail)
+    
+    if len(database_names) != 1 or module.params["database_name"][0].lower() == 'all':
+        results, errors = noh.fan_out_databases(
+            module,
+            database_names,
+            lambda name, environment: alert_log(module, name, environment),
+            module.params["max_workers"],
+        )
+        
+        module_exit = dict(
+            (field, dict((name, result[field]) for name, result in results.items()))
+                for field in ('incidents', 'path', 'offset', 'rotated', 'truncated')
+        )
+        module_exit.update({
+            'changed': False,
+            'errors': errors,
+        })
+        module_exit.update(profiler.report(module))
+        
+        # only fail when there is nothing to show for it
+        if errors and not results:
+            module.fail_json(msg='An error has occured', **module_exit)
+        
+        module.exit_json(**module_exit)
+    
+    database_name = database_names[0]
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    rc, result, errors = alert_log(module, database_name, environment)
+    
+    if errors:
+        module_fail['stderr'] = errors
+        module_fail.update(profiler.report(module))
+        
+        module.fail_json(**module_fail)
+    
+    module_exit = {
+        'changed': False,
+    }
+    module_exit.update(result)
+    module_exit.update(profiler.report(module))
+    
+    if not result['incidents']:
+        module_exit['msg'] = 'No new errors'
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "list",
+            "aliases": ["name", "sid"],
+        },
+        "format": {
+            "type": "str",
+            "default": "text",
+            "choices": ["text", "xml"],
+        },
+        "path": {
+            "type": "str",
+        },
+        "diagnostic_dest": {
+            "type": "str",
+        },
+        "initial_position": {
+            "type": "str",
+            "default": "end",
+            "choices": ["end", "start"],
+        },
+        "codes": {
+            "type": "list",
+            "default": ["ORA", "TNS"],
+        },
+        "ignore_codes": {
+            "type": "list",
+        },
+        "max_incidents": {
+            "type": "int",
+            "default": 500,
+        },
+        "max_workers": {
+            "type": "int",
+            "default": 4,
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+        supports_check_mode = True,
+    )
+    
+    main(module)
\ No newline at end of file
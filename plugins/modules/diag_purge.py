@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: diag_purge
+author:
+  - antony.with.no.h
+short_description: Remove old audit and trace files of a database
+description:
+  - Removes audit (C(adump)) and trace files of a database older than a
+    number of days, found from the C(ORACLE_BASE) of the database
+  - Directories are read as the files are removed rather than listed first
+    and files are removed in batches on a pool of threads, optionally at a
+    limited rate to spare the disks of a busy instance
+  - Only files named after the database (C(<SID>_*)) are removed so a
+    shared C(adump) is safe and the alert log is never touched
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name
+      - A list of names or C(all) for every database in oratab, databases
+        are purged one at a time and results and errors are then keyed by
+        database name
+    required: true
+    type: list
+    aliases: ['name', 'sid']
+  directories:
+    description:
+      - C(audit) is C(<ORACLE_BASE>/admin/*/adump) and
+        C(<ORACLE_HOME>/rdbms/audit), C(trace) is the ADR C(trace) directory
+        of the database
+    type: list
+    default: ['audit', 'trace']
+    choices: ['audit', 'trace']
+  paths:
+    description:
+      - Further directories to purge, of C(<SID>_*) files unless
+        C(patterns) is given
+    type: list
+  patterns:
+    description:
+      - Names of files to remove in C(paths), as shell wildcards
+    type: list
+  diagnostic_dest:
+    description:
+      - Directory holding C(diag) and C(admin) when it is not the
+        C(ORACLE_BASE)
+    type: str
+  older_than:
+    description:
+      - Days since a file was last modified before it is removed
+    type: int
+    default: 30
+  min_size:
+    description:
+      - Only remove files of at least this many bytes
+    type: int
+    default: 0
+  batch_size:
+    description:
+      - Files handed to a thread at a time
+    type: int
+    default: 1000
+  max_workers:
+    description:
+      - Threads removing files
+    type: int
+    default: 4
+  rate:
+    description:
+      - Most files removed a second across the threads, unlimited by default
+    type: int
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - In check mode nothing is removed and the files and bytes returned are
+    what would have been
+  - Only the directories themselves are looked in, not subdirectories
+"""
+
+EXAMPLES = r"""
+- name: Audit and trace files older than a fortnight
+  antony_with_no_h.oracle.diag_purge:
+    database_name: ORCL
+    older_than: 14
+
+- name: Every database, gently
+  antony_with_no_h.oracle.diag_purge:
+    database_name: all
+    directories:
+      - audit
+    max_workers: 2
+    rate: 5000
+  check_mode: yes
+  register: purge
+
+- name: Core dumps left in a directory of our own
+  antony_with_no_h.oracle.diag_purge:
+    database_name: ORCL
+    directories: []
+    paths:
+      - /u01/app/oracle/crash
+    patterns:
+      - "core.*"
+    older_than: 7
+"""
+
+RETURN = r"""
+files:
+  description: Files removed, or that would be in check mode
+  returned: success
+  type: int
+  sample: 1250000
+bytes:
+  description: Bytes reclaimed, or that would be in check mode
+  returned: success
+  type: int
+  sample: 5368709120
+directories:
+  description: C(files) and C(bytes) of each directory purged
+  returned: success
+  type: dict
+  sample: {
+    "/u01/app/oracle/admin/orcl/adump": {"files": 1200000, "bytes": 4294967296}
+  }
+resultset:
+  description:
+    - C(files), C(bytes) and C(directories) keyed by database name
+    - A database with an error in C(errors) is here too with what was
+      removed before it
+  returned: when more than one database is named
+  type: dict
+errors:
+  description: Errors keyed by database name
+  returned: when more than one database is named
+  type: dict
+"""
+
+import glob
+import os
+import time
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+def purge_directories(module, database_name, environment):
+    """ Each directory to purge and the names of files to remove from it """
+    
+    dest = (module.params['diagnostic_dest'] or environment.get('ORACLE_BASE') or '').rstrip('/')
+    directories = []
+    
+    if 'audit' in module.params['directories']:
+        # adump is under the database name, not the SID, and may be shared
+        audit = glob.glob('{0}/admin/*/adump'.format(dest)) if dest else []
+        audit.append('{0}/rdbms/audit'.format(environment['ORACLE_HOME']))
+        directories.extend([
+            (path, ['{0}_*.aud'.format(database_name), '{0}_*.xml'.format(database_name)]) for path in audit
+        ])
+    
+    if 'trace' in module.params['directories'] and dest:
+        trace = glob.glob('{0}/diag/rdbms/*/{1}/trace'.format(dest, database_name))
+        directories.extend([
+            (path, ['{0}_*.trc'.format(database_name), '{0}_*.trm'.format(database_name)]) for path in trace
+        ])
+    
+    for path in module.params['paths'] or []:
+        directories.append((path, module.params['patterns'] or ['{0}_*'.format(database_name)]))
+    
+    return [(path, patterns) for path, patterns in directories if os.path.isdir(path)]
+
+def diag_purge(module, database_name, environment):
+    """ Remove old files from each directory, returns (rc, result, errors) """
+    
+    phase = noh.profiler(module).phase
+    before = time.time() - module.params['older_than'] * 86400
+    result = {
+        'files': 0,
+        'bytes': 0,
+        'directories': {},
+    }
+    errors = []
+    
+    for path, patterns in purge_directories(module, database_name, environment):
+        with phase('purge', database=database_name, path=path):
+            try:
+                rc, purged, purge_err = noh.purge_files(
+                    noh.old_files(path, patterns, before, module.params['min_size']),
+                    module.params['max_workers'],
+                    module.params['batch_size'],
+                    module.params['rate'],
+                    module.check_mode,
+                )
+            except OSError as fault:
+                rc, purged, purge_err = (1, (0, 0), str(fault))
+        
+        if purge_err:
+            errors.append(purge_err)
+        
+        result['directories'][path] = {'files': purged[0], 'bytes': purged[1]}
+        result['files'] += purged[0]
+        result['bytes'] += purged[1]
+    
+    return (1 if errors else 0, result, '\n'.join(errors))
+
+def main(module):
+    """ Old audit and trace files of one or more databases """
+    
+    profiler = noh.profiler(module)
+    database_names = noh.database_names(module.params["database_name"])
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'files': 0,
+        'bytes': 0,
+    }
+    
+    if module.params['patterns'] and not module.params['paths']:
+        module_fail['stderr'] = 'patterns are only used with paths'
+        module.fail_json(**module_fail)
+    
+    if module.params['rate'] is not None and module.params['rate'] < 1:
+        module_fail['stderr'] = 'rate must be at least 1'
+        module.fail_json(**module_fail)
+    
+    if len(database_names) != 1 or module.params["database_name"][0].lower() == 'all':
+        # one database at a time so the pool is all the IO there is
+        results, errors = noh.fan_out_databases(
+            module,
+            database_names,
+            lambda name, environment: diag_purge(module, name, environment),
+            1,
+            partial=True,
+        )
+        
+        module_exit = {
+            'changed': any(result['files'] for result in results.values()),
+            'resultset': results,
+            'files': sum([result['files'] for result in results.values()]),
+            'bytes': sum([result['bytes'] for result in results.values()]),
+            'errors': errors,
+        }
+        module_exit.update(profiler.report(module))
+        
+        # every file removed is in the totals, a database which failed part
+        # way included, but only fail when none of them succeeded
+        if errors and not [name for name in results if name not in errors]:
+            module.fail_json(msg='An error has occured', **module_exit)
+        
+        module.exit_json(**module_exit)
+    
+    database_name = database_names[0]
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    rc, result, errors = diag_purge(module, database_name, environment)
+    
+    module_exit = {
+        'changed': result['files'] > 0,
+    }
+    module_exit.update(result)
+    module_exit.update(profiler.report(module))
+    
+    # what was removed before an error is still reported
+    if errors:
+        module_exit.update({
+            'msg': 'An error has occured',
+            'rc': rc,
+            'stderr': errors,
+        })
+        module.fail_json(**module_exit)
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "list",
+            "aliases": ["name", "sid"],
+        },
+        "directories": {
+            "type": "list",
+            "default": ["audit", "trace"],
+            "choices": ["audit", "trace"],
+        },
+        "paths": {
+            "type": "list",
+        },
+        "patterns": {
+            "type": "list",
+        },
+        "diagnostic_dest": {
+            "type": "str",
+        },
+        "older_than": {
+            "type": "int",
+            "default": 30,
+        },
+        "min_size": {
+            "type": "int",
+            "default": 0,
+        },
+        "batch_size": {
+            "type": "int",
+            "default": 1000,
+        },
+        "max_workers": {
+            "type": "int",
+            "default": 4,
+        },
+        "rate": {
+            "type": "int",
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+        supports_check_mode = True,
+    )
+    
+    main(module)
\ No newline at end of file
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: hugepages
+author:
+  - antony.with.no.h
+short_description: Huge pages needed by the SGAs on a host
+description:
+  - Works out the C(vm.nr_hugepages) the running instances on a host need
+    and which of them are not using huge pages, e.g. after their SGA grew
+    past what was configured and they silently fell back to small pages
+  - Reads C(/proc/meminfo) and C(/proc/sys/vm/nr_hugepages), finds the
+    instances with C(pgrep) and the shared memory each has mapped from
+    C(/proc/<pmon pid>/smaps) and C(/proc/sysvipc/shm), then asks each for
+    its C(v$sgainfo) and C(use_large_pages) in one session apiece
+  - Nothing is changed or restarted
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Instances to include, by default (or C(all)) every one running
+    type: list
+    aliases: ['name', 'sid']
+  query:
+    description:
+      - Query each instance for its maximum SGA size and C(use_large_pages),
+        without the sizes come from the shared memory segments alone
+    type: bool
+    default: yes
+  max_workers:
+    description:
+      - Number of instances queried at the same time
+    type: int
+    default: 4
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - The pages an instance needs are counted from its segments, as Oracle's
+    C(hugepages_settings.sh) does, or from the maximum SGA size when its
+    segments cannot be read
+  - Reading C(smaps) of another user's process needs to be that user (or
+    root), an instance whose segments cannot be read is sized from the
+    query alone
+  - An instance with C(memory_target) maps its SGA from C(/dev/shm), which
+    cannot use huge pages
+"""
+
+EXAMPLES = r"""
+- name: Huge pages
+  antony_with_no_h.oracle.hugepages:
+  register: hugepages
+
+- name: Enough for every SGA
+  ansible.posix.sysctl:
+    name: vm.nr_hugepages
+    value: "{{ hugepages.required }}"
+    sysctl_set: yes
+  become: yes
+  when: hugepages.required > hugepages.host.nr_hugepages
+
+- ansible.builtin.fail:
+    msg: "Not on huge pages: {{ hugepages.fallback | join(', ') }}"
+  when: hugepages.fallback | length > 0
+"""
+
+RETURN = r"""
+host:
+  description:
+    - C(page_size) in bytes, C(nr_hugepages), the C(total), C(free),
+      C(reserved) and C(surplus) huge pages and C(mem_total) bytes
+  returned: always
+  type: dict
+  sample: {
+    "page_size": 2097152, "nr_hugepages": 4100, "total": 4100, "free": 2,
+    "reserved": 0, "surplus": 0, "mem_total": 67108864000
+  }
+instances:
+  description:
+    - Keyed by SID, the C(pid) of pmon, C(sga) bytes and where it came from
+      (C(source) of C(v$sgainfo) or C(shm)), its C(segments), the huge
+      C(pages) it needs, bytes already on huge pages (C(huge_bytes)),
+      C(large_pages) (C(yes), C(partial), C(no) or null when unknown),
+      C(use_large_pages), C(memory_target) and C(memlock), the locked memory
+      limit of pmon in bytes (null for unlimited)
+  returned: always
+  type: dict
+  sample: {
+    "ORCL": {
+      "pid": 4242, "sga": 8589934592, "source": "v$sgainfo", "segments": 4,
+      "pages": 4097, "huge_bytes": 8594128896, "large_pages": "yes",
+      "use_large_pages": "ONLY", "memory_target": false, "memlock": null
+    }
+  }
+required:
+  description: Huge pages the running instances need between them, for C(vm.nr_hugepages)
+  returned: always
+  type: int
+  sample: 4097
+shortfall:
+  description: Pages short of C(required) with the huge pages there are now
+  returned: always
+  type: int
+  sample: 0
+fallback:
+  description: Instances with some or all of their SGA on small pages
+  returned: always
+  type: list
+  sample: ['ORCL2']
+errors:
+  description: Errors querying an instance keyed by SID, it is then sized from its segments
+  returned: always
+  type: dict
+"""
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+SGA_QUERY = """
+SELECT (SELECT bytes FROM v$sgainfo WHERE name = 'Maximum SGA Size')||' '||
+  (SELECT value FROM v$parameter WHERE name = 'use_large_pages')
+FROM dual;"""
+
+def host_pages(proc='/proc'):
+    """ Huge page size and counts of the host """
+    
+    memory = noh.meminfo(proc)
+    
+    with open('{0}/sys/vm/nr_hugepages'.format(proc), 'r') as fd:
+        nr_hugepages = int(fd.read().strip() or 0)
+    
+    return {
+        'page_size': memory.get('Hugepagesize', 0),
+        'nr_hugepages': nr_hugepages,
+        'total': memory.get('HugePages_Total', 0),
+        'free': memory.get('HugePages_Free', 0),
+        'reserved': memory.get('HugePages_Rsvd', 0),
+        'surplus': memory.get('HugePages_Surp', 0),
+        'mem_total': memory.get('MemTotal', 0),
+    }
+
+def memlock(pid, proc='/proc'):
+    """ Locked memory limit of a process in bytes, None for unlimited """
+    
+    with open('{0}/{1}/limits'.format(proc, pid), 'r') as fd:
+        for line in fd:
+            if line.startswith('Max locked memory'):
+                soft = line[len('Max locked memory'):].split()[0]
+                return None if soft == 'unlimited' else int(soft)
+    
+    return None
+
+def instance_sga(module, database_name, environment):
+    """ Maximum SGA size and use_large_pages, returns (rc, result, errors) """
+    
+    with noh.SQLPlusSession(module, environment) as session:
+        if session.errors:
+            return (1, None, session.errors)
+        
+        session.execute('SET HEADING OFF FEEDBACK OFF PAGESIZE 0')
+        rc, stdout, errors = session.execute(SGA_QUERY)
+    
+    if errors:
+        return (rc or 1, None, errors)
+    
+    fields = str(stdout).split()
+    
+    if not fields or not fields[0].isdigit():
+        return (1, None, 'Cannot read the SGA size of {0}'.format(database_name))
+    
+    return (0, {
+        'sga': int(fields[0]),
+        'use_large_pages': fields[1] if len(fields) > 1 else None,
+    }, '')
+
+def size_instance(pid, page_size, segments, queried):
+    """ Pages needed and large pages in effect for one instance """
+    
+    result = {
+        'pid': pid,
+        'sga': None,
+        'source': None,
+        'segments': None,
+        'pages': 0,
+        'huge_bytes': None,
+        'large_pages': None,
+        'use_large_pages': (queried or {}).get('use_large_pages'),
+        'memory_target': False,
+        'memlock': None,
+    }
+    
+    try:
+        mappings = noh.shared_mappings(pid)
+        result['memlock'] = memlock(pid)
+    except (IOError, OSError):
+        mappings = None
+    
+    if mappings is not None:
+        shm = [mapping for mapping in mappings if mapping['shm']]
+        # the whole segment, smaps only has what this process mapped
+        sizes = [(segments.get(mapping['inode']) or mapping)['size'] for mapping in shm]
+        
+        result.update({
+            'segments': len(shm),
+            'memory_target': bool([mapping for mapping in mappings if 'ora_' in mapping['path'] and not mapping['shm']]),
+            'huge_bytes': sum([
+                size for size, mapping in zip(sizes, shm) if page_size and mapping['page_size'] == page_size
+            ]),
+        })
+        
+        if shm:
+            result.update({
+                'sga': sum(sizes),
+                'source': 'shm',
+                # a page or part of one per segment
+                'pages': sum([-(-size // page_size) for size in sizes]) if page_size else 0,
+            })
+        
+        total = sum(sizes) + sum([mapping['size'] for mapping in mappings if not mapping['shm']])
+        
+        if total:
+            result['large_pages'] = 'yes' if result['huge_bytes'] >= total else 'partial' if result['huge_bytes'] else 'no'
+    
+    if queried is not None:
+        result.update({
+            'sga': queried['sga'],
+            'source': 'v$sgainfo',
+        })
+        
+        if not result['segments'] and page_size:
+            result['pages'] = -(-queried['sga'] // page_size)
+    
+    return result
+
+def main(module):
+    """ Huge pages wanted and in use """
+    
+    profiler = noh.profiler(module)
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+    }
+    
+    try:
+        with profiler.phase('host'):
+            host = host_pages()
+            segments = noh.shm_segments()
+    except (IOError, OSError, ValueError) as fault:
+        module_fail['stderr'] = str(fault)
+        module.fail_json(**module_fail)
+    
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    
+    running = dict(
+        (proc[2][len('ora_pmon_'):], int(proc[0])) for proc in process_list if proc[2].startswith('ora_pmon_')
+    )
+    
+    names = module.params['database_name'] or ['all']
+    
+    if 'all' not in [name.lower() for name in names]:
+        names = noh.database_names(names)
+        running = dict(
+            (name, pid) for name, pid in running.items() if name in names
+        )
+    
+    queried, errors = ({}, {})
+    
+    if module.params['query'] and running:
+        try:
+            known = noh.oratab()
+        except (IOError, OSError):
+            known = {}
+        
+        # an instance not in oratab has no environment to query it from
+        queried, errors = noh.fan_out_databases(
+            module,
+            sorted([name for name in running if name in known]),
+            lambda name, environment: instance_sga(module, name, environment),
+            module.params['max_workers'],
+        )
+    
+    with profiler.phase('size', instances=len(running)):
+        instances = dict(
+            (name, size_instance(pid, host['page_size'], segments, queried.get(name)))
+                for name, pid in running.items()
+        )
+    
+    required = sum([instance['pages'] for instance in instances.values()])
+    
+    module_exit = {
+        'changed': False,
+        'host': host,
+        'instances': instances,
+        'required': required,
+        'shortfall': max(0, required - host['total']),
+        'fallback': sorted([
+            name for name, instance in instances.items() if instance['large_pages'] in ('no', 'partial')
+        ]),
+        'errors': errors,
+    }
+    module_exit.update(profiler.report(module))
+    
+    if required * host['page_size'] > host['mem_total']:
+        module.warn('{0} huge pages is more than the memory of the host'.format(required))
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "type": "list",
+            "aliases": ["name", "sid"],
+        },
+        "query": {
+            "type": "bool",
+            "default": True,
+        },
+        "max_workers": {
+            "type": "int",
+            "default": 4,
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+        supports_check_mode = True,
+    )
+    
+    main(module)
\ No newline at end of file
@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: init_parameters
+author:
+  - antony.with.no.h
+short_description: Set initialisation parameters to a baseline
+description:
+  - Reads the current (C(v$parameter)) and spfile (C(v$spparameter)) value
+    of every parameter given in one query, compares them with what is
+    wanted and runs C(ALTER SYSTEM) only for those which differ, all in one
+    SQL*Plus session
+  - Values are compared as Oracle would read them, C(2G) is the same as
+    C(2147483648), C(yes) as C(TRUE) and a list in any order as the same
+    list
+  - Returns each change, its C(SCOPE) and whether it needs a restart
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name (SID)
+    required: true
+    type: str
+    aliases: ['name', 'sid']
+  parameters:
+    description:
+      - Parameter names and the values wanted, a list for parameters taking
+        more than one value (C(control_files)), C(null) to remove a
+        parameter from the spfile
+    required: true
+    type: dict
+  scope:
+    description:
+      - C(auto) changes memory and spfile where the parameter can be changed
+        online and the spfile alone (needing a restart) where it cannot,
+        only memory when the instance was started without an spfile
+      - C(memory), C(spfile) and C(both) change only there, C(memory) and
+        C(both) fail for a parameter which cannot be changed online
+    type: str
+    default: auto
+    choices: ['auto', 'memory', 'spfile', 'both']
+  instance:
+    description:
+      - The C(SID) clause, the instance of a RAC database to change
+    type: str
+    default: '*'
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - Strings are compared ignoring case, a change of case alone is not made
+  - A parameter changed with C(DEFERRED) (C(ISSYS_MODIFIABLE) of
+    C(DEFERRED)) takes effect for new sessions
+  - In check mode nothing is changed, C(changes) shows what would be
+  - The spfile value compared is the one set for C(instance) or, when it
+    has none, the one set for every instance (C(SID='*')), C(null) resets
+    whichever of the two it is
+"""
+
+EXAMPLES = r"""
+- name: Baseline
+  antony_with_no_h.oracle.init_parameters:
+    database_name: ORCL
+    parameters:
+      processes: 400
+      sga_target: 8G
+      pga_aggregate_target: 2G
+      open_cursors: 1000
+      db_file_multiblock_read_count: null
+      audit_trail: db
+      control_files:
+        - /u02/oradata/ORCL/control01.ctl
+        - /u03/oradata/ORCL/control02.ctl
+  register: baseline
+
+- name: Restart for the static ones
+  antony_with_no_h.oracle.sqlplus:
+    database_name: ORCL
+    sql: |
+      CONN / AS SYSDBA
+      SHUTDOWN IMMEDIATE
+      STARTUP
+  when: baseline.restart_required | length > 0
+"""
+
+RETURN = r"""
+changes:
+  description:
+    - Each parameter changed, or that would be in check mode, with its
+      C(memory) and C(spfile) values before, the C(value) set, the C(scope),
+      the C(sql) run and whether it needs a C(restart)
+  returned: always
+  type: list
+  sample: [{
+    "name": "processes",
+    "memory": "300",
+    "spfile": "300",
+    "value": "400",
+    "scope": "SPFILE",
+    "sql": "ALTER SYSTEM SET processes = 400 SCOPE=SPFILE SID='*'",
+    "restart": true
+  }]
+restart_required:
+  description:
+    - Parameters which only take effect after a restart, including any
+      already set in the spfile by an earlier run
+  returned: always
+  type: list
+  sample: ['processes']
+"""
+
+import re
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+# between columns, unlike a control character it is not whitespace to strip()
+SEPARATOR = '<|>'
+
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4, 'P': 1024 ** 5}
+
+# v$parameter.type
+BOOLEAN, INTEGER, BIG_INTEGER = ('1', '3', '6')
+
+re_name = re.compile(r'^[A-Za-z_][A-Za-z0-9_#$]*$')
+re_size = re.compile(r'^(\d+)\s*([KMGTP]?)B?$', re.IGNORECASE)
+
+def parameter_query(names, instance):
+    """ Current value of each parameter, then its spfile values, a row each
+    
+    Columns are split by COLSEP rather than concatenated, a VARCHAR2 of
+    4000 bytes (C(control_files), C(_fix_control)) plus the rest would not
+    fit in one (ORA-01489), and every spfile value of a list parameter is
+    a row of its own
+    """
+    
+    in_list = ', '.join(["'{0}'".format(name.lower()) for name in names])
+    
+    return """
+SET COLSEP '{0}'
+SELECT 'P', p.name, p.type, p.issys_modifiable, p.isdefault, p.value
+FROM v$parameter p
+WHERE p.name IN ({2});
+SELECT 'S', sp.name, sp.sid, sp.ordinal, sp.value
+FROM v$spparameter sp
+WHERE sp.name IN ({2})
+  AND sp.sid IN ('{1}', '*')
+  AND sp.isspecified = 'TRUE'
+ORDER BY sp.name, sp.sid, sp.ordinal;
+SET COLSEP ' '""".format(SEPARATOR, instance.replace("'", "''"), in_list)
+
+def current_parameters(session, names, instance):
+    """ Each parameter by name, returns (rc, parameters, errors)
+    
+    The spfile value is the one set for the instance or, failing that,
+    for every instance (C(SID='*')), list values in their order
+    """
+    
+    rc, stdout, errors = session.execute(parameter_query(names, instance))
+    
+    if errors:
+        return (rc or 1, {}, errors)
+    
+    parameters = {}
+    spfile = {}
+    
+    for line in str(stdout).splitlines():
+        columns = [column.strip() for column in line.split(SEPARATOR)]
+        
+        if columns[0] == 'P' and len(columns) == 6:
+            _, name, kind, modifiable, isdefault, memory = columns
+            
+            parameters[name] = {
+                'type': kind,
+                'modifiable': modifiable,
+                'default': isdefault == 'TRUE',
+                'memory': memory or None,
+                'spfile': None,
+                'spfile_sid': None,
+            }
+        elif columns[0] == 'S' and len(columns) == 5:
+            _, name, sid, _, value = columns
+            spfile.setdefault(name, {}).setdefault(sid, []).append(value)
+    
+    for name, sids in spfile.items():
+        if name in parameters:
+            sid = instance if instance in sids else '*'
+            parameters[name]['spfile'] = ', '.join(sids.get(sid, []))
+            parameters[name]['spfile_sid'] = sid
+    
+    return (0, parameters, '')
+
+def normalize(kind, value):
+    """ A value as a list of strings to compare, None for no value """
+    
+    if value is None:
+        return None
+    
+    if isinstance(value, (list, tuple)):
+        values = [str(item) for item in value]
+    elif isinstance(value, bool):
+        values = ['TRUE' if value else 'FALSE']
+    else:
+        values = [str(value)]
+    
+    result = []
+    
+    for item in values:
+        item = item.strip().strip('"\'').strip()
+        
+        if kind == BOOLEAN:
+            item = 'TRUE' if item.upper() in ('TRUE', 'YES', 'ON', '1') else 'FALSE'
+        elif kind in (INTEGER, BIG_INTEGER):
+            match = re_size.match(item)
+            
+            if match:
+                item = str(int(match.group(1)) * UNITS.get(match.group(2).upper(), 1))
+        else:
+            item = ', '.join([part.strip() for part in item.split(',')]).upper()
+        
+        result.append(item)
+    
+    # the order of a list is not a change
+    return sorted(result)
+
+def split_current(kind, value, wanted):
+    """ A value read from the database shaped like the value wanted """
+    
+    if value is None:
+        return None
+    
+    # a list comes back comma separated, a scalar may hold commas of its own
+    if isinstance(wanted, (list, tuple)):
+        return normalize(kind, value.split(','))
+    
+    return normalize(kind, value)
+
+def sql_value(kind, value):
+    """ A value as it goes in ALTER SYSTEM """
+    
+    values = value if isinstance(value, (list, tuple)) else [value]
+    
+    if kind == BOOLEAN:
+        return normalize(kind, value)[0]
+    
+    if kind in (INTEGER, BIG_INTEGER):
+        return ', '.join([str(item).strip() for item in values])
+    
+    return ', '.join(["'{0}'".format(str(item).replace("'", "''")) for item in values])
+
+def plan(module, parameters, spfile_in_use):
+    """ The ALTER SYSTEM each parameter needs, returns (changes, restart, errors) """
+    
+    scope = module.params['scope']
+    instance = module.params['instance'].replace("'", "''")
+    changes = []
+    restart = []
+    errors = []
+    
+    for name in sorted(module.params['parameters']):
+        wanted = module.params['parameters'][name]
+        current = parameters.get(name.lower())
+        
+        if current is None:
+            # hidden parameters are only in v$parameter once set
+            if not name.startswith('_'):
+                errors.append('Unknown parameter {0}'.format(name))
+                continue
+            
+            kind = BOOLEAN if isinstance(wanted, bool) else INTEGER if isinstance(wanted, int) else '2'
+            current = {'type': kind, 'modifiable': 'FALSE', 'default': True, 'memory': None, 'spfile': None, 'spfile_sid': None}
+        
+        kind = current['type']
+        static = current['modifiable'] == 'FALSE'
+        quoted = '"{0}"'.format(name.lower()) if name.startswith('_') else name.lower()
+        change = {
+            'name': name.lower(),
+            'memory': current['memory'],
+            'spfile': current['spfile'],
+            'value': None if wanted is None else sql_value(kind, wanted),
+        }
+        
+        if wanted is None:
+            if current['spfile'] is not None and scope != 'memory':
+                change.update({
+                    'scope': 'SPFILE',
+                    'sql': "ALTER SYSTEM RESET {0} SCOPE=SPFILE SID='{1}'".format(
+                        quoted, current['spfile_sid'].replace("'", "''")),
+                    'restart': not current['default'],
+                })
+                changes.append(change)
+            
+            if not current['default']:
+                restart.append(name.lower())
+            
+            continue
+        
+        target = normalize(kind, wanted)
+        memory_differs = split_current(kind, current['memory'], wanted) != target
+        spfile_differs = split_current(kind, current['spfile'], wanted) != target
+        
+        # not in the spfile, a restart gives the default which is already wanted
+        if current['spfile'] is None and current['default'] and not memory_differs:
+            spfile_differs = False
+        
+        if scope == 'auto':
+            if not spfile_in_use:
+                memory, spfile = (memory_differs, False)
+            else:
+                memory, spfile = (memory_differs and not static, spfile_differs)
+        else:
+            memory = memory_differs and scope in ('memory', 'both')
+            spfile = spfile_differs and scope in ('spfile', 'both')
+        
+        if memory and static:
+            errors.append('{0} cannot be changed in memory, use scope spfile'.format(name))
+            continue
+        
+        # an earlier run may have left it in the spfile waiting for a restart
+        if static and memory_differs and scope != 'memory':
+            restart.append(name.lower())
+        
+        if not memory and not spfile:
+            continue
+        
+        change.update({
+            'scope': 'BOTH' if memory and spfile else 'MEMORY' if memory else 'SPFILE',
+            'restart': static and memory_differs,
+        })
+        change['sql'] = 'ALTER SYSTEM SET {0} = {1}{2} SCOPE={3} SID=\'{4}\''.format(
+            quoted,
+            change['value'],
+            ' DEFERRED' if memory and current['modifiable'] == 'DEFERRED' else '',
+            change['scope'],
+            instance,
+        )
+        changes.append(change)
+    
+    return (changes, restart, errors)
+
+def init_parameters(module, database_name, environment):
+    """ Read, compare and change in one session, returns (rc, result, errors) """
+    
+    phase = noh.profiler(module).phase
+    names = list(module.params['parameters']) + ['spfile']
+    
+    with noh.SQLPlusSession(module, environment) as session:
+        if session.errors:
+            return (1, None, session.errors)
+        
+        session.execute('SET HEADING OFF FEEDBACK OFF PAGESIZE 0 LINESIZE 32767 TRIMOUT ON DEFINE OFF')
+        
+        with phase('read', database=database_name, parameters=len(names)):
+            rc, parameters, errors = current_parameters(session, names, module.params['instance'])
+        
+        if errors:
+            return (rc, None, errors)
+        
+        spfile_in_use = bool((parameters.get('spfile') or {}).get('memory'))
+        changes, restart, errors = plan(module, parameters, spfile_in_use)
+        
+        if errors:
+            return (1, None, '\n'.join(errors))
+        
+        if module.check_mode:
+            return (0, {'changes': changes, 'restart_required': restart}, '')
+        
+        failed = []
+        
+        with phase('alter', database=database_name, changes=len(changes)):
+            for change in changes:
+                rc, _, errors = session.execute('{0};'.format(change['sql']))
+                
+                if errors:
+                    change['errors'] = errors
+                    failed.append('{0}: {1}'.format(change['name'], errors))
+                elif change['restart'] and change['name'] not in restart:
+                    restart.append(change['name'])
+    
+    return (1 if failed else 0, {'changes': changes, 'restart_required': sorted(restart)}, '\n'.join(failed))
+
+def main(module):
+    """ Parameters to a baseline """
+    
+    profiler = noh.profiler(module)
+    database_name = noh.database_name(module.params['database_name'])
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'changes': [],
+    }
+    
+    invalid = [name for name in module.params['parameters'] if not re_name.match(name)]
+    
+    if invalid:
+        module_fail['stderr'] = 'Invalid parameter names: {0}'.format(', '.join(invalid))
+        module.fail_json(**module_fail)
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+    
+    if not database_running:
+        module_fail['stderr'] = 'Cannot find ora_pmon_{0}'.format(database_name)
+        
+        module.fail_json(**module_fail)
+    
+    rc, result, errors = init_parameters(module, database_name, environment)
+    
+    if result is None:
+        module_fail['stderr'] = errors
+        module_fail.update(profiler.report(module))
+        
+        module.fail_json(**module_fail)
+    
+    module_exit = {
+        'changed': bool(result['changes']),
+    }
+    module_exit.update(result)
+    module_exit.update(profiler.report(module))
+    
+    # what was changed before an error is still reported
+    if errors:
+        module_exit.update({
+            'msg': 'An error has occured',
+            'rc': rc,
+            'stderr': errors,
+        })
+        module.fail_json(**module_exit)
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "str",
+            "aliases": ["name", "sid"],
+        },
+        "parameters": {
+            "required": True,
+            "type": "dict",
+        },
+        "scope": {
+            "type": "str",
+            "default": "auto",
+            "choices": ["auto", "memory", "spfile", "both"],
+        },
+        "instance": {
+            "type": "str",
+            "default": "*",
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+        supports_check_mode = True,
+    )
+    
+    main(module)
\ No newline at end of file
@@ -13,6 +13,9 @@ author:
 short_description: Parse Oracle Central Inventory
 description:
   - Return inventory as a dictionary
+  - With C(home_inventory) each home also has its components and patches,
+    read from the inventory of the home rather than through
+    C(opatch lsinventory)
 version_added: 0.1.0
 options:
   orainst_loc:
@@ -20,7 +23,30 @@ options:
       - Path to the oraInst.loc file
     default: /etc/oraInst.loc
     type: str
+  home_inventory:
+    description:
+      - Add the C(version), C(release_update), C(components) and C(patches)
+        of each home from its C(inventory/ContentsXML/comps.xml) and
+        C(inventory/oneoffs)
+    type: bool
+    default: no
+  max_workers:
+    description:
+      - Number of homes read at the same time
+    type: int
+    default: 4
+  cache:
+    description:
+      - Keep what was read from each home on the target, read again only
+        when C(comps.xml) or C(oneoffs) has been modified
+      - Only used with C(home_inventory)
+    type: bool
+    default: no
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
 notes:
+  - The cache is C(~/.ansible/tmp/antony_with_no_h.oracle/inventory.json)
+  - Homes marked as removed from the central inventory are not read
 """
 
 EXAMPLES = r"""
@@ -30,17 +56,104 @@ EXAMPLES = r"""
   
 - ansible.builtin.assert:
     that: '/u01/app/oracle/product/19.0.0/dbhome_1' in orainventory.resultset
+
+- name: Components and patches of each home
+  antony_with_no_h.oracle.inventory:
+    home_inventory: yes
+    cache: yes
+  register: orainventory
+
+- name: Homes not on the 19.21 release update
+  ansible.builtin.debug:
+    msg: "{{ item.key }} is on {{ item.value.release_update }}"
+  loop: "{{ orainventory.resultset | dict2items }}"
+  when: item.value.release_update is version('19.21', '<')
+"""
+
+RETURN = r"""
+resultset:
+  description:
+    - Homes keyed by location, each with its C(name) and whether it is
+      C(crs) or C(removed)
+    - With C(home_inventory) also the C(version) of the top level component,
+      the newest C(release_update) applied, C(components) (name and version)
+      and C(patches) (one-offs keyed by patch number with their
+      C(description) and when C(installed))
+  returned: always
+  type: dict
+  sample: {
+    "/u01/app/oracle/product/19.0.0/dbhome_1": {
+      "name": "OraDB19Home1",
+      "crs": false,
+      "removed": false,
+      "version": "19.0.0.0.0",
+      "release_update": "19.21.0.0.231017",
+      "components": {"oracle.server": "19.0.0.0.0", "oracle.rdbms": "19.0.0.0.0"},
+      "patches": {
+        "35643107": {
+          "description": "Database Release Update : 19.21.0.0.231017 (35643107)",
+          "installed": "2023.Oct.20 10:12:41 UTC"
+        }
+      }
+    }
+  }
+errors:
+  description: Homes whose own inventory could not be read, keyed by location
+  returned: with home_inventory
+  type: dict
 """
 
 import itertools
 import os
 
-from xml.etree import ElementTree
-
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
 from ansible.module_utils.basic import AnsibleModule
 
+INVENTORY_CACHE = '{0}/inventory.json'.format(noh.STATE_DIR)
+
+def home_inventories(module, homes):
+    """ The inventory of each home, returns (inventories, errors) keyed by location """
+    
+    phase = noh.profiler(module).phase
+    cache = noh.StateFile(INVENTORY_CACHE)
+    cached = cache.read() if module.params['cache'] else {}
+    
+    stamps = dict(
+        (home, noh.file_stamps(noh.home_inventory_files(home))) for home in homes
+    )
+    
+    # a patch rewrites comps.xml and adds to (or removes from) oneoffs
+    inventories = dict(
+        (home, cached[home]['inventory']) for home in homes
+            if home in cached and cached[home].get('stamps') == stamps[home]
+    )
+    
+    def read(home):
+        with phase('home_inventory', home=home):
+            return (0, noh.home_inventory(home), '')
+    
+    outcomes = noh.fan_out(read, [home for home in homes if home not in inventories], module.params['max_workers'])
+    
+    errors = dict(
+        (home, outcome[2]) for home, outcome in outcomes.items() if outcome[2]
+    )
+    found = dict(
+        (home, outcome[1]) for home, outcome in outcomes.items() if not outcome[2]
+    )
+    
+    if module.params['cache'] and found:
+        if not cache.update(dict(
+            (home, {'stamps': stamps[home], 'inventory': inventory}) for home, inventory in found.items()
+        )):
+            module.warn('Cannot write the inventory cache {0}'.format(cache.path))
+    
+    inventories.update(found)
+    
+    return (inventories, errors)
+
 def main(module):
     """ Parser for Oracle Inventory """
+    profiler = noh.profiler(module)
     orainst_loc = module.params['orainst_loc']
     
     if not os.path.isfile(orainst_loc):
@@ -50,7 +163,7 @@ def main(module):
     # be in /etc/oraInst.loc or /var/opt/oracle/oraInst.loc (solaris)
     with open(orainst_loc, 'r') as fd:
         lines = fd.read()
-        
+    
     inventory_loc = list(itertools.chain.from_iterable(
         line.split('=') for line in lines.split('\n') if 'inventory_loc' in line
     ))
@@ -59,38 +172,28 @@ def main(module):
         module.fail_json(msg='Cannot locate central inventory', resultset=lines)
     else:
         inventory_file = '/'.join([inventory_loc[1], 'ContentsXML', 'inventory.xml'])
-        
+    
     # inventory_loc is just a pointer to where the inventory should be
     # most oracle db products have a script to create it if this it the first
     # installation
     if not os.path.isfile(inventory_file):
         module.exit_json(changed=False, msg='Inventory does not exist', resultset={})
     
-    with open(inventory_file, 'r') as fd:
-        xml_tree = ElementTree.parse(fd)
-        
-        # everything between <INVENTORY> tags
-        xml_root = xml_tree.getroot()
-        
-        # each installed product is in a HOME tag
-        # when ansible drops 2.6 support will update this to a dict comp
-        try:
-            inventory = dict(
-                (attrs.attrib['LOC'], {
-                    'name': attrs.attrib['NAME'],
-                    'crs': True if 'CRS' in attrs.attrib else False,
-                }) for attrs in xml_root.iter('HOME')
-            )
-        except AttributeError:
-            inventory = dict(
-                (attrs.attrib['LOC'], {
-                    'name': attrs.attrib['NAME'],
-                    'crs': True if 'CRS' in attrs.attrib else False,
-                }) for attrs in xml_root.getiterator('HOME')
-            )
-            
-    module.exit_json(changed=False, msg='Inventory parsed', resultset=inventory)
+    with profiler.phase('central_inventory'):
+        inventory = noh.central_inventory(inventory_file)
     
+    if not module.params['home_inventory']:
+        module.exit_json(changed=False, msg='Inventory parsed', resultset=inventory, **profiler.report(module))
+    
+    inventories, errors = home_inventories(
+        module, sorted([home for home, attrs in inventory.items() if not attrs['removed']])
+    )
+    
+    for home, home_inventory in inventories.items():
+        inventory[home].update(home_inventory)
+    
+    module.exit_json(changed=False, msg='Inventory parsed', resultset=inventory, errors=errors, **profiler.report(module))
+
 if __name__ == "__main__":
     
     argument_spec = {
@@ -99,6 +202,25 @@ if __name__ == "__main__":
             "type": "str",
             "default": "/etc/oraInst.loc",
         },
+        "home_inventory": {
+            "type": "bool",
+            "default": False,
+        },
+        "max_workers": {
+            "type": "int",
+            "default": 4,
+        },
+        "cache": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
     }
     
     module = AnsibleModule(
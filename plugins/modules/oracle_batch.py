@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: oracle_batch
+author:
+  - antony.with.no.h
+short_description: Many sqlplus, table_list and table_dictionary requests in one task
+description:
+  - Runs a list of C(sqlplus), C(table_list) and C(table_dictionary) requests
+    against one database as a single module execution, with one C(oraenv)
+    and one SQL*Plus session on the target
+  - The action plugin of the same name checks the requests on the controller
+    and splits the results back out by request name
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name (SID) every request runs against
+    required: true
+    type: str
+    aliases: ['name', 'sid']
+  requests:
+    description:
+      - Each request is a C(name) and the options of one of
+        C(antony_with_no_h.oracle.sqlplus), C(table_list) or
+        C(table_dictionary) under the module name, short or fully qualified
+      - C(sqlplus) takes C(sql), C(raw), C(per_statement) and
+        C(ignore_errors)
+      - C(table_list) takes C(table), C(columns), C(where), C(order_by),
+        C(flatten), C(max_rows), C(page_size) and C(after_key)
+      - C(table_dictionary) takes C(table_name), C(column_as_key),
+        C(max_rows), C(page_size) and C(after_key)
+      - Requests run in order, a request which fails does not stop the rest
+    required: true
+    type: list
+  set_facts:
+    description:
+      - Also set the result of each request as a host fact of its C(name),
+        done by the action plugin on the controller
+      - Names must then be valid variable names and not reserved, start
+        with C(ansible_) or be C(oracle), C(oracle_*) or C(facts) so they
+        cannot replace facts gathered by Ansible or C(oracle_facts)
+    type: bool
+    default: no
+  timeout:
+    description:
+      - Seconds the session is given before SQL*Plus is killed, the request
+        running fails and the next one gets a new session, no limit by
+        default
+    type: int
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - The session is shared, anything a request changes in it (C(ALTER SESSION)
+    in C(sqlplus), ISO 8601 dates after C(table_dictionary)) carries over to
+    the requests after it
+  - A C(CONN) in C(sqlplus) is followed by a C(CONN / AS SYSDBA) and an
+    C(EXIT) by a new session so the next request is not run as someone else
+  - C(sql) ending part way through a PL/SQL block, a C(/*) comment or a
+    command continued with C(-) fails without being run, the session would
+    otherwise wait for the rest of it
+"""
+
+EXAMPLES = r"""
+- name: Users, parameters and a health check in one round trip
+  antony_with_no_h.oracle.oracle_batch:
+    database_name: ORCL
+    requests:
+      - name: users
+        table_list:
+          table: dba_users
+          columns:
+            - username
+            - account_status
+      - name: parameters
+        antony_with_no_h.oracle.table_dictionary:
+          table_name: v$parameter
+          column_as_key: name
+      - name: archive_dest
+        sqlplus:
+          sql: |
+            SELECT dest_name, status FROM v$archive_dest_status WHERE status != 'INACTIVE';
+  register: batch
+
+- ansible.builtin.debug:
+    msg: "{{ batch.results.parameters.resultset.processes.VALUE }} {{ batch.results.users.resultset | length }}"
+"""
+
+RETURN = r"""
+results:
+  description:
+    - Result of each request keyed by its name, as the module would have
+      returned it (C(rc), C(resultset), C(stderr) and for tables
+      C(truncated) and C(next_token)) and whether it C(failed)
+  returned: always
+  type: dict
+  sample:
+ansible_facts:
+  description: The same results as facts named by request, with C(set_facts)
+  returned: when set_facts is yes
+  type: dict
+"""
+
+import re
+
+from itertools import chain
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+re_connect = re.compile(r'^\s*CONN(?:ECT)?\b', re.MULTILINE|re.IGNORECASE)
+
+def batch_sqlplus(module, environment, session, args):
+    """ sqlplus in the shared session, returns (rc, result, errors) """
+    
+    sql = args['sql']
+    
+    if noh.re_host_command.findall(sql):
+        return (1, {'resultset': ''}, 'Issuing commands to the host is disabled.')
+    
+    # the shared session would wait for the rest of it, and every request after
+    try:
+        noh.split_statements(sql)
+    except noh.UnterminatedStatement as fault:
+        return (1, {'resultset': ''}, str(fault))
+    
+    if args.get('per_statement'):
+        rc, stdout, stderr = session.execute_statements(sql)
+    else:
+        rc, stdout, stderr = session.execute(sql, args.get('raw', False))
+    
+    # the requests after this one run as SYSDBA whoever this connected as
+    if re_connect.search(sql) and session.process is not None:
+        session.execute('CONN {0}'.format(session.connect), True)
+    
+    return (rc, {'resultset': stdout}, stderr)
+
+def batch_table_list(module, environment, session, args):
+    """ table_list in the shared session, returns (rc, result, errors) """
+    
+    table_columns = args['columns']
+    order_by = args.get('order_by')
+    max_rows = args.get('max_rows')
+    
+    aliases = [line.split()[-1].upper() for line in table_columns]
+    
+    if order_by is not None and order_by.upper() not in aliases:
+        return (1, {'resultset': []}, 'order_by must be one of the columns (or its alias)')
+    
+    key_index = aliases.index(order_by.upper()) if order_by is not None else None
+    
+    # ordering has to agree with > on the key
+    if order_by is not None:
+        session.execute('ALTER SESSION SET NLS_SORT = BINARY;')
+    
+    def fetch(after_key, limit):
+        rc, csv_data, csv_err = noh.table_as_csv(
+            module, environment, args['table'], table_columns, args.get('where'), session, order_by,
+            after_key, limit
+        )
+        
+        if csv_err:
+            return (1, csv_data, csv_err)
+        
+        skipped = []
+        rows = list(noh.decode_rows(csv_data or '', len(table_columns), skipped))
+        
+        noh.warn_skipped(module, skipped)
+        
+        return (0, rows, '')
+    
+    with noh.profiler(module).phase('table_as_csv', database=environment.get('ORACLE_SID'), table=args['table']):
+        rc, rows, errors = noh.keyset_pages(
+            fetch, key_index, args.get('after_key'), max_rows, args.get('page_size')
+        )
+    
+    if errors:
+        return (1, {'resultset': rows}, errors)
+    
+    rows, truncated, next_token = noh.keyset_truncate(rows, max_rows, key_index)
+    
+    return (0, {
+        'resultset': list(chain.from_iterable(rows)) if args.get('flatten') else rows,
+        'truncated': truncated,
+        'next_token': next_token,
+    }, '')
+
+def batch_table_dictionary(module, environment, session, args):
+    """ table_dictionary in the shared session, returns (rc, result, errors) """
+    
+    column_as_key = args['column_as_key'].upper() if args.get('column_as_key') else None
+    max_rows = args.get('max_rows')
+    
+    # rows are only ordered by the key to page through them
+    if max_rows is None and args.get('page_size') is None and args.get('after_key') is None:
+        order_by = None
+    else:
+        order_by = column_as_key
+    
+    rc, table_data, table_data_err = noh.table_rows(
+        module, environment, args['table_name'], session, None, order_by, args.get('after_key'),
+        max_rows, args.get('page_size')
+    )
+    
+    if table_data_err:
+        return (1, {'resultset': {}}, table_data_err)
+    
+    columns, rows = table_data
+    
+    if column_as_key is not None and column_as_key not in columns:
+        return (1, {'resultset': {}}, 'No column {0} in {1}'.format(column_as_key, args['table_name']))
+    
+    key_index = columns.index(column_as_key) if column_as_key is not None else None
+    
+    rows, truncated, next_token = noh.keyset_truncate(rows, max_rows, key_index if order_by else None)
+    
+    if key_index is None:
+        resultset = dict(zip(columns, rows[0] if rows else []))
+    else:
+        resultset = dict((row[key_index], dict(zip(columns, row))) for row in rows)
+    
+    return (0, {
+        'resultset': resultset,
+        'truncated': truncated,
+        'next_token': next_token,
+    }, '')
+
+BATCH_MODULES = {
+    'sqlplus': batch_sqlplus,
+    'table_list': batch_table_list,
+    'table_dictionary': batch_table_dictionary,
+}
+
+def run_batch(module, database_name, environment, requests):
+    """ Every request in one session, returns (rc, results, errors) """
+    
+    phase = noh.profiler(module).phase
+    results = {}
+    
+    session = noh.SQLPlusSession(module, environment, timeout=module.params['timeout'])
+    rc, _, errors = session.open()
+    
+    if errors:
+        return (1, results, errors)
+    
+    try:
+        for request in requests:
+            name = request['name']
+            args = request.get('args') or {}
+            
+            # an EXIT in sqlplus ends the session for everything after it
+            if session.process is None or session.process.poll() is not None:
+                session.close()
+                rc, _, errors = session.open()
+                
+                if errors:
+                    results[name] = {'rc': 1, 'failed': True, 'stderr': errors}
+                    continue
+            
+            try:
+                batch_module = BATCH_MODULES[request['module']]
+            except KeyError:
+                results[name] = {
+                    'rc': 1,
+                    'failed': True,
+                    'stderr': 'Cannot run {0} in a batch'.format(request['module']),
+                }
+                continue
+            
+            with phase('request', database=database_name, request=name):
+                try:
+                    rc, result, errors = batch_module(module, environment, session, args)
+                except KeyError as fault:
+                    rc, result, errors = (1, {}, 'Missing required option {0}'.format(fault))
+            
+            result.update({
+                'rc': rc,
+                'stderr': errors,
+                'failed': bool(errors) and not args.get('ignore_errors', False),
+            })
+            results[name] = result
+    finally:
+        session.close()
+    
+    return (0, results, '')
+
+def main(module):
+    """ Many requests, one execution """
+    
+    profiler = noh.profiler(module)
+    database_name = noh.database_name(module.params['database_name'])
+    requests = module.params['requests']
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'results': {},
+    }
+    
+    names = [request.get('name') for request in requests]
+    
+    if None in names or len(set(names)) != len(names):
+        module_fail['stderr'] = 'Every request needs a name of its own'
+        module.fail_json(**module_fail)
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+    
+    if not database_running:
+        module_fail['stderr'] = 'Cannot find ora_pmon_{0}'.format(database_name)
+        
+        module.fail_json(**module_fail)
+    
+    rc, results, errors = run_batch(module, database_name, environment, requests)
+    
+    if errors:
+        module_fail.update({
+            'stderr': errors,
+            'results': results,
+        })
+        module_fail.update(profiler.report(module))
+        
+        module.fail_json(**module_fail)
+    
+    failed = [name for name in names if results[name]['failed']]
+    
+    module_exit = {
+        'changed': False,
+        'msg': 'Ran {0} requests'.format(len(names)),
+        'results': results,
+    }
+    module_exit.update(profiler.report(module))
+    
+    if failed:
+        module_exit['msg'] = 'Failed requests: {0}'.format(', '.join(failed))
+        module.fail_json(**module_exit)
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "str",
+            "aliases": ["name", "sid"],
+        },
+        "requests": {
+            "required": True,
+            "type": "list",
+        },
+        "timeout": {
+            "type": "int",
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+    )
+    
+    main(module)
\ No newline at end of file
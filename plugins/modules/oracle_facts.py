@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: oracle_facts
+author:
+  - antony.with.no.h
+short_description: Database views as facts
+description:
+  - Query a set of views in a single SQL*Plus session and return them as
+    C(ansible_facts.oracle_<database_name>), the name in lower case
+  - Each database is a fact of its own so gathering another in a later task
+    does not replace it
+  - Facts can be cached on the target so plays within the TTL do not
+    connect to the database at all
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name (SID)
+    required: true
+    type: str
+    aliases: ['name', 'sid']
+  views:
+    description:
+      - Views (or tables) to gather, either a name or a dictionary of
+        C(name), C(key) and C(fact)
+      - C(key) returns a nested dictionary keyed by that column, without one a
+        single row is returned as a dictionary and more as a list
+      - C(fact) is the name given to the view in the facts, by default the
+        lower case name with C($) replaced by C(_)
+    type: list
+    default: ['v$database', 'v$instance', 'v$version', {'name': 'v$parameter', 'key': 'name'}]
+  cache_ttl:
+    description:
+      - Seconds gathered facts are reused for, C(0) to always gather
+    type: int
+    default: 0
+  cache_path:
+    description:
+      - File on the target to cache facts in
+      - Defaults to C(~/.ansible/tmp/antony_with_no_h.oracle/facts_<database_name>.json)
+    type: str
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - A view which cannot be queried is reported in C(errors) and left out of
+    the facts, the rest are still returned
+"""
+
+EXAMPLES = r"""
+- name: Gather the default views
+  antony_with_no_h.oracle.oracle_facts:
+    database_name: ORCL
+    cache_ttl: 3600
+
+- ansible.builtin.assert:
+    that: ansible_facts.oracle_orcl.v_database.LOG_MODE == 'ARCHIVELOG'
+
+- name: Pluggable databases keyed by name
+  antony_with_no_h.oracle.oracle_facts:
+    database_name: CORCL
+    views:
+      - v$database
+      - name: dba_pdbs
+        key: pdb_name
+        fact: pdbs
+"""
+
+RETURN = r"""
+ansible_facts:
+  description: Views keyed by fact name under C(oracle_<database_name>)
+  returned: success
+  type: dict
+  sample:
+cached:
+  description: Facts were read from the cache rather than the database
+  returned: success
+  type: bool
+errors:
+  description: Errors keyed by view name
+  returned: always
+  type: dict
+  sample:
+"""
+
+import time
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+def view_options(view):
+    """ A view given by name or dictionary as a dictionary """
+    
+    if not isinstance(view, dict):
+        view = {'name': view}
+    
+    name = view['name']
+    
+    return {
+        'name': name,
+        'key': view.get('key').upper() if view.get('key') else None,
+        'fact': view.get('fact') or name.lower().replace('$', '_'),
+    }
+
+def fact_name(database_name):
+    """ The fact of one database, a fact is replaced not merged by the next task """
+    
+    return 'oracle_{0}'.format(database_name.lower().replace('$', '_').replace('#', '_'))
+
+def gather(module, environment, views):
+    """ Query every view in one session, returns (facts, errors) """
+    
+    facts = {}
+    errors = {}
+    
+    with noh.SQLPlusSession(module, environment) as session:
+        for view in views:
+            rc, table_data, table_data_err = noh.table_rows(module, environment, view['name'], session)
+            
+            if table_data_err:
+                errors[view['name']] = table_data_err
+                continue
+            
+            columns, rows = table_data
+            
+            if view['key'] is not None:
+                if view['key'] not in columns:
+                    errors[view['name']] = 'No column {0}'.format(view['key'])
+                    continue
+                
+                key_index = columns.index(view['key'])
+                facts[view['fact']] = dict(
+                    (row[key_index], dict(zip(columns, row))) for row in rows
+                )
+            elif len(rows) == 1:
+                facts[view['fact']] = dict(zip(columns, rows[0]))
+            else:
+                facts[view['fact']] = [dict(zip(columns, row)) for row in rows]
+    
+    return (facts, errors)
+
+def main(module):
+    """ Oracle views as facts """
+    
+    profiler = noh.profiler(module)
+    database_name = noh.database_name(module.params['database_name'])
+    views = [view_options(view) for view in module.params['views']]
+    cache_ttl = module.params['cache_ttl']
+    cache_path = module.params['cache_path'] or '{0}/facts_{1}.json'.format(noh.STATE_DIR, database_name)
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+    }
+    
+    # the cache is only good for the same views
+    cache = noh.StateFile(cache_path)
+    cache_views = sorted([[view['name'], view['key'] or '', view['fact']] for view in views])
+    
+    if cache_ttl > 0:
+        cached = cache.read()
+        
+        if cached.get('views') == cache_views and time.time() - cached.get('time', 0) < cache_ttl:
+            module.exit_json(
+                changed=False,
+                cached=True,
+                errors={},
+                ansible_facts={fact_name(database_name): cached['facts']},
+                **profiler.report(module)
+            )
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+    
+    if not database_running:
+        module_fail['stderr'] = 'Cannot find ora_pmon_{0}'.format(database_name)
+        
+        module.fail_json(**module_fail)
+    
+    facts, errors = gather(module, environment, views)
+    
+    if errors and not facts:
+        module_fail.update({
+            'stderr': '\n'.join(errors.values()),
+            'errors': errors,
+        })
+        module_fail.update(profiler.report(module))
+        
+        module.fail_json(**module_fail)
+    
+    # a partial set of facts is not cached
+    if cache_ttl > 0 and not errors:
+        cache.update({
+            'views': cache_views,
+            'time': time.time(),
+            'facts': facts,
+        })
+    
+    module.exit_json(
+        changed=False,
+        cached=False,
+        errors=errors,
+        ansible_facts={fact_name(database_name): facts},
+        **profiler.report(module)
+    )
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "str",
+            "aliases": ["name", "sid"],
+        },
+        "views": {
+            "type": "list",
+            "default": [
+                "v$database",
+                "v$instance",
+                "v$version",
+                {"name": "v$parameter", "key": "name"},
+            ],
+        },
+        "cache_ttl": {
+            "type": "int",
+            "default": 0,
+        },
+        "cache_path": {
+            "type": "str",
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+    )
+    
+    main(module)
\ No newline at end of file
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: sql_scripts
+author:
+  - antony.with.no.h
+short_description: Run a list of SQL scripts, resuming where the last run stopped
+description:
+  - Runs SQL files on the target in order in one SQL*Plus session with
+    C(SET TIMING ON), a statement at a time, returning the elapsed time and
+    errors of each statement
+  - A script which runs without errors is checkpointed on the target, a
+    rerun skips it unless the file has changed since
+  - Scripts marked with the same C(group) run in order in a session of their
+    own, alongside the other groups next to them in the list
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name (SID)
+    required: true
+    type: str
+    aliases: ['name', 'sid']
+  scripts:
+    description:
+      - Each a path, relative to C(chdir), or a dictionary of C(path) and
+        C(group)
+      - Scripts without a group run one after another in the main session
+      - Scripts next to each other in the list with a group are independent
+        of the other groups, each group runs in order in its own session at
+        the same time as the rest, the next script without a group waits
+        for them all
+    required: true
+    type: list
+  chdir:
+    description:
+      - Directory scripts are found in and SQL*Plus runs in, for C(@@)
+    type: path
+  stop_on_error:
+    description:
+      - Stop a script at its first statement with an error, and the scripts
+        after it (or the rest of its group)
+    type: bool
+    default: yes
+  checkpoint:
+    description:
+      - Skip scripts completed by an earlier run, by path and checksum
+    type: bool
+    default: yes
+  checkpoint_path:
+    description:
+      - Defaults to C(~/.ansible/tmp/antony_with_no_h.oracle/sql_scripts_<database_name>.json)
+    type: path
+  max_workers:
+    description:
+      - Number of groups run at the same time
+    type: int
+    default: 4
+  timeout:
+    description:
+      - Seconds each session is given before SQL*Plus is killed and the
+        script running fails, no limit by default
+    type: int
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - Sessions connect C(/ AS SYSDBA), a script may C(CONN) as someone else.
+    Each script is followed by a C(CONN / AS SYSDBA) (or a new session after
+    an C(EXIT)) so the next starts as SYSDBA without the C(ALTER SESSION)s of
+    the one before
+  - A checkpoint is per script, a script which failed part way is run again
+    from the start
+  - In check mode nothing is run, C(scripts) shows what would be
+"""
+
+EXAMPLES = r"""
+- name: Release 42
+  antony_with_no_h.oracle.sql_scripts:
+    database_name: ORCL
+    chdir: /u01/app/releases/42
+    scripts:
+      - 01_tables.sql
+      - path: 02_grants_app.sql
+        group: grants
+      - path: 02_grants_report.sql
+        group: grants
+      - path: 03_packages.sql
+        group: code
+      - path: 04_views.sql
+        group: code
+      - 05_recompile.sql
+  register: release
+
+- ansible.builtin.debug:
+    msg: "{{ release.scripts | selectattr('status', 'equalto', 'ok') | map(attribute='path') | list }}"
+"""
+
+RETURN = r"""
+scripts:
+  description:
+    - Each script in order with its C(path), C(group), C(status) (C(ok),
+      C(failed), C(skipped) when checkpointed before or C(not_run) after a
+      failure), wall C(elapsed) seconds and C(statements)
+    - Each statement is its C(statement) number, C(sql), C(rc), C(rows),
+      C(row_count), C(errors), C(feedback) and C(elapsed) from
+      C(SET TIMING ON)
+  returned: always
+  type: list
+  sample: [{
+    "path": "/u01/app/releases/42/01_tables.sql",
+    "group": null,
+    "status": "ok",
+    "elapsed": 1.52,
+    "statements": [{
+      "statement": 1, "sql": "CREATE TABLE app.t (id NUMBER);", "rc": 0, "rows": [],
+      "row_count": null, "errors": [], "feedback": ["Table created."], "elapsed": 0.03
+    }]
+  }]
+"""
+
+import os
+import time
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+def script_options(module, script):
+    """ A script given by path or dictionary as a dictionary """
+    
+    if not isinstance(script, dict):
+        script = {'path': script}
+    
+    path = os.path.join(module.params['chdir'] or os.getcwd(), os.path.expanduser(script['path']))
+    
+    return {
+        'path': os.path.abspath(path),
+        'group': script.get('group'),
+    }
+
+def stages(scripts):
+    """ The scripts as stages run one after another, each a list of groups
+    run at the same time and each group a list of scripts run in order
+    """
+    
+    result = []
+    
+    for script in scripts:
+        if script['group'] is None:
+            result.append([[script]])
+        elif result and result[-1][0][0]['group'] is not None:
+            groups = result[-1]
+            group = [group for group in groups if group[0]['group'] == script['group']]
+            
+            if group:
+                group[0].append(script)
+            else:
+                groups.append([script])
+        else:
+            result.append([[script]])
+    
+    return result
+
+def run_script(module, database_name, session, script, checkpoint):
+    """ One script a statement at a time, returns the script with its result """
+    
+    phase = noh.profiler(module).phase
+    start = time.time()
+    
+    with phase('script', database=database_name, path=script['path']):
+        with open(script['path'], 'r') as fd:
+            sql = fd.read()
+        
+        rc, statements, errors = session.execute_statements(sql, module.params['stop_on_error'])
+    
+    script.update({
+        'status': 'failed' if errors else 'ok',
+        'elapsed': round(time.time() - start, 6),
+        'statements': statements,
+    })
+    
+    if errors and not statements:
+        script['stderr'] = errors
+    
+    if not errors and checkpoint is not None:
+        if not checkpoint.update({script['path']: {
+            'sha256': script['sha256'],
+            'completed': int(time.time()),
+            'elapsed': script['elapsed'],
+        }}):
+            module.warn('Cannot save the checkpoint to {0}'.format(checkpoint.path))
+    
+    return script
+
+def run_group(module, database_name, environment, session, group, checkpoint):
+    """ Scripts in order until one fails, returns (rc, scripts, errors) """
+    
+    failed = False
+    
+    for script in group:
+        if failed:
+            script['status'] = 'not_run'
+            continue
+        
+        run_script(module, database_name, session, script, checkpoint)
+        
+        # an EXIT in a script ends the session, the rest need another
+        if session.process is None or session.process.poll() is not None:
+            session.close()
+            session.open()
+            session.execute('SET TIMING ON')
+        else:
+            # the next script is SYSDBA again whoever this one connected as,
+            # and starts without its ALTER SESSIONs
+            _, _, errors = session.execute('CONN {0}'.format(session.connect), True)
+            
+            if errors:
+                session.close()
+                session.open()
+                session.execute('SET TIMING ON')
+        
+        failed = script['status'] == 'failed' and module.params['stop_on_error']
+    
+    return (1 if failed else 0, group, '')
+
+def sql_scripts(module, database_name, environment, scripts, checkpoint):
+    """ Every stage in turn, returns (rc, scripts, errors) """
+    
+    session = noh.SQLPlusSession(module, environment, '/ AS SYSDBA', module.params['chdir'], module.params['timeout'])
+    rc, _, errors = session.open()
+    
+    if errors:
+        return (1, scripts, errors)
+    
+    failed = False
+    
+    def group_session(group):
+        """ A group in a session of its own """
+        
+        with noh.SQLPlusSession(module, environment, '/ AS SYSDBA', module.params['chdir'], module.params['timeout']) as other:
+            if other.errors:
+                return (1, group, other.errors)
+            
+            other.execute('SET TIMING ON')
+            return run_group(module, database_name, environment, other, group, checkpoint)
+    
+    try:
+        session.execute('SET TIMING ON')
+        
+        for stage in stages([script for script in scripts if script['status'] is None]):
+            if failed:
+                for group in stage:
+                    for script in group:
+                        script['status'] = 'not_run'
+                continue
+            
+            if stage[0][0]['group'] is None:
+                rc, _, errors = run_group(module, database_name, environment, session, stage[0], checkpoint)
+            else:
+                # groups are keyed by position, a session each on the pool
+                outcomes = noh.fan_out(
+                    lambda index: group_session(stage[index]), list(range(len(stage))), module.params['max_workers']
+                )
+                rc = max([outcome[0] for outcome in outcomes.values()])
+                errors = '\n'.join([outcome[2] for outcome in outcomes.values() if outcome[2]])
+                
+                for index, outcome in outcomes.items():
+                    if outcome[2]:
+                        for script in stage[index]:
+                            if script['status'] is None:
+                                script.update({'status': 'failed', 'stderr': outcome[2]})
+            
+            if errors:
+                return (1, scripts, errors)
+            
+            failed = rc != 0
+    finally:
+        session.close()
+    
+    return (1 if failed else 0, scripts, '')
+
+def main(module):
+    """ Release scripts, resumable """
+    
+    profiler = noh.profiler(module)
+    database_name = noh.database_name(module.params['database_name'])
+    scripts = [script_options(module, script) for script in module.params['scripts']]
+    checkpoint_path = module.params['checkpoint_path'] or '{0}/sql_scripts_{1}.json'.format(noh.STATE_DIR, database_name)
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'scripts': scripts,
+    }
+    
+    missing = [script['path'] for script in scripts if not os.path.isfile(script['path'])]
+    
+    if missing:
+        module_fail['stderr'] = 'Cannot find {0}'.format(', '.join(missing))
+        module.fail_json(**module_fail)
+    
+    checkpoint = noh.StateFile(checkpoint_path) if module.params['checkpoint'] else None
+    completed = checkpoint.read() if checkpoint is not None else {}
+    
+    for script in scripts:
+        script['sha256'] = noh.file_sha256(script['path'])
+        
+        # a script changed since it was run is run again
+        done = completed.get(script['path']) or {}
+        script['status'] = 'skipped' if done.get('sha256') == script['sha256'] else None
+    
+    if module.check_mode or not [script for script in scripts if script['status'] is None]:
+        module.exit_json(changed=False, scripts=scripts, **profiler.report(module))
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+    
+    if not database_running:
+        module_fail['stderr'] = 'Cannot find ora_pmon_{0}'.format(database_name)
+        
+        module.fail_json(**module_fail)
+    
+    rc, scripts, errors = sql_scripts(module, database_name, environment, scripts, checkpoint)
+    
+    module_exit = {
+        'changed': any([script['status'] in ('ok', 'failed') for script in scripts]),
+        'scripts': scripts,
+    }
+    module_exit.update(profiler.report(module))
+    
+    failed = [script['path'] for script in scripts if script['status'] == 'failed']
+    
+    if errors or failed:
+        module_exit.update({
+            'msg': 'Failed scripts: {0}'.format(', '.join(failed)) if failed else 'An error has occured',
+            'rc': rc or 1,
+            'stderr': errors,
+        })
+        module.fail_json(**module_exit)
+    
+    module_exit['msg'] = 'Ran {0} scripts'.format(len([script for script in scripts if script['status'] == 'ok']))
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "str",
+            "aliases": ["name", "sid"],
+        },
+        "scripts": {
+            "required": True,
+            "type": "list",
+        },
+        "chdir": {
+            "type": "path",
+        },
+        "stop_on_error": {
+            "type": "bool",
+            "default": True,
+        },
+        "checkpoint": {
+            "type": "bool",
+            "default": True,
+        },
+        "checkpoint_path": {
+            "type": "path",
+        },
+        "max_workers": {
+            "type": "int",
+            "default": 4,
+        },
+        "timeout": {
+            "type": "int",
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+        supports_check_mode = True,
+    )
+    
+    main(module)
\ No newline at end of file
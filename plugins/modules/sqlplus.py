@@ -18,8 +18,11 @@ options:
   database_name:
     description:
       - Oracle database name (SID)
+      - A list of names or C(all) for every database in oratab runs the SQL
+        against each one concurrently, results and errors are then keyed by
+        database name
     required: true
-    type: str
+    type: list
     aliases: ['name', 'sid']
   sql:
     description:
@@ -41,6 +44,24 @@ options:
   chdir:
     description:
       - Working directory to start SQL*Plus in
+  max_workers:
+    description:
+      - Number of databases run against at the same time when more than one is named
+    type: int
+    default: 4
+  per_statement:
+    description:
+      - Split the SQL into statements and run them one at a time in the same
+        session, C(resultset) is then a list with the rows, errors, feedback
+        and elapsed time (with C(SET TIMING ON)) of each statement
+      - A statement is a SQL*Plus command, SQL ending with C(;) or C(/) or a
+        PL/SQL block ending with C(/)
+      - SQL ending part way through a block, a C(/*) comment or a command
+        continued with C(-) fails without running anything
+    type: bool
+    default: no
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
 notes:
   - SQL*Plus is started with nolog, specify the connection string to connect to the database e.g. C(conn / as sysdba)
   - Single numeric type values (count(*)) will be returned as int/float
@@ -70,59 +91,131 @@ EXAMPLES = r"""
 - name: Integer
   ansible.builtin.assert:
     that: (sql_count.resultset | type_debug) == 'int'
+
+- name: SQL*Plus - Every database in oratab
+  antony_with_no_h.oracle.sqlplus:
+    database_name: all
+    sql: |
+      CONN / AS SYSDBA
+      SELECT status FROM v$instance;
+  register: instance_status
+
+- name: SQL*Plus - Result of each statement
+  antony_with_no_h.oracle.sqlplus:
+    database_name: ORCL
+    per_statement: yes
+    sql: |
+      CONN / AS SYSDBA
+      SET TIMING ON
+      SELECT status FROM v$instance;
+      ALTER SYSTEM SWITCH LOGFILE;
+  register: statements
+
+- ansible.builtin.assert:
+    that: statements.resultset[2].rows[-1] == 'OPEN'
 """
 
 RETURN = r"""
 resultset:
-  description: Output from SQL*Plus
+  description:
+    - Output from SQL*Plus
+    - Keyed by database name when more than one database is run against
+    - A list of C(statement), C(sql), C(rc), C(rows), C(row_count),
+      C(errors), C(feedback) and C(elapsed) for each statement with
+      C(per_statement)
   returned: always
   type: str
   sample:
+errors:
+  description: Errors keyed by database name when more than one database is run against
+  returned: when more than one database is run against
+  type: dict
+  sample:
 """
 
-import re
-
 import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
 from ansible.module_utils.basic import AnsibleModule
 
+def run_sql(module, database_name, environment):
+    """ SQL*Plus against one of many databases, returns (rc, result, errors) """
+    
+    # run_command is not safe to share between threads, a session is
+    with noh.SQLPlusSession(module, environment, None, module.params["chdir"]) as session:
+        return session.execute_script(module.params["sql"], module.params["raw"])
+
+def run_statements(module, database_name, environment):
+    """ One statement at a time in one session, returns (rc, statements, errors) """
+    
+    with noh.SQLPlusSession(module, environment, None, module.params["chdir"]) as session:
+        return session.execute_statements(module.params["sql"])
+
 def main(module):
     """ Oracle SQL*Plus in Ansible """
     
+    profiler = noh.profiler(module)
     ignore_errors = module.params["ignore_errors"]
-    database_name = module.params["database_name"]
+    database_names = noh.database_names(module.params["database_name"])
+    max_workers = module.params["max_workers"]
+    per_statement = module.params["per_statement"]
     chdir = module.params["chdir"]
     raw = module.params["raw"]
     sql = module.params["sql"]
     
-    try:
-        _, environment, _ = noh.oraenv(module, database_name)
-    except noh.DatabaseNotFound as fault:
+    # a simple 'START/@' would circumvent this measure but im not trying to put
+    # the kid gloves on anyone just dont think its a good idea to be executing
+    # commands on the host from SQL*Plus that is being called from ansible...
+    sql_failure = noh.re_host_command.findall(sql)
+    
+    if sql_failure:
         module_fail = {
             'msg': 'Oracle SQL*Plus for Ansible',
             'rc': 1,
             'stdout': '',
-            'stderr': str(fault),
+            'stderr': 'Issuing commands to the host is disabled.',
             'resultset': '',
         }
     
-    # a simple 'START/@' would circumvent this measure but im not trying to put
-    # the kid gloves on anyone just dont think its a good idea to be executing
-    # commands on the host from SQL*Plus that is being called from ansible...
-    re_illegal = re.compile(r'(^(\!|host).*)', re.MULTILINE|re.IGNORECASE)
-    sql_failure = re_illegal.findall(sql)
+        module.fail_json(**module_fail)
     
-    if sql_failure:
+    if len(database_names) != 1 or module.params["database_name"][0].lower() == 'all':
+        resultset, errors = noh.fan_out_databases(
+            module,
+            database_names,
+            lambda name, environment: (run_statements if per_statement else run_sql)(module, name, environment),
+            max_workers,
+        )
+        
+        module_exit = {
+            'msg': 'Oracle SQL*Plus for Ansible',
+            'resultset': resultset,
+            'errors': errors,
+        }
+        module_exit.update(profiler.report(module))
+        
+        if errors and not ignore_errors:
+            module.fail_json(**module_exit)
+        else:
+            module.exit_json(**module_exit)
+    
+    try:
+        with profiler.phase('oraenv', database=database_names[0]):
+            _, environment, _ = noh.oraenv(module, database_names[0])
+    except noh.DatabaseNotFound as fault:
         module_fail = {
             'msg': 'Oracle SQL*Plus for Ansible',
             'rc': 1,
             'stdout': '',
-            'stderr': 'Issuing commands to the host is disabled.',
+            'stderr': str(fault),
             'resultset': '',
         }
-    
+        
         module.fail_json(**module_fail)
     
-    rc, stdout, stderr = noh.sqlplus(module, sql, environment, raw, chdir)
+    with profiler.phase('sqlplus', database=database_names[0]):
+        if per_statement:
+            rc, stdout, stderr = run_statements(module, database_names[0], environment)
+        else:
+            rc, stdout, stderr = noh.sqlplus(module, sql, environment, raw, chdir)
     
     module_exit = {
         'msg': 'Oracle SQL*Plus for Ansible',
@@ -131,6 +224,7 @@ def main(module):
         'stderr': stderr,
         'resultset': stdout,
     }
+    module_exit.update(profiler.report(module))
     
     if stderr and not ignore_errors:
         module.fail_json(**module_exit)
@@ -142,7 +236,7 @@ if __name__ == '__main__':
     argument_spec = {
         "database_name": {
             "required": True,
-            "type": "str",
+            "type": "list",
             "aliases": ["name", "sid"],
         },
         "ignore_errors": {
@@ -160,6 +254,21 @@ if __name__ == '__main__':
             "required": True,
             "type": "str",
         },
+        "max_workers": {
+            "default": 4,
+            "type": "int",
+        },
+        "per_statement": {
+            "default": False,
+            "type": "bool",
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
     }
     
     module = AnsibleModule(
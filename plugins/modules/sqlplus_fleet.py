@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: sqlplus_fleet
+author:
+  - antony.with.no.h
+short_description: Run a query against many databases over TNS
+description:
+  - Connects to each database over TNS from the machine the module runs on,
+    usually the controller, rather than as SYSDBA on the database host
+  - Databases are queried at the same time on a pool of threads, each with
+    its own timeout
+  - For read only reports across many databases without an SSH connection
+    to each host
+version_added: 0.2.0
+options:
+  targets:
+    description:
+      - Databases to connect to
+      - C(user), C(password) and C(timeout) default to the options of the
+        same name
+    required: true
+    type: list
+    elements: dict
+    suboptions:
+      name:
+        description:
+          - Name the target is reported under
+        required: true
+        type: str
+      connect:
+        description:
+          - TNS alias, EZConnect string or connect descriptor, by default
+            the C(name) as an alias in C(tnsnames.ora)
+        type: str
+      user:
+        description:
+          - User to connect as
+        type: str
+      password:
+        description:
+          - Password of C(user)
+        type: str
+      timeout:
+        description:
+          - Seconds the target has to logon and run C(sql)
+        type: int
+  sql:
+    description:
+      - SQL and SQL*Plus commands to run against every target
+    required: true
+    type: str
+  user:
+    description:
+      - User to connect as
+    type: str
+  password:
+    description:
+      - Password of C(user)
+    type: str
+  oracle_home:
+    description:
+      - Oracle client (or Instant Client directory) on the machine the module
+        runs on
+      - Without one C(sqlplus) is found on the C(PATH)
+    type: str
+  tns_admin:
+    description:
+      - Directory of the C(tnsnames.ora) to resolve aliases with
+    type: str
+  read_only:
+    description:
+      - Start with C(SET TRANSACTION READ ONLY) so DML fails, DDL and a
+        C(COMMIT) are not stopped
+    type: bool
+    default: yes
+  raw:
+    description:
+      - Return SQL*Plus output as is rather than stripped of whitespace
+    type: bool
+    default: no
+  timeout:
+    description:
+      - Seconds a target has to logon and run C(sql) before SQL*Plus is
+        killed and the target reported as an error
+    type: int
+    default: 60
+  max_connections:
+    description:
+      - Number of databases connected to at the same time
+    type: int
+    default: 16
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - Run it once on the controller, e.g. with C(delegate_to) C(localhost) and
+    C(run_once)
+  - The module only fails when every target does, the rest are in C(errors)
+"""
+
+EXAMPLES = r"""
+- name: Patch level of every database, connect descriptors from inventory
+  antony_with_no_h.oracle.sqlplus_fleet:
+    targets: "{{ groups['databases'] | map('extract', hostvars, 'oracle_target') | list }}"
+    user: reporting
+    password: "{{ vault_reporting_password }}"
+    sql: |
+      SELECT MAX(action_time) FROM dba_registry_sqlpatch;
+    max_connections: 32
+    timeout: 30
+  delegate_to: localhost
+  run_once: yes
+  register: patch_level
+
+- name: Aliases from tnsnames.ora
+  antony_with_no_h.oracle.sqlplus_fleet:
+    targets:
+      - name: ORCL
+      - name: CDB1
+        connect: "(DESCRIPTION=(ADDRESS=(PROTOCOL=TCP)(HOST=db1)(PORT=1521))(CONNECT_DATA=(SERVICE_NAME=cdb1)))"
+        timeout: 120
+    tns_admin: /etc/oracle/network/admin
+    oracle_home: /opt/oracle/instantclient_19_8
+    user: reporting
+    password: "{{ vault_reporting_password }}"
+    sql: SELECT COUNT(*) FROM v$session;
+  delegate_to: localhost
+  run_once: yes
+"""
+
+RETURN = r"""
+resultset:
+  description: Output of C(sql) keyed by target name
+  returned: success
+  type: dict
+  sample:
+errors:
+  description: Errors keyed by target name, including targets which timed out
+  returned: always
+  type: dict
+  sample:
+"""
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+def target_options(module, target):
+    """ A target with the module options filled in """
+    
+    return {
+        'name': target['name'],
+        'connect': target['connect'] or target['name'],
+        'user': target['user'] or module.params['user'],
+        'password': target['password'] or module.params['password'],
+        'timeout': target['timeout'] or module.params['timeout'],
+    }
+
+def run_target(module, environment, target):
+    """ SQL against one target in a session of its own, returns (rc, result, errors) """
+    
+    connect = noh.connect_string(target['user'], target['password'], target['connect'])
+    
+    with noh.SQLPlusSession(module, environment, connect, None, target['timeout']) as session:
+        if module.params['read_only']:
+            rc, _, errors = session.execute('SET TRANSACTION READ ONLY;')
+            
+            if errors:
+                return (rc or 1, None, errors)
+        
+        return session.execute(module.params['sql'], module.params['raw'])
+
+def main(module):
+    """ One query, many databases, no SSH """
+    
+    profiler = noh.profiler(module)
+    phase = profiler.phase
+    targets = [target_options(module, target) for target in module.params['targets']]
+    environment = noh.client_environment(module.params['oracle_home'], module.params['tns_admin'])
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'resultset': {},
+    }
+    
+    names = [target['name'] for target in targets]
+    
+    if len(set(names)) != len(names):
+        module_fail['stderr'] = 'Every target needs a name of its own'
+        module.fail_json(**module_fail)
+    
+    missing = [target['name'] for target in targets if not target['user'] or not target['password']]
+    
+    if missing:
+        module_fail['stderr'] = 'No user or password for {0}'.format(', '.join(missing))
+        module.fail_json(**module_fail)
+    
+    if noh.re_host_command.findall(module.params['sql']):
+        module_fail['stderr'] = 'Issuing commands to the host is disabled.'
+        module.fail_json(**module_fail)
+    
+    by_name = dict((target['name'], target) for target in targets)
+    
+    def run(name):
+        with phase('database', database=name):
+            return run_target(module, environment, by_name[name])
+    
+    # a session is a process of its own so is safe on the pool, the number of
+    # threads caps the connections open at once
+    outcomes = noh.fan_out(run, names, module.params['max_connections'])
+    
+    resultset = dict(
+        (name, outcome[1]) for name, outcome in outcomes.items() if not outcome[2]
+    )
+    errors = dict(
+        (name, outcome[2]) for name, outcome in outcomes.items() if outcome[2]
+    )
+    
+    module_exit = {
+        'changed': False,
+        'msg': 'Oracle SQL*Plus for Ansible',
+        'resultset': resultset,
+        'errors': errors,
+    }
+    module_exit.update(profiler.report(module))
+    
+    # only fail when there is nothing to show for it
+    if errors and not resultset:
+        module_exit['msg'] = 'An error has occured'
+        module.fail_json(**module_exit)
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "targets": {
+            "required": True,
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "name": {
+                    "required": True,
+                    "type": "str",
+                },
+                "connect": {
+                    "type": "str",
+                },
+                "user": {
+                    "type": "str",
+                },
+                "password": {
+                    "type": "str",
+                    "no_log": True,
+                },
+                "timeout": {
+                    "type": "int",
+                },
+            },
+        },
+        "sql": {
+            "required": True,
+            "type": "str",
+        },
+        "user": {
+            "type": "str",
+        },
+        "password": {
+            "type": "str",
+            "no_log": True,
+        },
+        "oracle_home": {
+            "type": "str",
+        },
+        "tns_admin": {
+            "type": "str",
+        },
+        "read_only": {
+            "type": "bool",
+            "default": True,
+        },
+        "raw": {
+            "type": "bool",
+            "default": False,
+        },
+        "timeout": {
+            "type": "int",
+            "default": 60,
+        },
+        "max_connections": {
+            "type": "int",
+            "default": 16,
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+    )
+    
+    main(module)
\ No newline at end of file
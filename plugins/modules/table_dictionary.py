@@ -18,8 +18,10 @@ options:
   database_name:
     description:
       - Name of the database to connect to
+      - A list of names or C(all) for every database in oratab queries each
+        one concurrently, results and errors are then keyed by database name
     required: true
-    type: str
+    type: list
     aliases: ['name', 'sid']
   table_name:
     description:
@@ -33,7 +35,72 @@ options:
       - Specifying this parameter will return a nested dictionary
     required: false
     type: str
+  max_rows:
+    description:
+      - Return at most this many rows, C(truncated) is set when there were more
+      - With C(column_as_key) rows are ordered by that column and
+        C(next_token) is the key to carry on from with C(after_key)
+      - The key has to be unique to page by, a key on more than one row
+        fails rather than skipping rows between pages
+    type: int
+  page_size:
+    description:
+      - Fetch rows from the database this many at a time, which bounds what
+        is buffered in the SQL*Plus session on the target
+      - Needs C(column_as_key)
+    type: int
+  after_key:
+    description:
+      - Only rows with C(column_as_key) greater than this, the C(next_token)
+        of the previous call
+      - Rows with a NULL key are left out when paging
+    type: str
+    aliases: ['next_token']
+  format:
+    description:
+      - C(dictionary) returns the rows as described for C(column_as_key)
+      - C(columnar) returns a dictionary of column name to a list of values,
+        each column name is sent once rather than once per row
+      - C(file) writes the rows to a gzip file on the target and returns only
+        its C(path), C(rows) and C(sha256), ready for C(fetch)
+    type: str
+    default: dictionary
+    choices: ['dictionary', 'columnar', 'file']
+  file_format:
+    description:
+      - JSON Lines (an object per row) or CSV (with a header) for C(format=file)
+    type: str
+    default: jsonl
+    choices: ['jsonl', 'csv']
+  dest:
+    description:
+      - Directory on the target the file is written to with C(format=file),
+        named C(<database_name>_<table>.<file_format>.gz)
+      - Defaults to C(~/.ansible/tmp/antony_with_no_h.oracle)
+    type: str
+  since_snapshot:
+    description:
+      - Return only the rows added, changed and removed since the last run
+        with this snapshot name, C(changed) is set when there are any
+      - A hash of each row is taken in the database and kept by
+        C(column_as_key) on the target in
+        C(~/.ansible/tmp/antony_with_no_h.oracle/snapshot_<database_name>_<table>_<since_snapshot>.json),
+        only the rows whose hash differs are sent back
+      - The first run, or once C(column_as_key) changes, returns every row
+        as added
+      - Needs C(column_as_key) and cannot be used with paging or a C(format)
+        other than C(dictionary)
+    type: str
+  max_workers:
+    description:
+      - Number of databases queried at the same time when more than one is named
+    type: int
+    default: 4
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
 notes:
+  - Values are converted using the column type from C(DESC), C(NUMBER) as int or
+    float, C(DATE) and C(TIMESTAMP) as ISO 8601 text and anything else as text
 """
 
 EXAMPLES = r"""
@@ -59,17 +126,83 @@ EXAMPLES = r"""
       ALTER SYSTEM SET processes = 400 SCOPE=spfile;
     when:
       - v_parameter.resultset.processes.DISPLAY_VALUE < 400
+
+- name: dba_objects 5000 at a time
+  antony_with_no_h.oracle.table_dictionary:
+    database_name: ORCL
+    table: dba_objects
+    column_as_key: object_id
+    max_rows: 5000
+    page_size: 1000
+  register: objects
+
+- name: dba_objects the next 5000
+  antony_with_no_h.oracle.table_dictionary:
+    database_name: ORCL
+    table: dba_objects
+    column_as_key: object_id
+    max_rows: 5000
+    after_key: "{{ objects.next_token }}"
+  when: objects.truncated
+
+- name: v$parameter as a file to fetch
+  antony_with_no_h.oracle.table_dictionary:
+    database_name: ORCL
+    table: v$parameter
+    format: file
+    file_format: csv
+  register: parameters
+
+- ansible.builtin.fetch:
+    src: "{{ parameters.resultset.path }}"
+    dest: parameters/
+
+- name: v$parameter drift since the last run
+  antony_with_no_h.oracle.table_dictionary:
+    database_name: ORCL
+    table: v$parameter
+    column_as_key: name
+    since_snapshot: drift
+  register: parameter_drift
+
+- ansible.builtin.debug:
+    msg: "{{ parameter_drift.resultset.changed.keys() | list }}"
+  when: parameter_drift is changed
 """
 
 RETURN = r"""
 resultset:
-  description: Table data as a dictionary object
+  description:
+    - Table data as a dictionary object
+    - Keyed by database name when more than one database is queried
+    - With C(format=file) the C(path), C(format), C(rows), C(sha256) and
+      whether it C(changed) of the file written
+    - With C(since_snapshot) the C(added) and C(changed) rows, each a
+      nested dictionary, and the C(column_as_key) of each row C(removed)
   returned: success
   type: dict
   sample:
+truncated:
+  description:
+    - There were more than C(max_rows) rows
+    - Keyed by database name when more than one database is queried
+  returned: success
+  type: bool
+next_token:
+  description:
+    - C(column_as_key) of the last row returned when C(truncated), pass it
+      as C(after_key) for the next page
+    - Keyed by database name when more than one database is queried
+  returned: success
+  type: str
+errors:
+  description: Errors keyed by database name when more than one database is queried
+  returned: when more than one database is queried
+  type: dict
+  sample:
 """
 
-import re
+import os
 import platform
 
 python_tuple = tuple(map(int, platform.python_version_tuple()))
@@ -79,107 +212,235 @@ if python_tuple <= (2, 7, 18):
 import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
 from ansible.module_utils.basic import AnsibleModule
 
-def main(module):
+def dictionary_delta(module, database_name, environment, column_as_key):
+    """ Rows added, changed and removed since the snapshot, returns (rc, resultset, errors) """
+    
+    table_name = module.params['table_name']
+    
+    with noh.SQLPlusSession(module, environment) as session:
+        rc, schema, errors = noh.table_schema(module, environment, table_name, session)
+        if errors:
+            return (1, 'DESC {0}'.format(table_name), errors)
+        
+        columns, converters = schema
+        
+        if column_as_key not in columns:
+            return (1, None, 'No column {0} in {1}'.format(column_as_key, table_name))
+        
+        rc, delta, errors = noh.table_delta(
+            module,
+            environment,
+            table_name,
+            columns,
+            column_as_key,
+            noh.snapshot_path(module.params['since_snapshot'], database_name, table_name),
+            None,
+            session,
+        )
+    
+    if errors:
+        return (1, delta, errors)
+    
+    added, changed, removed = delta
+    key_index = columns.index(column_as_key)
+    
+    def nested(rows):
+        typed_rows = ([convert(value) for convert, value in zip(converters, row)] for row in rows)
+        
+        return dict((row[key_index], dict(zip(columns, row))) for row in typed_rows)
+    
+    return (0, {
+        'added': nested(added),
+        'changed': nested(changed),
+        'removed': [converters[key_index](key) for key in removed],
+    }, '')
+
+def table_dictionary(module, database_name, environment, process_list):
+    """ Query one database, returns (rc, (resultset, truncated, next_token), errors) """
     
     try:
         column_as_key = module.params['column_as_key'].upper()
     except AttributeError:
         column_as_key = module.params['column_as_key']
         
-    database_name = module.params['database_name'].upper()
     table_name = module.params['table_name']
+    result_format = module.params['format']
+    max_rows = module.params['max_rows']
+    page_size = module.params['page_size']
+    after_key = module.params['after_key']
     
-    module_fail = {
-        'msg': 'An error has occured',
-        'rc': 1,
-        'stdout': '',
-    }
-        
-    try:
-        _, environment, _ = noh.oraenv(module, database_name)
-    except noh.DatabaseNotFound as fault:
-        module_fail['stderr'] = str(fault)
-        
-        module.fail_json(**module_fail)
-        
-    _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
     database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
     
     if not database_running:
-        module_fail.update({
-            'stderr': 'Cannot find ora_pmon_{0}'.format(database_name),
-            'resultset': process_list,
-        })
-             
-        module.fail_json(**module_fail)
+        return (1, process_list, 'Cannot find ora_pmon_{0}'.format(database_name))
     
-    # build up a list of columns using `desc`
-    sql_table_columns = '''
-        CONN / AS SYSDBA
-        DESC {0}
-        EXIT
-    '''.format(table_name)
+    # the delta is the whole result, nothing to page through
+    if module.params['since_snapshot'] is not None:
+        rc, resultset, errors = dictionary_delta(module, database_name, environment, column_as_key)
         
-    _, table_desc, table_desc_err = noh.sqlplus(module, sql_table_columns, environment)
-    if table_desc_err:
-        module_fail.update({
-            'stdout': sql_table_columns,
-            'stderr': table_desc_err,
-        })
+        if errors:
+            return (1, resultset, errors)
         
-        module.fail_json(**module_fail)
+        return (0, (resultset, False, None), '')
     
-    # remove the header and split on \s or \t to get the column names
-    column_desc = [
-        col.strip() for col in table_desc.split('\n')
-    ]
+    # rows are only ordered by the key to page through them
+    if max_rows is None and page_size is None and after_key is None:
+        order_by = None
+    else:
+        order_by = column_as_key
+    
+    # DESC and the cursor share one SQL*Plus process and logon, each is
+    # timed by table_rows
+    with noh.SQLPlusSession(module, environment) as session:
+        rc, table_data, table_data_err = noh.table_rows(
+            module, environment, table_name, session, None, order_by, after_key, max_rows, page_size
+        )
     
-    columns = [
-        re.split(r'[\s\t]+', col)[0] for col in column_desc[2:] if col
-    ]
+    if table_data_err:
+        return (1, table_data or 'DESC {0}'.format(table_name), table_data_err)
+    
+    columns, table_data_list = table_data
+    key_index = columns.index(order_by) if order_by is not None else None
+    
+    # the extra row fetched says whether there are more
+    table_data_list, truncated, next_token = noh.keyset_truncate(table_data_list, max_rows, key_index)
+        
+    if result_format == 'columnar':
+        resultset = noh.columnar(columns, table_data_list)
+    elif result_format == 'file':
+        path = os.path.join(
+            module.params['dest'] or noh.STATE_DIR,
+            '{0}_{1}.{2}.gz'.format(database_name, table_name.lower(), module.params['file_format']),
+        )
         
-    if column_as_key is None:
+        rc, resultset, errors = noh.write_rows(path, columns, table_data_list, module.params['file_format'])
+        if errors:
+            return (1, None, errors)
+    elif column_as_key is None:
         # tables with a single row (e.g. v$database) are good candidates for a
         # simple dictionary
-        _, table_data, table_data_err = noh.table_as_csv(module, environment, table_name, columns)
-        
-        if table_data_err:
-            module_fail['stderr'] = str(fault)
-            module.fail_json(**module_fail)
-        
-        table_data_list = [
-            noh.str_to_intfl(column) for column in table_data.split(',')
-        ]
-        
-        resultset = dict(zip(columns, table_data_list))
+        resultset = dict(zip(columns, table_data_list[0] if table_data_list else []))
     else:
         # multiple rows make more sense as nested dictionaries
         # there is no check for uniqueness we assume the enduser has determined
         # a good column to use as the dictionary key
         key_index = columns.index(column_as_key)
-        _, table_data, table_data_err = noh.table_as_csv(module, environment, table_name, columns)
-        
-        if table_data_err:
-            module_fail['stderr'] = str(fault)
-            module.fail_json(**module_fail)
-            
-        table_data_list = [
-            list(map(noh.str_to_intfl, column.split(','))) for column 
-                in table_data.split('\n') if column
-        ]
         
         resultset = dict(
             (data_iter[key_index], dict(zip(columns, data_iter)))
                 for data_iter in table_data_list
         )
+    
+    return (0, (resultset, truncated, next_token), '')
+
+def result_changed(module, resultsets):
+    """ A file written by format=file, or rows differing from the snapshot """
+    
+    if module.params['since_snapshot'] is not None:
+        return any(
+            resultset['added'] or resultset['changed'] or resultset['removed'] for resultset in resultsets
+        )
+    
+    if module.params['format'] != 'file':
+        return False
+    
+    return any(resultset['changed'] for resultset in resultsets)
+
+def main(module):
+    
+    profiler = noh.profiler(module)
+    database_names = noh.database_names(module.params['database_name'])
+    max_workers = module.params['max_workers']
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'stdout': '',
+    }
+    
+    if module.params['column_as_key'] is None and (module.params['page_size'] or module.params['after_key']):
+        module_fail['stderr'] = 'page_size and after_key need column_as_key to page by'
+        module.fail_json(**module_fail)
+    
+    if module.params['since_snapshot'] is not None:
+        if module.params['column_as_key'] is None:
+            module_fail['stderr'] = 'since_snapshot needs column_as_key to tell rows apart'
+            module.fail_json(**module_fail)
+        
+        unsupported = [
+            option for option in ('max_rows', 'page_size', 'after_key') if module.params[option] is not None
+        ]
+        
+        if module.params['format'] != 'dictionary':
+            unsupported.append('format')
+        
+        if unsupported:
+            module_fail['stderr'] = '{0} cannot be used with since_snapshot'.format(', '.join(unsupported))
+            module.fail_json(**module_fail)
+    
+    # one process scan for however many databases
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    
+    if len(database_names) != 1 or module.params['database_name'][0].lower() == 'all':
+        results, errors = noh.fan_out_databases(
+            module,
+            database_names,
+            lambda name, environment: table_dictionary(module, name, environment, process_list),
+            max_workers,
+        )
+        
+        resultset = dict((name, result[0]) for name, result in results.items())
+        
+        module_exit = {
+            'changed': result_changed(module, resultset.values()),
+            'msg': 'Tables returned as dictionary objects',
+            'resultset': resultset,
+            'truncated': dict((name, result[1]) for name, result in results.items()),
+            'next_token': dict((name, result[2]) for name, result in results.items()),
+            'errors': errors,
+        }
+        
+        module_exit.update(profiler.report(module))
+        
+        # only fail when there is nothing to show for it
+        if errors and not resultset:
+            module_exit['msg'] = 'An error has occured'
+            module.fail_json(**module_exit)
+            
+        module.exit_json(**module_exit)
+    
+    database_name = database_names[0]
+        
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    rc, result, errors = table_dictionary(module, database_name, environment, process_list)
+    
+    if errors:
+        module_fail.update({
+            'stderr': errors,
+            'resultset': result,
+        })
+        module_fail.update(profiler.report(module))
+        
+        module.fail_json(**module_fail)
         
     module_exit = {
-        'changed': False,
+        'changed': result_changed(module, [result[0]]),
         'msg': 'Table returned as dictionary object',
         'stdout': '',
         'stderr': '',
-        'resultset': resultset,
+        'resultset': result[0],
+        'truncated': result[1],
+        'next_token': result[2],
     }
+    module_exit.update(profiler.report(module))
     
     module.exit_json(**module_exit)
 
@@ -188,7 +449,7 @@ if __name__ == "__main__":
     argument_spec = {
         "database_name": {
             "required": True,
-            "type": "str",
+            "type": "list",
             "aliases": ["name", "sid"],
         },
         "table_name": {
@@ -199,7 +460,44 @@ if __name__ == "__main__":
         "column_as_key": {
             "required": False,
             "type": "str",
-        }
+        },
+        "max_rows": {
+            "type": "int",
+        },
+        "page_size": {
+            "type": "int",
+        },
+        "after_key": {
+            "type": "str",
+            "aliases": ["next_token"],
+        },
+        "format": {
+            "type": "str",
+            "default": "dictionary",
+            "choices": ["dictionary", "columnar", "file"],
+        },
+        "file_format": {
+            "type": "str",
+            "default": "jsonl",
+            "choices": ["jsonl", "csv"],
+        },
+        "dest": {
+            "type": "str",
+        },
+        "since_snapshot": {
+            "type": "str",
+        },
+        "max_workers": {
+            "type": "int",
+            "default": 4,
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
     }
     
     module = AnsibleModule(
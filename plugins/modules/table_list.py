@@ -18,8 +18,10 @@ options:
   database_name:
     description:
       - Oracle database name
+      - A list of names or C(all) for every database in oratab queries each
+        one concurrently, results and errors are then keyed by database name
     required: true
-    type: str
+    type: list
     aliases: ['name', 'sid']
   table_name:
     description:
@@ -38,8 +40,106 @@ options:
       - List is flattened before being returned
     type: bool
     default: no
+  max_workers:
+    description:
+      - Number of databases queried at the same time when more than one is named
+    type: int
+    default: 4
+  extract:
+    description:
+      - How rows are brought back from the database
+      - C(dbms_output) builds each row in PL/SQL, suited to small views as the
+        whole result is buffered in the session
+      - C(spool) writes the query to a CSV file on the target which is read
+        back a chunk at a time, for large tables and values containing commas
+      - With C(format=file) and no C(max_rows) or C(page_size) the spool is
+        written to the file as it is read, never held in memory
+    type: str
+    default: dbms_output
+    choices: ['dbms_output', 'spool']
+  parallel:
+    description:
+      - Split the query into this many disjoint slices, each run in its own
+        SQL*Plus session at the same time
+    type: int
+    default: 1
+  parallel_key:
+    description:
+      - Expression hashed with C(ORA_HASH) to assign a row to a slice
+      - Views without a ROWID (e.g. C(v$) views) need a column instead
+    type: str
+    default: ROWID
+  order_by:
+    description:
+      - Column (or alias) to order by, slices are merged keeping the order
+      - With C(parallel) the slices are merged as numbers when C(DESC) has
+        the column as a C(NUMBER), anything else (an expression, a date) as
+        text, which is the order of a single query for text in an AL32UTF8
+        database
+      - Has to be unique to page by with C(max_rows) or C(page_size), a key
+        on more than one row fails rather than skipping rows between pages
+    type: str
+  format:
+    description:
+      - C(list) returns a list of rows, each a list of values
+      - C(columnar) returns a dictionary of column name to a list of values,
+        each column name is sent once rather than once per row
+      - C(file) writes the rows to a gzip file on the target and returns only
+        its C(path), C(rows) and C(sha256), ready for C(fetch)
+      - C(flatten) only applies to C(list)
+    type: str
+    default: list
+    choices: ['list', 'columnar', 'file']
+  file_format:
+    description:
+      - JSON Lines (an object per row) or CSV (with a header) for C(format=file)
+    type: str
+    default: jsonl
+    choices: ['jsonl', 'csv']
+  dest:
+    description:
+      - Directory on the target the file is written to with C(format=file),
+        named C(<database_name>_<table>.<file_format>.gz)
+      - Defaults to C(~/.ansible/tmp/antony_with_no_h.oracle)
+    type: str
+  max_rows:
+    description:
+      - Return at most this many rows, C(truncated) is set when there were more
+      - With C(order_by) it is the key rows are paged by and C(next_token)
+        is the key to carry on from with C(after_key)
+    type: int
+  page_size:
+    description:
+      - Fetch rows from the database this many at a time, which bounds what
+        is buffered in the SQL*Plus session (or spooled) on the target
+      - Needs C(order_by)
+    type: int
+  after_key:
+    description:
+      - Only rows with C(order_by) greater than this, the C(next_token) of
+        the previous call
+      - Rows with a NULL key are left out when paging
+    type: str
+    aliases: ['next_token']
+  since_snapshot:
+    description:
+      - Return only the rows added, changed and removed since the last run
+        with this snapshot name, C(changed) is set when there are any
+      - A hash of each row is taken in the database and kept by C(order_by)
+        on the target in
+        C(~/.ansible/tmp/antony_with_no_h.oracle/snapshot_<database_name>_<table>_<since_snapshot>.json),
+        only the rows whose hash differs are sent back
+      - The first run, or once C(columns), C(where) or C(order_by) change,
+        returns every row as added
+      - Needs C(order_by), a column unique to each row
+    type: str
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
 notes:
 - C(columns) ['*'] is not currently supported
+- C(max_rows), C(page_size) and C(after_key) cannot be used with C(parallel)
+- C(since_snapshot) cannot be used with C(parallel), paging, C(extract=spool)
+  or a C(format) other than C(list)
 """
 
 EXAMPLES = r"""
@@ -73,29 +173,351 @@ EXAMPLES = r"""
       - created
       - last_ddl_time
     where: status != 'VALID'
+
+- name: Large tables are better spooled
+  antony_with_no_h.oracle.table_list:
+    database_name: ORCL
+    table_name: dba_segments
+    table_columns:
+      - owner
+      - segment_name
+      - bytes
+    extract: spool
+
+- name: Split a large extraction across 8 sessions
+  antony_with_no_h.oracle.table_list:
+    database_name: ORCL
+    table_name: dba_audit_trail
+    table_columns:
+      - username
+      - action_name
+      - TO_CHAR(timestamp, 'YYYY-MM-DD HH24:MI:SS') ts
+    where: timestamp > SYSDATE - 7
+    extract: spool
+    parallel: 8
+    order_by: ts
+
+- name: Every database in oratab
+  antony_with_no_h.oracle.table_list:
+    database_name: all
+    table_name: v$instance
+    table_columns:
+      - status
+    flatten: yes
+    max_workers: 8
+  register: instance_status
+
+- name: Table list - dba_objects a page at a time
+  antony_with_no_h.oracle.table_list:
+    database_name: ORCL
+    table: dba_objects
+    columns:
+      - object_id
+      - object_name
+    order_by: object_id
+    max_rows: 10000
+    page_size: 2000
+    after_key: "{{ after_key | default(omit) }}"
+  register: objects
+
+- name: Table list - columns as lists
+  antony_with_no_h.oracle.table_list:
+    database_name: ORCL
+    table: dba_users
+    columns:
+      - username
+      - account_status
+    format: columnar
+  register: users
+
+- ansible.builtin.debug:
+    msg: "{{ dict(users.resultset.USERNAME | zip(users.resultset.ACCOUNT_STATUS)) }}"
+
+- name: Table list - accounts changed since the last hourly run
+  antony_with_no_h.oracle.table_list:
+    database_name: ORCL
+    table: dba_users
+    columns:
+      - username
+      - account_status
+      - profile
+    order_by: username
+    since_snapshot: hourly
+  register: users_drift
+
+- ansible.builtin.debug:
+    msg: "{{ users_drift.resultset.changed }}"
+  when: users_drift is changed
 """
 
 RETURN = r"""
 resultset:
-  description: Table data
+  description:
+    - Table data
+    - A dictionary of table data keyed by database name when more than one database is queried
+    - With C(format=file) the C(path), C(format), C(rows), C(sha256) and
+      whether it C(changed) of the file written
+    - With C(since_snapshot) the C(added) and C(changed) rows and the
+      C(order_by) of each row C(removed)
   returned: always
   type: list
   sample:
+truncated:
+  description:
+    - There were more than C(max_rows) rows
+    - Keyed by database name when more than one database is queried
+  returned: success
+  type: bool
+next_token:
+  description:
+    - C(order_by) of the last row returned when C(truncated), pass it as
+      C(after_key) for the next page
+    - Keyed by database name when more than one database is queried
+  returned: success
+  type: str
+errors:
+  description: Errors keyed by database name when more than one database is queried
+  returned: when more than one database is queried
+  type: dict
+  sample:
 """
 
+import os
+
 from itertools import chain
 
 import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
 from ansible.module_utils.basic import AnsibleModule
 
-def main(module):
-    """ Return query as a list """
+def fetch_rows(module, environment, predicates, order_by=None, stream=False):
+    """ Rows as a list of lists, returns (rc, rows, errors)
+    
+    With max_rows one row more is returned so the caller can tell there
+    were more, see noh.keyset_truncate(). With stream the rows of a spool are
+    a generator read a chunk at a time, for write_rows(), it raises
+    noh.SpoolError if the query failed part way
+    """
     
-    database_name = module.params["database_name"]
     table_columns = module.params["columns"]
-    query_condition = module.params["where"]
     table_name = module.params["table"]
+    
+    phase = noh.profiler(module).phase
+    labels = {'database': environment.get('ORACLE_SID'), 'table': table_name}
+    
+    aliases = [line.split()[-1].upper() for line in table_columns]
+    key_index = aliases.index(order_by.upper()) if order_by is not None else None
+    
+    with noh.SQLPlusSession(module, environment) as session:
+        
+        # ordering has to agree with how python compares the merged rows
+        if order_by is not None:
+            session.execute('ALTER SESSION SET NLS_SORT = BINARY;')
+        
+        def fetch(after_key, limit):
+            if module.params["extract"] == 'spool':
+                with phase('table_spool', **labels):
+                    rc, spool_file, spool_err = noh.table_spool(
+                        module, environment, table_name, table_columns, predicates, session, order_by,
+                        after_key, limit
+                    )
+                
+                if spool_err:
+                    return (1, None, spool_err)
+                
+                if stream:
+                    return (0, chain.from_iterable(noh.spool_rows(spool_file)), '')
+                
+                try:
+                    with phase('parse', **labels):
+                        rows = list(chain.from_iterable(noh.spool_rows(spool_file)))
+                except noh.SpoolError as fault:
+                    return (1, None, str(fault))
+                
+                return (0, rows, '')
+            
+            with phase('table_as_csv', **labels):
+                rc, csv_data, csv_err = noh.table_as_csv(
+                    module, environment, table_name, table_columns, predicates, session, order_by,
+                    after_key, limit
+                )
+            
+            if csv_err:
+                return (1, csv_data, csv_err)
+            
+            skipped = []
+            
+            with phase('parse', **labels):
+                rows = list(noh.decode_rows(csv_data or '', len(table_columns), skipped))
+            
+            noh.warn_skipped(module, skipped)
+            
+            return (0, rows, '')
+        
+        # one query for the whole table, never held as a list
+        if stream:
+            return fetch(module.params["after_key"], None)
+        
+        return noh.keyset_pages(
+            fetch,
+            key_index,
+            module.params["after_key"],
+            module.params["max_rows"],
+            module.params["page_size"],
+        )
+
+def fetch_delta(module, database_name, environment):
+    """ Rows added, changed and removed since the snapshot, returns (rc, resultset, errors) """
+    
+    table_name = module.params["table"]
+    
+    with noh.SQLPlusSession(module, environment) as session:
+        rc, delta, errors = noh.table_delta(
+            module,
+            environment,
+            table_name,
+            module.params["columns"],
+            module.params["order_by"],
+            noh.snapshot_path(module.params["since_snapshot"], database_name, table_name),
+            module.params["where"],
+            session,
+        )
+    
+    if errors:
+        return (1, delta, errors)
+    
+    added, changed, removed = delta
+    
+    return (0, {'added': added, 'changed': changed, 'removed': removed}, '')
+
+def fetch_parallel(module, environment, parallel, order_by=None):
+    """ Split the query into disjoint slices run at the same time """
+    
+    query_condition = module.params["where"]
+    parallel_key = module.params["parallel_key"]
+    
+    def slice_predicates(number):
+        predicate = 'ORA_HASH({0}, {1}) = {2}'.format(parallel_key, parallel - 1, number)
+        
+        if query_condition is None:
+            return predicate
+        
+        return '({0}) AND {1}'.format(query_condition, predicate)
+    
+    slices = noh.fan_out(
+        lambda number: fetch_rows(module, environment, slice_predicates(number), order_by),
+        range(parallel),
+        parallel,
+    )
+    
+    errors = [slices[number][2] for number in range(parallel) if slices[number][2]]
+    if errors:
+        return (1, None, '\n'.join(errors))
+    
+    slice_rows = [slices[number][1] for number in range(parallel)]
+    
+    if order_by is None:
+        return (0, list(chain.from_iterable(slice_rows)), '')
+    
+    # compared the way the slices were ordered, as numbers only for a NUMBER
+    with noh.SQLPlusSession(module, environment) as session:
+        rc, key_type, errors = noh.key_type(
+            module, environment, module.params["table"], module.params["columns"], order_by, session
+        )
+    
+    if errors:
+        return (1, None, errors)
+    
+    aliases = [line.split()[-1].upper() for line in module.params["columns"]]
+    
+    with noh.profiler(module).phase('merge', database=environment.get('ORACLE_SID')):
+        rows = list(noh.merge_sorted(
+            slice_rows, aliases.index(order_by.upper()), key_type in noh.NUMBER_TYPES
+        ))
+    
+    return (0, rows, '')
+
+def table_list(module, database_name, environment, process_list):
+    """ Query one database, returns (rc, (resultset, truncated, next_token), errors) """
+    
+    query_condition = module.params["where"]
     flatten = module.params["flatten"]
+    parallel = module.params["parallel"]
+    order_by = module.params["order_by"]
+    max_rows = module.params["max_rows"]
+    result_format = module.params["format"]
+    
+    database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+    
+    if not database_running:
+        return (1, process_list, 'Cannot find ora_pmon_{0}'.format(database_name))
+    
+    # the delta is the whole result, nothing to page through
+    if module.params["since_snapshot"] is not None:
+        rc, resultset, errors = fetch_delta(module, database_name, environment)
+        
+        if errors:
+            return (1, resultset, errors)
+        
+        return (0, (resultset, False, None), '')
+    
+    if parallel > 1:
+        rc, rows, errors = fetch_parallel(module, environment, parallel, order_by)
+    else:
+        # a spool written straight to the file as it is read
+        stream = module.params["extract"] == 'spool' and result_format == 'file' and (
+            max_rows is None and module.params["page_size"] is None
+        )
+        
+        rc, rows, errors = fetch_rows(module, environment, query_condition, order_by, stream)
+    
+    if errors:
+        return (1, rows, errors)
+    
+    aliases = [line.split()[-1].upper() for line in module.params["columns"]]
+    
+    # the extra row fetched says whether there are more
+    key_index = aliases.index(order_by.upper()) if order_by is not None else None
+    
+    rows, truncated, next_token = noh.keyset_truncate(rows, max_rows, key_index)
+    
+    if result_format == 'columnar':
+        resultset = noh.columnar(aliases, rows)
+    elif result_format == 'file':
+        path = os.path.join(
+            module.params["dest"] or noh.STATE_DIR,
+            '{0}_{1}.{2}.gz'.format(database_name, module.params["table"].lower(), module.params["file_format"]),
+        )
+        
+        rc, resultset, errors = noh.write_rows(path, aliases, rows, module.params["file_format"])
+        if errors:
+            return (1, None, errors)
+    elif flatten:
+        resultset = list(chain.from_iterable(rows))
+    else:
+        resultset = rows
+        
+    return (0, (resultset, truncated, next_token), '')
+
+def result_changed(module, resultsets):
+    """ A file written by format=file, or rows differing from the snapshot """
+    
+    if module.params["since_snapshot"] is not None:
+        return any(
+            resultset['added'] or resultset['changed'] or resultset['removed'] for resultset in resultsets
+        )
+    
+    if module.params["format"] != 'file':
+        return False
+    
+    return any(resultset['changed'] for resultset in resultsets)
+
+def main(module):
+    """ Return query as a list """
+    
+    profiler = noh.profiler(module)
+    database_names = noh.database_names(module.params["database_name"])
+    max_workers = module.params["max_workers"]
+    order_by = module.params["order_by"]
     
     module_fail = {
         'msg': 'An error has occured',
@@ -103,50 +525,110 @@ def main(module):
         'resultset': [],
     }
     
+    # merged rows are put back in order using the column as it is returned
+    aliases = [line.split()[-1].upper() for line in module.params["columns"]]
+    
+    if order_by is not None and order_by.upper() not in aliases:
+        module_fail['stderr'] = 'order_by must be one of the columns (or its alias)'
+        module.fail_json(**module_fail)
+    
+    paging = [
+        option for option in ('max_rows', 'page_size', 'after_key') if module.params[option] is not None
+    ]
+    
+    if paging and module.params["parallel"] > 1:
+        module_fail['stderr'] = '{0} cannot be used with parallel'.format(', '.join(paging))
+        module.fail_json(**module_fail)
+    
+    if order_by is None and (module.params["page_size"] or module.params["after_key"]):
+        module_fail['stderr'] = 'page_size and after_key need order_by to page by'
+        module.fail_json(**module_fail)
+    
+    if module.params["since_snapshot"] is not None:
+        if order_by is None:
+            module_fail['stderr'] = 'since_snapshot needs order_by to tell rows apart'
+            module.fail_json(**module_fail)
+        
+        unsupported = paging + [
+            option for option, default in (('parallel', 1), ('extract', 'dbms_output'), ('format', 'list'))
+                if module.params[option] != default
+        ]
+        
+        if unsupported:
+            module_fail['stderr'] = '{0} cannot be used with since_snapshot'.format(', '.join(unsupported))
+            module.fail_json(**module_fail)
+    
+    # one process scan for however many databases
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    
+    if len(database_names) != 1 or module.params["database_name"][0].lower() == 'all':
+        results, errors = noh.fan_out_databases(
+            module,
+            database_names,
+            lambda name, environment: table_list(module, name, environment, process_list),
+            max_workers,
+        )
+        
+        resultset = dict((name, result[0]) for name, result in results.items())
+        
+        module_exit = {
+            'changed': result_changed(module, resultset.values()),
+            'resultset': resultset,
+            'truncated': dict((name, result[1]) for name, result in results.items()),
+            'next_token': dict((name, result[2]) for name, result in results.items()),
+            'errors': errors,
+        }
+        module_exit.update(profiler.report(module))
+        
+        # only fail when there is nothing to show for it
+        if errors and not resultset:
+            module.fail_json(msg='An error has occured', **module_exit)
+            
+        module.exit_json(**module_exit)
+    
+    database_name = database_names[0]
+    
     try:
-        _, environment, _ = noh.oraenv(module, database_name)
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
     except noh.DatabaseNotFound as fault:
         module_fail['stderr'] = str(fault)
         
         module.fail_json(**module_fail)
         
-    _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
-    database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+    rc, result, errors = table_list(module, database_name, environment, process_list)
     
-    if not database_running:
+    if errors:
         module_fail.update({
-            'stderr': 'Cannot find ora_pmon_{0}'.format(database_name),
-            'resultset': process_list,
+            'stderr': errors,
+            'resultset': result,
         })
-             
-        module.fail_json(**module_fail)
+        module_fail.update(profiler.report(module))
         
-    rc, csv_data, csv_err = noh.table_as_csv(module, environment, table_name, table_columns, query_condition)
-    
-    if csv_err:
-        module_fail['stderr'] = csv_data
         module.fail_json(**module_fail)
     
-    if csv_data is None:
-        module.exit_json(changed=False, msg='no rows selected', resultset=[])
+    resultset, truncated, next_token = result
     
-    if flatten:
-        resultset = list(chain.from_iterable([
-            column for column in [row.split(',') for row in csv_data.split('\n') if row]
-        ]))
-    else:
-        resultset = [
-            column for column in [row.split(',') for row in csv_data.split('\n') if row]
-        ]
+    module_exit = {
+        'changed': result_changed(module, [resultset]),
+        'resultset': resultset,
+        'truncated': truncated,
+        'next_token': next_token,
+    }
+    module_exit.update(profiler.report(module))
+    
+    if not resultset:
+        module_exit['msg'] = 'no rows selected'
         
-    module.exit_json(changed=False, resultset=resultset)
+    module.exit_json(**module_exit)
 
 if __name__ == "__main__":
     
     argument_spec = {
         "database_name": {
             "required": True,
-            "type": "str",
+            "type": "list",
             "aliases": ["name", "sid"],
         },
         "table": {
@@ -165,7 +647,60 @@ if __name__ == "__main__":
         'flatten': {
             'type': 'bool',
             'default': False,
-        }
+        },
+        'max_workers': {
+            'type': 'int',
+            'default': 4,
+        },
+        'extract': {
+            'type': 'str',
+            'default': 'dbms_output',
+            'choices': ['dbms_output', 'spool'],
+        },
+        'parallel': {
+            'type': 'int',
+            'default': 1,
+        },
+        'parallel_key': {
+            'type': 'str',
+            'default': 'ROWID',
+        },
+        'order_by': {
+            'type': 'str',
+        },
+        'format': {
+            'type': 'str',
+            'default': 'list',
+            'choices': ['list', 'columnar', 'file'],
+        },
+        'file_format': {
+            'type': 'str',
+            'default': 'jsonl',
+            'choices': ['jsonl', 'csv'],
+        },
+        'dest': {
+            'type': 'str',
+        },
+        'max_rows': {
+            'type': 'int',
+        },
+        'page_size': {
+            'type': 'int',
+        },
+        'after_key': {
+            'type': 'str',
+            'aliases': ['next_token'],
+        },
+        'since_snapshot': {
+            'type': 'str',
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
     }
     
     module = AnsibleModule(
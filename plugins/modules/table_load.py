@@ -0,0 +1,724 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: table_load
+author:
+  - antony.with.no.h
+short_description: Load rows into a table
+description:
+  - Appends a list of rows, or a CSV file on the target, to a table
+  - Loads with SQL*Loader from a generated control file when C(sqlldr) is in
+    the Oracle home, otherwise with PL/SQL blocks inserting a batch of rows
+    at a time with C(FORALL)
+  - Rejected rows are returned with their error rather than failing the
+    load, up to C(max_errors)
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name (SID)
+    required: true
+    type: str
+    aliases: ['name', 'sid']
+  table:
+    description:
+      - Table to load, with its owner if not in the SYS schema
+    required: true
+    type: str
+    aliases: ['table_name']
+  columns:
+    description:
+      - Columns the values of each row are for, in order
+      - By default every column of the table in the order of C(DESC), or the
+        first line of C(src) with C(header)
+    type: list
+  rows:
+    description:
+      - Rows to load, each a list of values in the order of C(columns) or a
+        dictionary keyed by column name
+      - Dates and timestamps are ISO 8601 as C(table_list) returns them
+    type: list
+  src:
+    description:
+      - CSV file on the target to load rather than C(rows)
+    type: path
+  header:
+    description:
+      - The first line of C(src) is the column names
+    type: bool
+    default: no
+  delimiter:
+    description:
+      - Field delimiter of C(src)
+    type: str
+    default: ','
+  method:
+    description:
+      - C(sqlldr) or C(insert), C(auto) uses SQL*Loader if it is in the
+        Oracle home
+    type: str
+    default: auto
+    choices: ['auto', 'sqlldr', 'insert']
+  direct:
+    description:
+      - Direct path load with SQL*Loader, above the high water mark and
+        without the buffer cache
+      - The table is locked for the load and insert triggers do not fire,
+        only use it when that is allowed
+    type: bool
+    default: no
+  batch_size:
+    description:
+      - Rows in each C(FORALL), or in each SQL*Loader bind array
+      - A C(FORALL) has fewer rows when they are wide or their values long,
+        a block with too many values does not compile
+    type: int
+    default: 1000
+  commit_interval:
+    description:
+      - Rows between commits, C(0) for one commit at the end
+      - SQL*Loader in conventional path commits each bind array, the interval
+        is its size
+    type: int
+    default: 0
+  max_errors:
+    description:
+      - Rejected rows allowed before the load stops and fails
+      - Rows committed before then (C(commit_interval)) stay loaded
+    type: int
+    default: 0
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - Rows are always appended, nothing already in the table is changed
+  - C(src) is read by SQL*Loader as it is, one row to a line with values
+    optionally quoted with C(")
+"""
+
+EXAMPLES = r"""
+- name: Seed a reference table
+  antony_with_no_h.oracle.table_load:
+    database_name: ORCL
+    table: app.countries
+    columns:
+      - code
+      - name
+    rows:
+      - [GB, United Kingdom]
+      - [IE, Ireland]
+
+- name: Load a CSV file copied to the target
+  antony_with_no_h.oracle.table_load:
+    database_name: ORCL
+    table: app.events
+    src: /tmp/events.csv
+    header: yes
+    direct: yes
+    max_errors: 100
+  register: load
+
+- ansible.builtin.debug:
+    msg: "{{ load.loaded }} loaded, {{ load.rejected }} rejected"
+"""
+
+RETURN = r"""
+loaded:
+  description: Rows loaded
+  returned: always
+  type: int
+  sample: 250000
+rejected:
+  description: Rows rejected for data errors
+  returned: always
+  type: int
+  sample: 1
+discarded:
+  description:
+    - Rows SQL*Loader did not load because every field was null, e.g. a
+      blank line of C(src), not counted as C(rejected)
+  returned: always
+  type: int
+  sample: 0
+rejects:
+  description:
+    - The first 100 rejected rows as their C(record) number and C(error)
+    - Records are numbered from 1 in C(rows), or by line of C(src)
+  returned: always
+  type: list
+  sample: [{"record": 5, "error": "ORA-01722: invalid number"}]
+method:
+  description: C(sqlldr) or C(insert)
+  returned: always
+  type: str
+"""
+
+import binascii
+import csv
+import os
+import re
+import tempfile
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+# rejects kept for the result, however many there are
+MAX_REJECTS = 100
+
+# a line of SQL*Plus input is at most 2499 characters, a literal is split
+# well short of that even when every character is escaped
+LITERAL_CHUNK = 200
+
+# literals in one FORALL block, a block much larger fails to compile with
+# PLS-00123 program too large, so wide rows or long values mean fewer rows
+BLOCK_LITERALS = 10000
+
+re_rejected = re.compile(r'^Record (\d+): Rejected - .*\n(.*)$', re.MULTILINE)
+re_loaded = re.compile(r'^\s*(\d+) Rows? successfully loaded', re.MULTILINE)
+re_not_loaded = re.compile(r'^\s*(\d+) Rows? not loaded due to data errors', re.MULTILINE)
+re_discarded = re.compile(r'^\s*(\d+) Rows? not loaded because all (?:WHEN clauses were failed|fields were null)', re.MULTILINE)
+re_loader_error = re.compile(r'^SQL\*Loader-\d+:.*', re.MULTILINE)
+
+def field_text(value):
+    """ A value as the text loaded, None for NULL """
+    
+    if value is None or value == '':
+        return None
+    
+    if isinstance(value, bool):
+        return str(int(value))
+    
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return value.decode('utf-8')
+    
+    if not hasattr(value, 'replace'):
+        return str(value)
+    
+    return value
+
+def sql_literal(value):
+    """ A value as a SQL text literal, split over lines if it is long """
+    
+    value = field_text(value)
+    
+    if value is None:
+        return 'NULL'
+    
+    chunks = [value[start:start + LITERAL_CHUNK] for start in range(0, len(value), LITERAL_CHUNK)]
+    
+    # a newline could end the statement early or be taken as a blank line
+    return "||\n".join([
+        "'" + chunk.replace("'", "''").replace('\r', "'||CHR(13)||'").replace('\n', "'||CHR(10)||'") + "'"
+            for chunk in chunks
+    ])
+
+def source_rows(module, columns):
+    """ The rows to load as lists in the order of columns """
+    
+    if module.params['src']:
+        with open(module.params['src'], 'r') as fd:
+            reader = csv.reader(fd, delimiter=str(module.params['delimiter']))
+            
+            if module.params['header']:
+                next(reader, None)
+            
+            for row in reader:
+                if row:
+                    yield row
+        return
+    
+    for row in module.params['rows']:
+        if isinstance(row, dict):
+            row = dict((str(key).upper(), value) for key, value in row.items())
+            yield [row.get(column) for column in columns]
+        else:
+            yield list(row)
+
+def literal_count(row, width):
+    """ Literals sql_literal() writes for a row of width columns """
+    
+    texts = [field_text(value) or '' for value in row[:width]]
+    
+    return sum([max(1, -(-len(text) // LITERAL_CHUNK)) for text in texts]) + max(0, width - len(texts))
+
+def batches(rows, size, width=None):
+    """ Lists of up to size rows, and with width up to BLOCK_LITERALS
+    literals of that many columns unless a row is more on its own
+    """
+    
+    batch = []
+    literals = 0
+    
+    for row in rows:
+        count = literal_count(row, width) if width else 0
+        
+        if batch and width and literals + count > BLOCK_LITERALS:
+            yield batch
+            batch = []
+            literals = 0
+        
+        batch.append(row)
+        literals += count
+        
+        if len(batch) >= size:
+            yield batch
+            batch = []
+            literals = 0
+    
+    if batch:
+        yield batch
+
+def forall_block(table, columns, lobs, rows):
+    """ A PL/SQL block inserting rows with FORALL, rejects are written as
+    index, error code and message
+    """
+    
+    declarations = []
+    assignments = []
+    
+    for index, column in enumerate(columns):
+        declarations.append('l_{0} {1};'.format(index, 't_lob' if column in lobs else 't_text'))
+        
+        # one constructor a column, values are text until the insert so a
+        # value of the wrong type rejects its row rather than the block
+        assignments.append('l_{0} := {1}(\n{2}\n);'.format(
+            index,
+            't_lob' if column in lobs else 't_text',
+            ',\n'.join([sql_literal(row[index] if index < len(row) else None) for row in rows]),
+        ))
+    
+    return '''
+DECLARE
+TYPE t_text IS TABLE OF VARCHAR2(32767);
+TYPE t_lob IS TABLE OF CLOB;
+{0}
+bulk_errors EXCEPTION;
+PRAGMA EXCEPTION_INIT(bulk_errors, -24381);
+BEGIN
+{1}
+FORALL i IN 1 .. {2} SAVE EXCEPTIONS
+INSERT INTO {3} ({4}) VALUES ({5});
+EXCEPTION
+WHEN bulk_errors THEN
+FOR j IN 1 .. SQL%BULK_EXCEPTIONS.COUNT LOOP
+DBMS_OUTPUT.PUT_LINE(
+SQL%BULK_EXCEPTIONS(j).ERROR_INDEX||' '||SQL%BULK_EXCEPTIONS(j).ERROR_CODE||' '||
+SUBSTR(SQLERRM(-SQL%BULK_EXCEPTIONS(j).ERROR_CODE), 12)
+);
+END LOOP;
+END;
+/'''.format(
+        '\n'.join(declarations),
+        '\n'.join(assignments),
+        len(rows),
+        table,
+        ','.join(columns),
+        ','.join(['l_{0}(i)'.format(index) for index in range(len(columns))]),
+    )
+
+def enumerate_batches(rows, size, width=None):
+    """ Batches with the record number before the first row of each """
+    
+    first = 0
+    
+    for batch in batches(rows, size, width):
+        yield (first, batch)
+        first += len(batch)
+
+def insert_load(module, environment, session, table, columns, lobs):
+    """ Load with FORALL blocks in the session, returns (rc, result, errors) """
+    
+    phase = noh.profiler(module).phase
+    batch_size = module.params['batch_size']
+    commit_interval = module.params['commit_interval']
+    max_errors = module.params['max_errors']
+    
+    loaded = 0
+    rejected = 0
+    rejects = []
+    uncommitted = 0
+    
+    # records are numbered as SQL*Loader would, by line of src
+    skip = 1 if module.params['src'] and module.params['header'] else 0
+    
+    # error codes and messages are written apart so the output is not
+    # taken for an error of the block
+    session.execute('SET SERVEROUTPUT ON SIZE UNLIMITED FORMAT WRAPPED\nSET DEFINE OFF')
+    
+    for first, batch in enumerate_batches(source_rows(module, columns), batch_size, len(columns)):
+        with phase('insert', database=environment.get('ORACLE_SID'), table=table, rows=len(batch)):
+            _, stdout, errors = session.execute(forall_block(table, columns, lobs, batch))
+        
+        if errors:
+            session.execute('ROLLBACK;')
+            return (1, {'loaded': loaded - uncommitted, 'rejected': rejected, 'rejects': rejects}, errors)
+        
+        failed = 0
+        for line in stdout.splitlines():
+            words = line.split(' ', 2)
+            
+            if len(words) < 2 or not words[0].isdigit() or not words[1].isdigit():
+                continue
+            
+            failed += 1
+            if len(rejects) < MAX_REJECTS:
+                rejects.append({
+                    'record': skip + first + int(words[0]),
+                    'error': 'ORA-{0:05d}: {1}'.format(int(words[1]), words[2] if len(words) > 2 else ''),
+                })
+        
+        loaded += len(batch) - failed
+        uncommitted += len(batch) - failed
+        rejected += failed
+        
+        if rejected > max_errors:
+            session.execute('ROLLBACK;')
+            return (1, {'loaded': loaded - uncommitted, 'rejected': rejected, 'rejects': rejects},
+                'More than {0} rows rejected'.format(max_errors))
+        
+        if commit_interval and uncommitted >= commit_interval:
+            session.execute('COMMIT;')
+            uncommitted = 0
+    
+    _, _, errors = session.execute('COMMIT;')
+    
+    if errors:
+        return (1, {'loaded': loaded - uncommitted, 'rejected': rejected, 'rejects': rejects}, errors)
+    
+    return (0, {'loaded': loaded, 'rejected': rejected, 'rejects': rejects}, '')
+
+def loader_delimiter(delimiter):
+    """ The delimiter as a control file string, in hex unless it is printable """
+    
+    if len(delimiter) == 1 and 32 < ord(delimiter) < 127:
+        return "'{0}'".format(delimiter.replace("'", "''"))
+    
+    return "X'{0}'".format(binascii.hexlify(delimiter.encode('utf-8')).decode().upper())
+
+def loader_field(column):
+    """ A field of the control file, ISO 8601 dates and timestamps """
+    
+    name = column['name']
+    
+    if column['type'] == 'DATE':
+        return '{0} CHAR(64) "TO_DATE(REPLACE(:{0}, \'T\', \' \'), \'YYYY-MM-DD HH24:MI:SS\')"'.format(name)
+    
+    if column['type'].startswith('TIMESTAMP') and 'TIME ZONE' in column['type']:
+        return '{0} CHAR(64) "TO_TIMESTAMP_TZ(REPLACE(:{0}, \'T\', \' \'), \'YYYY-MM-DD HH24:MI:SS.FFTZH:TZM\')"'.format(name)
+    
+    if column['type'].startswith('TIMESTAMP'):
+        return '{0} CHAR(64) "TO_TIMESTAMP(REPLACE(:{0}, \'T\', \' \'), \'YYYY-MM-DD HH24:MI:SS.FF\')"'.format(name)
+    
+    if column['type'] in ('CLOB', 'NCLOB', 'LONG'):
+        return '{0} CHAR(1048576)'.format(name)
+    
+    # CHAR fields default to 255 bytes
+    return '{0} CHAR({1})'.format(name, max(column['precision'] or 255, 255))
+
+def write_data_file(module, columns):
+    """ rows as a data file for SQL*Loader, records end in a control character
+    so values can hold newlines
+    """
+    
+    fd, data_file = tempfile.mkstemp(suffix='.dat', dir=getattr(module, 'tmpdir', None))
+    
+    with os.fdopen(fd, 'w') as data:
+        for row in source_rows(module, columns):
+            data.write(','.join([
+                '' if value is None else '"' + value.replace('"', '""') + '"'
+                    for value in [field_text(value) for value in row]
+            ]))
+            data.write('\x1e\n')
+    
+    return data_file
+
+def sqlldr_load(module, environment, table, schema):
+    """ Load with SQL*Loader, returns (rc, result, errors) """
+    
+    phase = noh.profiler(module).phase
+    tmpdir = getattr(module, 'tmpdir', None)
+    params = module.params
+    
+    temp_files = []
+    
+    def temp_file(suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=tmpdir)
+        os.close(fd)
+        temp_files.append(path)
+        return path
+    
+    try:
+        if params['src']:
+            infile = "INFILE '{0}'".format(params['src'])
+            delimiter = params['delimiter']
+            skip = 1 if params['header'] else 0
+        else:
+            data_file = write_data_file(module, [column['name'] for column in schema])
+            temp_files.append(data_file)
+            infile = "INFILE '{0}' \"str X'1E0A'\"".format(data_file)
+            delimiter = ','
+            skip = 0
+        
+        # rows in a bind array (conventional) or between data saves (direct)
+        rows = params['commit_interval'] or (None if params['direct'] else params['batch_size'])
+        
+        options = ['DIRECT={0}'.format('TRUE' if params['direct'] else 'FALSE'), 'ERRORS={0}'.format(params['max_errors']),
+            'SKIP={0}'.format(skip)]
+        
+        if rows:
+            options.append('ROWS={0}'.format(rows))
+        
+        if not params['direct']:
+            options.extend(['BINDSIZE=20971520', 'READSIZE=20971520'])
+        
+        control_file = temp_file('.ctl')
+        log_file = temp_file('.log')
+        bad_file = temp_file('.bad')
+        par_file = temp_file('.par')
+        
+        with open(control_file, 'w') as fd:
+            fd.write('''OPTIONS ({0})
+LOAD DATA
+CHARACTERSET AL32UTF8
+{1}
+BADFILE '{2}'
+APPEND
+INTO TABLE {3}
+FIELDS TERMINATED BY {4} OPTIONALLY ENCLOSED BY '"'
+TRAILING NULLCOLS
+(
+{5}
+)
+'''.format(
+                ', '.join(options),
+                infile,
+                bad_file,
+                table,
+                loader_delimiter(delimiter),
+                ',\n'.join([loader_field(column) for column in schema]),
+            ))
+        
+        # the password is never on the command line, there is none with SYSDBA
+        with open(par_file, 'w') as fd:
+            fd.write("userid='/ as sysdba'\ncontrol={0}\nlog={1}\nsilent=(header,feedback)\n".format(
+                control_file, log_file
+            ))
+        
+        with phase('sqlldr', database=environment.get('ORACLE_SID'), table=table):
+            rc, stdout, stderr = module.run_command(
+                args=['sqlldr', 'parfile={0}'.format(par_file)],
+                environ_update=environment,
+            )
+        noh.profiler(module).count(stdout, 1)
+        
+        try:
+            with open(log_file, 'r') as fd:
+                log = fd.read()
+        except (IOError, OSError):
+            log = ''
+        
+        loaded = sum([int(count) for count in re_loaded.findall(log)])
+        rejected = sum([int(count) for count in re_not_loaded.findall(log)])
+        discarded = sum([int(count) for count in re_discarded.findall(log)])
+        rejects = [
+            {'record': int(record), 'error': error.strip()} for record, error in re_rejected.findall(log)[:MAX_REJECTS]
+        ]
+        
+        errors = '\n'.join(re_loader_error.findall(log) or re_loader_error.findall(stdout or ''))
+        
+        # 2 is rows rejected or discarded, 1 and 3 that the load failed
+        if rc in (1, 3) or (rc != 0 and not log):
+            errors = errors or stderr or stdout or 'sqlldr exited with {0}'.format(rc)
+        elif rejected > params['max_errors']:
+            errors = errors or 'More than {0} rows rejected'.format(params['max_errors'])
+        else:
+            errors = ''
+        
+        return (1 if errors else 0, {
+            'loaded': loaded, 'rejected': rejected, 'discarded': discarded, 'rejects': rejects
+        }, errors)
+    finally:
+        for path in temp_files:
+            if os.path.exists(path):
+                os.remove(path)
+
+def table_load(module, environment, session):
+    """ Load the rows into the table, returns (rc, result, errors) """
+    
+    table = module.params['table']
+    
+    _, table_desc, table_desc_err = session.execute('DESC {0}'.format(table))
+    if table_desc_err:
+        return (1, {}, table_desc_err)
+    
+    schema = noh.describe(table_desc)
+    by_name = dict((column['name'], column) for column in schema)
+    
+    columns = [column.upper() for column in module.params['columns'] or []]
+    
+    if not columns and module.params['src'] and module.params['header']:
+        with open(module.params['src'], 'r') as fd:
+            columns = [column.strip().upper() for column in next(csv.reader(fd, delimiter=str(module.params['delimiter'])), [])]
+    
+    columns = columns or [column['name'] for column in schema]
+    
+    missing = [column for column in columns if column not in by_name]
+    if missing:
+        return (1, {}, 'No column {0} in {1}'.format(', '.join(missing), table))
+    
+    method = module.params['method']
+    
+    if method == 'auto':
+        sqlldr = os.path.join(environment.get('ORACLE_HOME', ''), 'bin', 'sqlldr')
+        method = 'sqlldr' if os.access(sqlldr, os.X_OK) else 'insert'
+    
+    if method == 'sqlldr':
+        rc, result, errors = sqlldr_load(module, environment, table, [by_name[column] for column in columns])
+    else:
+        session.execute(noh.NLS_ISO)
+        lobs = set([column for column in columns if by_name[column]['type'] in ('CLOB', 'NCLOB')])
+        rc, result, errors = insert_load(module, environment, session, table, columns, lobs)
+    
+    result['method'] = method
+    
+    return (rc, result, errors)
+
+def main(module):
+    """ Rows or a CSV file into a table """
+    
+    profiler = noh.profiler(module)
+    database_name = noh.database_name(module.params['database_name'])
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+        'loaded': 0,
+        'rejected': 0,
+        'discarded': 0,
+        'rejects': [],
+    }
+    
+    if (module.params['rows'] is None) == (module.params['src'] is None):
+        module_fail['stderr'] = 'One of rows or src is needed'
+        module.fail_json(**module_fail)
+    
+    if module.params['src'] and not os.path.isfile(module.params['src']):
+        module_fail['stderr'] = 'Cannot find {0}'.format(module.params['src'])
+        module.fail_json(**module_fail)
+    
+    if module.params['batch_size'] < 1:
+        module_fail['stderr'] = 'batch_size must be at least 1'
+        module.fail_json(**module_fail)
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    with profiler.phase('pgrep'):
+        _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+    database_running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+    
+    if not database_running:
+        module_fail['stderr'] = 'Cannot find ora_pmon_{0}'.format(database_name)
+        
+        module.fail_json(**module_fail)
+    
+    with noh.SQLPlusSession(module, environment) as session:
+        rc, result, errors = table_load(module, environment, session)
+    
+    module_exit = {
+        'changed': result.get('loaded', 0) > 0,
+        'loaded': 0,
+        'rejected': 0,
+        'discarded': 0,
+        'rejects': [],
+    }
+    module_exit.update(result)
+    module_exit.update(profiler.report(module))
+    
+    if errors:
+        module_exit.update({
+            'msg': 'An error has occured',
+            'rc': rc,
+            'stderr': errors,
+        })
+        module.fail_json(**module_exit)
+    
+    module_exit['msg'] = '{0} rows loaded'.format(module_exit['loaded'])
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "str",
+            "aliases": ["name", "sid"],
+        },
+        "table": {
+            "required": True,
+            "type": "str",
+            "aliases": ["table_name"],
+        },
+        "columns": {
+            "type": "list",
+        },
+        "rows": {
+            "type": "list",
+        },
+        "src": {
+            "type": "path",
+        },
+        "header": {
+            "type": "bool",
+            "default": False,
+        },
+        "delimiter": {
+            "type": "str",
+            "default": ",",
+        },
+        "method": {
+            "type": "str",
+            "default": "auto",
+            "choices": ["auto", "sqlldr", "insert"],
+        },
+        "direct": {
+            "type": "bool",
+            "default": False,
+        },
+        "batch_size": {
+            "type": "int",
+            "default": 1000,
+        },
+        "commit_interval": {
+            "type": "int",
+            "default": 0,
+        },
+        "max_errors": {
+            "type": "int",
+            "default": 0,
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+    )
+    
+    main(module)
\ No newline at end of file
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+module: wait_for_database
+author:
+  - antony.with.no.h
+short_description: Wait for a database to reach a state
+description:
+  - Polls a database until it is open, mounted, started or stopped, its
+    pluggable databases are open or its standby has caught up, or until the
+    timeout
+  - The instance is checked for with C(pgrep) and then queried in one
+    SQL*Plus session kept open between polls, which are spaced out with
+    exponential backoff and jitter
+  - Returns how long it took and each state seen on the way
+version_added: 0.2.0
+options:
+  database_name:
+    description:
+      - Oracle database name (SID)
+    required: true
+    type: str
+    aliases: ['name', 'sid']
+  state:
+    description:
+      - C(open), C(mounted) (or open) and C(started) (or mounted or open)
+        are the C(status) of C(v$instance)
+      - C(pdbs_open) is every pluggable database in C(v$pdbs) open, or
+        those in C(pdbs)
+      - C(apply_lag) is an apply lag in C(v$dataguard_stats) of at most
+        C(max_lag)
+      - C(stopped) is no C(ora_pmon_) process
+    type: str
+    default: open
+    choices: ['open', 'mounted', 'started', 'pdbs_open', 'apply_lag', 'stopped']
+  pdbs:
+    description:
+      - Pluggable databases to wait for with C(pdbs_open), by default all
+        but C(PDB$SEED)
+    type: list
+  max_lag:
+    description:
+      - Seconds of apply lag counted as caught up with C(apply_lag)
+    type: int
+    default: 30
+  timeout:
+    description:
+      - Seconds to wait before failing
+    type: int
+    default: 300
+  delay:
+    description:
+      - Seconds before the second poll, doubling each poll after up to
+        C(max_delay)
+      - Back to C(delay) whenever the state changes
+    type: float
+    default: 1
+  max_delay:
+    description:
+      - Most seconds between polls
+    type: float
+    default: 30
+extends_documentation_fragment:
+  - antony_with_no_h.oracle.profile
+notes:
+  - Each wait is a random time between half and all of the delay so that
+    many hosts waiting on the same event do not poll in step
+  - The session is opened again if the instance goes away under it, e.g.
+    through a restart
+  - The session is killed at the C(timeout), a poll the instance does not
+    answer in time is seen as C(POLL TIMED OUT)
+"""
+
+EXAMPLES = r"""
+- name: Restart
+  antony_with_no_h.oracle.sqlplus:
+    database_name: ORCL
+    sql: |
+      CONN / AS SYSDBA
+      SHUTDOWN IMMEDIATE
+      STARTUP
+
+- name: Wait for the PDBs to open
+  antony_with_no_h.oracle.wait_for_database:
+    database_name: ORCL
+    state: pdbs_open
+    timeout: 600
+  register: waited
+
+- name: Standby caught up after a switchover
+  antony_with_no_h.oracle.wait_for_database:
+    database_name: ORCLSTBY
+    state: apply_lag
+    max_lag: 10
+    max_delay: 10
+"""
+
+RETURN = r"""
+state:
+  description: The state last seen, e.g. C(OPEN) or C(apply lag 3)
+  returned: always
+  type: str
+  sample: OPEN
+elapsed:
+  description: Seconds waited
+  returned: always
+  type: float
+  sample: 42.7
+polls:
+  description: Times the database was polled
+  returned: always
+  type: int
+  sample: 7
+transitions:
+  description: Each state seen, with the C(elapsed) seconds when it was first seen
+  returned: always
+  type: list
+  sample: [
+    {"state": "DOWN", "elapsed": 0.0},
+    {"state": "MOUNTED", "elapsed": 12.1},
+    {"state": "OPEN", "elapsed": 31.6}
+  ]
+"""
+
+import random
+import re
+import time
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+from ansible.module_utils.basic import AnsibleModule
+
+# the instance went away under the session, or is not there to connect to
+SESSION_LOST = ('ORA-01034', 'ORA-01089', 'ORA-01090', 'ORA-03113', 'ORA-03114', 'ORA-03135', 'ORA-12514', 'ORA-12537')
+
+# v$instance.status of each state
+INSTANCE_STATES = {
+    'open': ('OPEN',),
+    'mounted': ('MOUNTED', 'OPEN'),
+    'started': ('STARTED', 'MOUNTED', 'OPEN'),
+}
+
+# the state of a poll killed at the deadline
+TIMED_OUT = 'POLL TIMED OUT'
+
+re_lag = re.compile(r'\+?(\d+) (\d+):(\d+):(\d+)')
+
+def state_queries(module):
+    """ Queries for the state, each row prefixed with what it is """
+    
+    sql = ["SELECT 'INSTANCE '||status FROM v$instance;"]
+    
+    if module.params['state'] == 'pdbs_open':
+        sql.append("SELECT 'PDB '||name||' '||open_mode FROM v$pdbs WHERE name != 'PDB$SEED';")
+    elif module.params['state'] == 'apply_lag':
+        sql.append("SELECT 'LAG '||NVL(value, '-') FROM v$dataguard_stats WHERE name = 'apply lag';")
+    
+    return '\n'.join(sql)
+
+def lag_seconds(value):
+    """ +DD HH:MI:SS as seconds, None when not known """
+    
+    match = re_lag.match(value)
+    
+    if not match:
+        return None
+    
+    days, hours, minutes, seconds = [int(part) for part in match.groups()]
+    
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def observe(module, session):
+    """ The state of the database from one poll, returns (state, reached, lost) """
+    
+    target = module.params['state']
+    
+    rc, stdout, errors = session.execute(state_queries(module))
+    
+    # the instance is hung, or too slow to answer before the deadline
+    if session.timed_out:
+        return (TIMED_OUT, False, True)
+    
+    if errors:
+        lost = rc != 0 or any([code in errors for code in SESSION_LOST])
+        return (errors.splitlines()[0], False, lost)
+    
+    instance = None
+    pdbs = {}
+    lag = None
+    
+    for line in stdout.splitlines():
+        words = line.split(None, 1)
+        
+        if len(words) < 2:
+            continue
+        
+        if words[0] == 'INSTANCE':
+            instance = words[1].strip()
+        elif words[0] == 'PDB':
+            name, _, open_mode = words[1].partition(' ')
+            pdbs[name] = open_mode.strip()
+        elif words[0] == 'LAG':
+            lag = lag_seconds(words[1].strip())
+    
+    if target in INSTANCE_STATES:
+        return (instance, instance in INSTANCE_STATES[target], False)
+    
+    if target == 'pdbs_open':
+        wanted = [pdb.upper() for pdb in module.params['pdbs'] or sorted(pdbs)]
+        state = ', '.join(['{0} {1}'.format(pdb, pdbs.get(pdb, 'MISSING')) for pdb in wanted]) or instance
+        reached = bool(wanted) and all([pdbs.get(pdb) in ('READ WRITE', 'READ ONLY') for pdb in wanted])
+        return (state, reached, False)
+    
+    if lag is None:
+        return ('{0}, apply lag unknown'.format(instance), False, False)
+    
+    return ('apply lag {0}'.format(lag), lag <= module.params['max_lag'], False)
+
+def wait_for_database(module, database_name, environment):
+    """ Poll until the state or the timeout, returns (rc, result, errors) """
+    
+    phase = noh.profiler(module).phase
+    timeout = module.params['timeout']
+    target = module.params['state']
+    
+    start = time.time()
+    session = None
+    transitions = []
+    polls = 0
+    delay = module.params['delay']
+    reached = False
+    state = None
+    
+    try:
+        while True:
+            polls += 1
+            
+            with phase('poll', database=database_name, poll=polls):
+                _, process_list, _ = noh.pgrep(module, pattern='ora_pmon_')
+                running = [proc for proc in process_list if proc[2] == 'ora_pmon_{0}'.format(database_name)]
+                
+                if not running:
+                    if session is not None:
+                        session.close()
+                        session = None
+                    
+                    state, reached = 'DOWN', target == 'stopped'
+                elif target == 'stopped':
+                    state, reached = 'RUNNING', False
+                else:
+                    if session is None:
+                        # never past the deadline, however long the logon or a poll hangs
+                        session = noh.SQLPlusSession(
+                            module, environment, timeout=max(timeout - (time.time() - start), 1)
+                        )
+                        rc, _, errors = session.open()
+                        
+                        if errors:
+                            state = TIMED_OUT if session.timed_out else errors.splitlines()[0]
+                            session.close()
+                            session = None
+                        else:
+                            session.execute('SET HEADING OFF FEEDBACK OFF PAGESIZE 0 LINESIZE 32767 TRIMOUT ON')
+                    
+                    if session is not None:
+                        state, reached, lost = observe(module, session)
+                        
+                        # the instance restarted or stopped, reconnect next time
+                        if lost:
+                            session.close()
+                            session = None
+            
+            elapsed = time.time() - start
+            
+            if not transitions or transitions[-1]['state'] != state:
+                transitions.append({'state': state, 'elapsed': round(elapsed, 3)})
+                
+                # something is happening, look again soon
+                if len(transitions) > 1:
+                    delay = module.params['delay']
+            
+            if reached or elapsed >= timeout:
+                break
+            
+            # equal jitter, never past the timeout
+            time.sleep(min(delay / 2 + random.uniform(0, delay / 2), max(timeout - elapsed, 0)))
+            delay = min(delay * 2, module.params['max_delay'])
+    finally:
+        if session is not None:
+            session.close()
+    
+    result = {
+        'state': state,
+        'elapsed': round(time.time() - start, 3),
+        'polls': polls,
+        'transitions': transitions,
+    }
+    
+    if not reached:
+        return (1, result, 'Timed out after {0} seconds waiting for {1}, last seen {2}'.format(timeout, target, state))
+    
+    return (0, result, '')
+
+def main(module):
+    """ Wait for open, mounted, PDBs, apply or stopped """
+    
+    profiler = noh.profiler(module)
+    database_name = noh.database_name(module.params['database_name'])
+    
+    module_fail = {
+        'msg': 'An error has occured',
+        'rc': 1,
+    }
+    
+    if module.params['delay'] <= 0 or module.params['max_delay'] < module.params['delay']:
+        module_fail['stderr'] = 'delay must be more than 0 and no more than max_delay'
+        module.fail_json(**module_fail)
+    
+    try:
+        with profiler.phase('oraenv', database=database_name):
+            _, environment, _ = noh.oraenv(module, database_name)
+    except noh.DatabaseNotFound as fault:
+        module_fail['stderr'] = str(fault)
+        
+        module.fail_json(**module_fail)
+    
+    rc, result, errors = wait_for_database(module, database_name, environment)
+    
+    module_exit = {
+        'changed': False,
+    }
+    module_exit.update(result)
+    module_exit.update(profiler.report(module))
+    
+    if errors:
+        module_exit.update({
+            'msg': errors,
+            'rc': rc,
+        })
+        module.fail_json(**module_exit)
+    
+    module_exit['msg'] = '{0} after {1} seconds'.format(result['state'], result['elapsed'])
+    
+    module.exit_json(**module_exit)
+
+if __name__ == "__main__":
+    
+    argument_spec = {
+        "database_name": {
+            "required": True,
+            "type": "str",
+            "aliases": ["name", "sid"],
+        },
+        "state": {
+            "type": "str",
+            "default": "open",
+            "choices": ["open", "mounted", "started", "pdbs_open", "apply_lag", "stopped"],
+        },
+        "pdbs": {
+            "type": "list",
+        },
+        "max_lag": {
+            "type": "int",
+            "default": 30,
+        },
+        "timeout": {
+            "type": "int",
+            "default": 300,
+        },
+        "delay": {
+            "type": "float",
+            "default": 1,
+        },
+        "max_delay": {
+            "type": "float",
+            "default": 30,
+        },
+        "profile": {
+            "type": "bool",
+            "default": False,
+        },
+        "profile_log": {
+            "type": "str",
+        },
+    }
+    
+    module = AnsibleModule(
+        argument_spec = argument_spec,
+    )
+    
+    main(module)
\ No newline at end of file
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2021, antony.with.no.h <https://github.com/antony-with-no-h>
+# ISC License (see LICENSE or https://www.isc.org/licenses)
+
+from __future__ import (absolute_import, print_function, division)
+__metaclass__ = type
+
+import math
+
+import pytest
+
+import ansible_collections.antony_with_no_h.oracle.plugins.module_utils.common as noh
+
+def encode(*values):
+    """ A row as table_as_csv writes it """
+    
+    return ''.join(['-:' if value is None else '{0}:{1}'.format(len(value), value) for value in values]) + noh.ROW_END
+
+def column(kind, precision=None, scale=None):
+    return {'name': 'C', 'nullable': True, 'type': kind, 'precision': precision, 'scale': scale}
+
+# split_statements
+
+def test_split_statements_sql_and_commands():
+    sql = '\n'.join([
+        'SET LINES 200',
+        '-- a comment between statements',
+        'SELECT 1',
+        '  FROM dual;',
+        '',
+        'UPDATE t SET c = 1',
+        '/',
+        'COL name -',
+        '  FORMAT a30',
+    ])
+    
+    assert noh.split_statements(sql) == [
+        'SET LINES 200',
+        'SELECT 1\n  FROM dual;',
+        'UPDATE t SET c = 1\n/',
+        'COL name -\n  FORMAT a30',
+    ]
+
+def test_split_statements_plsql_block_ends_at_slash():
+    sql = '\n'.join([
+        'BEGIN',
+        '  NULL;',
+        'END;',
+        '/',
+        'SELECT 1 FROM dual;',
+    ])
+    
+    assert noh.split_statements(sql) == ['BEGIN\n  NULL;\nEND;\n/', 'SELECT 1 FROM dual;']
+
+def test_split_statements_comment_before_statement_is_not_sent():
+    sql = '/* first\n   second */\nSELECT 1 FROM dual;'
+    
+    assert noh.split_statements(sql) == ['SELECT 1 FROM dual;']
+
+def test_split_statements_semicolon_in_comment_does_not_end_sql():
+    sql = 'SELECT 1 /* not the end;\n */ FROM dual;'
+    
+    assert noh.split_statements(sql) == [sql]
+
+@pytest.mark.parametrize('sql, message', [
+    ('BEGIN\n  NULL;\nEND;', 'PL/SQL block at line 1'),
+    ('SELECT 1 FROM dual;\n/* never closed', '/* comment at line 2'),
+    ('COL name -', 'command at line 1'),
+])
+def test_split_statements_unterminated(sql, message):
+    with pytest.raises(noh.UnterminatedStatement) as raised:
+        noh.split_statements(sql)
+    
+    assert message in str(raised.value)
+
+# decode_rows
+
+def test_decode_rows_values_nulls_and_separators():
+    stdout = '\n'.join([encode('a', None, 'x:y|z'), encode('', 'two\nlines', '3')]) + '\n'
+    
+    assert list(noh.decode_rows(stdout, 3)) == [['a', None, 'x:y|z'], ['', 'two\nlines', '3']]
+
+def test_decode_rows_trailing_padding_is_not_a_row():
+    # TRIMOUT off pads each line to LINESIZE
+    stdout = encode('a', 'b') + '   \n' + encode('c', 'd') + '\n'
+    skipped = []
+    
+    rows = list(noh.decode_rows(stdout, 2, skipped))
+    
+    assert rows == [['c', 'd']]
+    assert skipped == [encode('a', 'b')]
+
+def test_decode_rows_skips_noise():
+    stdout = 'ORA-00942: table or view does not exist\n' + encode('1', '2') + '\n'
+    skipped = []
+    
+    assert list(noh.decode_rows(stdout, 2, skipped)) == [['1', '2']]
+    assert skipped == ['ORA-00942: table or view does not exist']
+
+def test_decode_rows_bytes_and_last_row_without_newline():
+    stdout = (encode(u'café', None)).encode('utf-8')
+    
+    assert list(noh.decode_rows(stdout, 2)) == [[u'café', None]]
+
+def test_decode_rows_short_row():
+    skipped = []
+    
+    assert list(noh.decode_rows(encode('a') + '\n', 2, skipped)) == []
+    assert len(skipped) == 1
+
+# column_converter
+
+def test_column_converter_integer_number():
+    convert = noh.column_converter(column('NUMBER', 10, 0))
+    
+    assert convert('42') == 42
+    assert convert('') is None
+    assert convert('1E+40') == 1e40
+
+def test_column_converter_number():
+    convert = noh.column_converter(column('NUMBER'))
+    
+    assert convert('1.5') == 1.5
+    assert convert('7') == 7
+    assert convert('~') == '~'
+
+@pytest.mark.parametrize('kind', ['BINARY_FLOAT', 'BINARY_DOUBLE'])
+def test_column_converter_binary_special_values(kind):
+    convert = noh.column_converter(column(kind))
+    
+    assert convert('1.25') == 1.25
+    assert convert('Inf') == float('inf')
+    assert convert('-Inf') == float('-inf')
+    assert math.isnan(convert('Nan'))
+    assert convert('') is None
+
+def test_column_converter_text_unchanged():
+    convert = noh.column_converter(column('VARCHAR2', 30))
+    
+    assert convert('007') == '007'
+
+# alert_incidents
+
+ALERT_LOG = '\n'.join([
+    '2021-03-01T10:00:00.000000+00:00',
+    'Errors in file /u01/diag/trace/ORCL_ora_1.trc:',
+    'ORA-00600: internal error code',
+    'ORA-06512: at line 1',
+    '2021-03-01T11:00:00.000000+00:00',
+    'ORA-01013: user requested cancel',
+    '2021-03-01T12:00:00.000000+00:00',
+    'ORA-01013: ORA-01555: snapshot too old',
+    'Completed checkpoint',
+    'ORA-00060: deadlock detected',
+]) + '\n'
+
+@pytest.fixture
+def alert_log(tmpdir):
+    path = tmpdir.join('alert_ORCL.log')
+    path.write(ALERT_LOG)
+    
+    return str(path)
+
+def test_alert_incidents_groups_lines_under_a_timestamp(alert_log):
+    incidents, end, truncated = noh.alert_incidents(alert_log)
+    
+    assert [incident['code'] for incident in incidents] == ['ORA-00600', 'ORA-01013', 'ORA-01013']
+    assert incidents[0]['codes'] == ['ORA-00600', 'ORA-06512']
+    assert incidents[0]['timestamp'] == '2021-03-01T10:00:00.000000+00:00'
+    assert incidents[0]['trace_file'] == '/u01/diag/trace/ORCL_ora_1.trc'
+    assert incidents[2]['codes'] == ['ORA-01013', 'ORA-01555', 'ORA-00060']
+    assert end == len(ALERT_LOG)
+    assert truncated is False
+
+def test_alert_incidents_ignore_is_per_code(alert_log):
+    incidents, _, _ = noh.alert_incidents(alert_log, ignore=['ORA-01013'])
+    
+    # the second line names ORA-01555 as well, it is not hidden
+    assert [incident['codes'] for incident in incidents] == [
+        ['ORA-00600', 'ORA-06512'],
+        ['ORA-01555', 'ORA-00060'],
+    ]
+
+def test_alert_incidents_carries_on_from_offset(alert_log):
+    incidents, end, _ = noh.alert_incidents(alert_log)
+    
+    assert noh.alert_incidents(alert_log, offset=end) == ([], end, False)
+
+def test_alert_incidents_max_incidents(alert_log):
+    incidents, end, truncated = noh.alert_incidents(alert_log, max_incidents=1)
+    
+    assert len(incidents) == 1
+    assert truncated is True
+    assert ALERT_LOG[end:].startswith('ORA-01013')
+
+def test_alert_incidents_leaves_a_partial_line(tmpdir):
+    path = tmpdir.join('alert_ORCL.log')
+    path.write('2021-03-01T10:00:00\nORA-00600: internal')
+    
+    # carried on from the end of the last whole line next time
+    assert noh.alert_incidents(str(path)) == ([], 20, False)
+
+# xml_elements
+
+def test_xml_elements_outer_only(tmpdir):
+    path = tmpdir.join('inventory.xml')
+    path.write(
+        '<INVENTORY><HOME_LIST>'
+        '<HOME NAME="one" LOC="/u01/one"><HOME NAME="inner" LOC="/x"/></HOME>'
+        '<HOME NAME="two" LOC="/u01/two" REMOVED="T"/>'
+        '</HOME_LIST></INVENTORY>'
+    )
+    
+    names = [element.attrib['NAME'] for element in noh.xml_elements(str(path), ('HOME',))]
+    
+    assert names == ['one', 'two']
+    assert sorted(noh.central_inventory(str(path))) == ['/u01/one', '/u01/two']
+    assert noh.central_inventory(str(path))['/u01/two']['removed'] is True
+
+# keyset_query and keyset_pages
+
+def test_keyset_query_unchanged():
+    assert noh.keyset_query('SELECT * FROM t') == 'SELECT * FROM t'
+
+def test_keyset_query_order_only():
+    assert noh.keyset_query('SELECT * FROM t', order_by='id') == 'SELECT * FROM t ORDER BY id'
+
+def test_keyset_query_after_key_and_max_rows():
+    assert noh.keyset_query('SELECT * FROM t', order_by='id', after_key="O'Neil", max_rows=10) == (
+        "SELECT * FROM (SELECT * FROM (SELECT * FROM t) WHERE id IS NOT NULL AND id > 'O''Neil' ORDER BY id)"
+        " WHERE ROWNUM <= 10"
+    )
+
+def test_keyset_query_max_rows_without_order():
+    assert noh.keyset_query('SELECT * FROM t', max_rows=5) == 'SELECT * FROM (SELECT * FROM t) WHERE ROWNUM <= 5'
+
+def pager(rows):
+    """ fetch() over rows sorted by their first column """
+    
+    calls = []
+    
+    def fetch(after_key, limit):
+        calls.append((after_key, limit))
+        page = [row for row in rows if after_key is None or row[0] > after_key]
+        return (0, page if limit is None else page[:limit], '')
+    
+    return fetch, calls
+
+def test_keyset_pages_pages_through():
+    fetch, calls = pager([(key, 'v') for key in range(1, 8)])
+    
+    rc, rows, errors = noh.keyset_pages(fetch, 0, page_size=3)
+    
+    assert (rc, errors) == (0, '')
+    assert [row[0] for row in rows] == list(range(1, 8))
+    assert calls == [(None, 4), (3, 4), (6, 4)]
+
+def test_keyset_pages_max_rows_fetches_one_more():
+    fetch, _ = pager([(key, 'v') for key in range(1, 8)])
+    
+    rc, rows, _ = noh.keyset_pages(fetch, 0, max_rows=4, page_size=2)
+    
+    assert rc == 0
+    assert len(rows) == 5
+    assert noh.keyset_truncate(rows, 4, 0) == (rows[:4], True, 4)
+
+def test_keyset_pages_repeated_key_fails():
+    fetch, _ = pager([(1, 'a'), (2, 'b'), (2, 'c'), (3, 'd')])
+    
+    rc, _, errors = noh.keyset_pages(fetch, 0, page_size=2)
+    
+    assert rc == 1
+    assert 'The key 2 is on more than one row' in errors
+
+# database_names
+
+def test_database_names_spelt_as_oratab(tmpdir):
+    path = tmpdir.join('oratab')
+    path.write('# comment\nORCL:/u01/home:Y\ncdb1:/u01/home:N\n*:/u01/other:N\n')
+    
+    assert noh.database_names(['orcl', 'CDB1', 'ORCL', 'missing'], str(path)) == ['ORCL', 'cdb1', 'missing']
+    assert noh.database_names(['all'], str(path)) == ['ORCL', 'cdb1']
\ No newline at end of file